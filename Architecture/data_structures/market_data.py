@@ -0,0 +1,118 @@
+"""
+Market data event types. Each event carries the integer id of its security and a type tag,
+used by the primary models to dispatch on the type of market data. Structured dtypes with
+matching fields are used for batches of market data, and buffers of market data can be
+viewed in bulk as structured arrays without copying.
+"""
+
+import numpy as np
+
+# type tags of market data, also used as data types of batches
+BAR = 'bar'
+QUOTE = 'quote'
+TRADE = 'trade'
+
+BAR_DTYPE = np.dtype([('security_id', np.int64),
+                      ('datetime', 'datetime64[ns]'),
+                      ('open', np.float64),
+                      ('high', np.float64),
+                      ('low', np.float64),
+                      ('close', np.float64),
+                      ('volume', np.float64)])
+
+QUOTE_DTYPE = np.dtype([('security_id', np.int64),
+                        ('datetime', 'datetime64[ns]'),
+                        ('bid', np.float64),
+                        ('ask', np.float64)])
+
+TRADE_DTYPE = np.dtype([('security_id', np.int64),
+                        ('datetime', 'datetime64[ns]'),
+                        ('last', np.float64),
+                        ('volume', np.float64)])
+
+
+class Bar:
+    __slots__ = ('security_id', 'datetime', 'open', 'high', 'low', 'close', 'volume')
+    data_type = BAR
+
+    def __init__(self, security_id, datetime, open, high, low, close, volume):
+        self.security_id = security_id
+        self.datetime = datetime
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+
+class Quote:
+    __slots__ = ('security_id', 'datetime', 'bid', 'ask')
+    data_type = QUOTE
+
+    def __init__(self, security_id, datetime, bid, ask):
+        self.security_id = security_id
+        self.datetime = datetime
+        self.bid = bid
+        self.ask = ask
+
+
+class Trade:
+    __slots__ = ('security_id', 'datetime', 'last', 'volume')
+    data_type = TRADE
+
+    def __init__(self, security_id, datetime, last, volume):
+        self.security_id = security_id
+        self.datetime = datetime
+        self.last = last
+        self.volume = volume
+
+
+DATA_TYPES_AND_EVENTS = {BAR: Bar, QUOTE: Quote, TRADE: Trade}
+DATA_TYPES_AND_DTYPES = {BAR: BAR_DTYPE, QUOTE: QUOTE_DTYPE, TRADE: TRADE_DTYPE}
+
+
+def view_buffer(buffer, data_type):
+    """
+    Views a buffer of packed market data as a structured array, without copying.
+
+    Args:
+        buffer (bytes-like): market data packed with the dtype of the data type
+        data_type (str): type of market data in the buffer, 'bar', 'quote' or 'trade'
+
+    Returns:
+        rows (np.ndarray)
+    """
+    return np.frombuffer(buffer, dtype=DATA_TYPES_AND_DTYPES[data_type])
+
+
+def events_from_rows(rows, data_type):
+    """
+    Creates market data events from rows of a structured array.
+
+    Args:
+        rows (np.ndarray): structured array of market data, fields missing from rows are
+            set to None in events.
+        data_type (str): type of market data in the rows, 'bar', 'quote' or 'trade'
+
+    Returns:
+        events (List[Bar/Quote/Trade])
+    """
+    event_type = DATA_TYPES_AND_EVENTS[data_type]
+
+    # datetimes are converted to datetime.datetime, at microsecond precision
+    columns = [as_datetimes(rows['datetime']) if field == 'datetime' else
+               rows[field].tolist() if field in rows.dtype.names else [None] * len(rows)
+               for field in event_type.__slots__]
+
+    return [event_type(*fields) for fields in zip(*columns)]
+
+
+def as_datetimes(datetimes):
+    """
+    Args:
+        datetimes (np.array[datetime64])
+
+    Returns:
+        datetimes (List[datetime.datetime]): at microsecond precision
+    """
+    return datetimes.astype('datetime64[us]').tolist()
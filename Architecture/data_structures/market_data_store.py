@@ -0,0 +1,122 @@
+"""Columnar store of the latest market data for securities in the trading universe."""
+
+import numpy as np
+
+
+class MarketDataStore:
+    """
+    Keeps latest market data of every security in preallocated arrays, one array per field,
+    indexed by the dense security index assigned by universe model. Only data model writes
+    to the store, while other models read vectors through a read-only view of the store.
+    """
+    def __init__(self, securities_and_indices):
+        """
+        Args:
+            securities_and_indices (Dict {security (str): index (int)}): dense index of each
+                security in the trading universe, from 0 to number of securities - 1.
+        """
+        self.securities_and_indices = securities_and_indices
+        number_of_securities = len(securities_and_indices)
+
+        # latest market data, nan (NaT) until first received
+        self.bid = np.full(number_of_securities, np.nan)
+        self.ask = np.full(number_of_securities, np.nan)
+        self.last = np.full(number_of_securities, np.nan)
+        self.close = np.full(number_of_securities, np.nan)
+        self.volume = np.full(number_of_securities, np.nan)
+        self.usd_price = np.full(number_of_securities, np.nan)
+        self.usd_conversion_rate = np.full(number_of_securities, np.nan)  # quote currency to USD
+        self.timestamp = np.full(number_of_securities, np.datetime64('NaT'), dtype='datetime64[ns]')
+
+        self.read_only_view = MarketDataView(self)
+
+    def update_bar(self, indices, close, volume, timestamp):
+        """
+        Args:
+            indices (int or np.array[int]): security indices, unique within a call
+            close (float or np.array[float])
+            volume (float or np.array[float])
+            timestamp (datetime.datetime or np.array[np.datetime64])
+        """
+        self.close[indices] = close
+        self.volume[indices] = volume
+        self.timestamp[indices] = timestamp
+
+    def update_quote(self, indices, ask, bid, timestamp):
+        """
+        Args:
+            indices (int or np.array[int]): security indices, unique within a call
+            ask (float or np.array[float])
+            bid (float or np.array[float])
+            timestamp (datetime.datetime or np.array[np.datetime64])
+        """
+        self.ask[indices] = ask
+        self.bid[indices] = bid
+        self.timestamp[indices] = timestamp
+
+    def update_trade(self, indices, last, timestamp):
+        """
+        Args:
+            indices (int or np.array[int]): security indices, unique within a call
+            last (float or np.array[float])
+            timestamp (datetime.datetime or np.array[np.datetime64])
+        """
+        self.last[indices] = last
+        self.timestamp[indices] = timestamp
+
+    def update_usd_price(self, indices, usd_price):
+        """
+        Args:
+            indices (int or np.array[int]): security indices, unique within a call
+            usd_price (float or np.array[float])
+        """
+        self.usd_price[indices] = usd_price
+
+    def update_usd_conversion_rate(self, indices, usd_conversion_rate):
+        """
+        Updates conversion rates of securities quoted in the same currency, and reprices
+        these securities in USD from mid-prices of their latest quotes in one step.
+
+        Args:
+            indices (np.array[int]): indices of securities quoted in the currency
+            usd_conversion_rate (float): latest rate to convert currency to USD
+
+        Returns:
+            usd_price (np.array[float]): latest prices in USD of the securities
+        """
+        self.usd_conversion_rate[indices] = usd_conversion_rate
+        usd_price = (self.ask[indices] + self.bid[indices]) / 2 * usd_conversion_rate
+        self.usd_price[indices] = usd_price
+
+        return usd_price
+
+
+class MarketDataView:
+    """
+    Read-only view of a market data store. Arrays share memory with the store, so the
+    view always reflects latest market data without copying.
+    """
+    def __init__(self, market_data_store):
+        self.securities_and_indices = market_data_store.securities_and_indices
+
+        self.bid = _read_only(market_data_store.bid)
+        self.ask = _read_only(market_data_store.ask)
+        self.last = _read_only(market_data_store.last)
+        self.close = _read_only(market_data_store.close)
+        self.volume = _read_only(market_data_store.volume)
+        self.usd_price = _read_only(market_data_store.usd_price)
+        self.usd_conversion_rate = _read_only(market_data_store.usd_conversion_rate)
+        self.timestamp = _read_only(market_data_store.timestamp)
+
+
+def _read_only(array):
+    """
+    Args:
+        array (np.array)
+
+    Returns:
+        read_only_view (np.array): view of array which cannot be written to
+    """
+    read_only_view = array.view()
+    read_only_view.flags.writeable = False
+    return read_only_view
@@ -0,0 +1,54 @@
+"""Shared, read-only state of the market, published by data model to the other primary models."""
+
+from types import MappingProxyType
+
+
+class MarketState:
+    """
+    Latest market data shared by data model with the other primary models. The state is
+    registered with each model once at startup, and models read latest data through it,
+    rather than data model sending latest data to every model on every event.
+
+    Mappings are read-only proxies of the dictionaries kept by data model, and the market
+    data view shares memory with the market data store, so both always reflect latest
+    data without copying. Each time data model publishes fresh data, the version counter
+    is incremented, so models can cheaply tell whether anything changed since they last
+    read the state.
+    """
+    def __init__(self, securities_and_latest_bar, securities_and_latest_quote, securities_and_latest_trade,
+                 securities_and_latest_usd_price, market_data):
+        """
+        Args:
+            securities_and_latest_bar (Dict {security (str): bar (Bar)})
+            securities_and_latest_quote (Dict {security (str): quote (Quote)})
+            securities_and_latest_trade (Dict {security (str): trade (Trade)})
+            securities_and_latest_usd_price (Dict {security (str): usd_price (float)})
+            market_data (MarketDataView): read-only view of columnar market data store
+        """
+        self.securities_and_latest_bar = MappingProxyType(securities_and_latest_bar)
+        self.securities_and_latest_quote = MappingProxyType(securities_and_latest_quote)
+        self.securities_and_latest_trade = MappingProxyType(securities_and_latest_trade)
+        self.securities_and_latest_usd_price = MappingProxyType(securities_and_latest_usd_price)
+        self.market_data = market_data
+
+        # updated by data model whenever fresh data is published
+        self.version = 0
+        self.current_time = None
+        self.updated_securities = set()  # securities which changed in the latest version, not to be modified
+        self.repriced_securities = set()  # securities whose price in USD changed in the latest version
+
+    def publish(self, current_time, updated_securities, repriced_securities):
+        """
+        Called by data model only, once latest data is collected and preprocessed.
+
+        Args:
+            current_time (datetime.datetime)
+            updated_securities (Set {security (str)}): securities which changed since the
+                previous version
+            repriced_securities (Set {security (str)}): securities whose price in USD changed
+                since the previous version, a subset of updated securities
+        """
+        self.current_time = current_time
+        self.updated_securities = updated_securities
+        self.repriced_securities = repriced_securities
+        self.version += 1
@@ -0,0 +1,179 @@
+"""Incremental rolling median over a FIFO window of prices."""
+
+import heapq
+from collections import deque, defaultdict
+
+
+class RollingMedian:
+    """
+    Maintains the median of a FIFO window of values in O(log n) per update, using
+    a max-heap for the lower half and a min-heap for the upper half of the window.
+    Values leaving the window are deleted lazily, i.e. only once they surface at
+    the top of a heap. Deleted values buried in a heap are purged by rebuilding the
+    heap once they outnumber its live values, so heaps hold O(n) values and updates
+    cost O(log n) in amortized time, even when prices trend.
+
+    The median returned is identical to np.median of the window: the middle value
+    for odd window sizes, and the mean of the two middle values for even sizes.
+    """
+    def __init__(self, window_size):
+        self.window_size = window_size
+
+        # internal data structures
+        self.window = deque()
+        self.lower_half = []  # max-heap, values are negated
+        self.upper_half = []  # min-heap
+        self.lower_half_size = 0  # number of live values in lower half
+        self.upper_half_size = 0  # number of live values in upper half
+        self.lower_half_pending_deletion = defaultdict(int)
+        self.upper_half_pending_deletion = defaultdict(int)
+        self.lower_half_deleted = 0  # number of values deleted lazily, still in lower half
+        self.upper_half_deleted = 0  # number of values deleted lazily, still in upper half
+        self.nan_count = 0
+
+    def __len__(self):
+        return len(self.window)
+
+    def is_full(self):
+        """ Checks whether enough values are collected to fill the window.
+        """
+        return len(self.window) >= self.window_size
+
+    def append(self, value):
+        """
+        Appends latest value to the window. If window is already full, the oldest
+        value is popped from the window.
+
+        Args:
+            value (float)
+        """
+        self.window.append(value)
+        self._insert(value)
+
+        if len(self.window) > self.window_size:
+            self._remove(self.window.popleft())
+
+    def median(self):
+        """
+        Returns:
+            median (float): median of values in the window, nan if window is empty
+                or contains nan (as with np.median)
+        """
+        if not self.window or self.nan_count:
+            return float('nan')
+
+        if self.lower_half_size > self.upper_half_size:
+            return -self.lower_half[0]
+
+        return (-self.lower_half[0] + self.upper_half[0]) / 2
+
+    def _insert(self, value):
+        # nan values cannot be ordered, so they are only counted
+        if value != value:
+            self.nan_count += 1
+            return
+
+        if not self.lower_half_size or value <= -self.lower_half[0]:
+            heapq.heappush(self.lower_half, -value)
+            self.lower_half_size += 1
+        else:
+            heapq.heappush(self.upper_half, value)
+            self.upper_half_size += 1
+
+        self._rebalance()
+
+    def _remove(self, value):
+        if value != value:
+            self.nan_count -= 1
+            return
+
+        # live copies of a value no greater than the lower half's maximum always sit in the lower half
+        if value <= -self.lower_half[0]:
+            self.lower_half_pending_deletion[value] += 1
+            self.lower_half_deleted += 1
+            self.lower_half_size -= 1
+            self._prune_lower_half()
+        else:
+            self.upper_half_pending_deletion[value] += 1
+            self.upper_half_deleted += 1
+            self.upper_half_size -= 1
+            self._prune_upper_half()
+
+        self._rebalance()
+
+        # rebuilds heaps mostly made of deleted values
+        if self.lower_half_deleted > self.lower_half_size:
+            _purge(self.lower_half, self.lower_half_pending_deletion, sign=-1)
+            self.lower_half_deleted = 0
+        if self.upper_half_deleted > self.upper_half_size:
+            _purge(self.upper_half, self.upper_half_pending_deletion, sign=1)
+            self.upper_half_deleted = 0
+
+    def _rebalance(self):
+        # lower half holds either the same number of live values, or one more
+        if self.lower_half_size > self.upper_half_size + 1:
+            heapq.heappush(self.upper_half, -heapq.heappop(self.lower_half))
+            self.lower_half_size -= 1
+            self.upper_half_size += 1
+            self._prune_lower_half()
+        elif self.lower_half_size < self.upper_half_size:
+            heapq.heappush(self.lower_half, -heapq.heappop(self.upper_half))
+            self.upper_half_size -= 1
+            self.lower_half_size += 1
+            self._prune_upper_half()
+
+    def _prune_lower_half(self):
+        self.lower_half_deleted -= _prune(self.lower_half, self.lower_half_pending_deletion, sign=-1)
+
+    def _prune_upper_half(self):
+        self.upper_half_deleted -= _prune(self.upper_half, self.upper_half_pending_deletion, sign=1)
+
+
+def _prune(heap, pending_deletion, sign):
+    """
+    Pops values at the top of a heap which have already left the window.
+
+    Args:
+        heap (List[float])
+        pending_deletion (Dict {value (float): count (int)}): values deleted lazily
+        sign (int): -1 for heaps storing negated values, 1 otherwise
+
+    Returns:
+        number_of_values_popped (int)
+    """
+    number_of_values_popped = 0
+    while heap:
+        value = sign * heap[0]
+        if not pending_deletion.get(value):
+            break
+
+        pending_deletion[value] -= 1
+        if not pending_deletion[value]:
+            del pending_deletion[value]
+        heapq.heappop(heap)
+        number_of_values_popped += 1
+
+    return number_of_values_popped
+
+
+def _purge(heap, pending_deletion, sign):
+    """
+    Removes all values which have already left the window from a heap, wherever they
+    are in the heap, and rebuilds the heap in place in O(n).
+
+    Args:
+        heap (List[float])
+        pending_deletion (Dict {value (float): count (int)}): values deleted lazily, cleared
+        sign (int): -1 for heaps storing negated values, 1 otherwise
+    """
+    live_values = []
+    for stored_value in heap:
+        value = sign * stored_value
+        if pending_deletion.get(value):
+            pending_deletion[value] -= 1
+        else:
+            live_values.append(stored_value)
+
+    heap[:] = live_values
+    heapq.heapify(heap)
+    pending_deletion.clear()
@@ -0,0 +1,175 @@
+"""Precompiled lookup tables of trading hours for securities in the trading universe."""
+
+import numpy as np
+
+SECONDS_IN_A_DAY = 24 * 60 * 60
+
+
+class TradingHoursIndex:
+    """
+    Compiles trading intervals of each security into second-of-day lookup tables, so that
+    checking if data is received during trading hours is a single array lookup.
+
+    As with the trading intervals, data is within trading hours if it is strictly between
+    the start and end of an interval. Each schedule is therefore compiled into two tables,
+    one for times falling exactly on a second, and one for times strictly within a second.
+    Securities sharing the same trading intervals (e.g. listed on the same exchange) share
+    the same tables.
+
+    Holidays and half-days are supported as special sessions, which replace the regular
+    trading intervals of a security on a given date. Holidays are special sessions without
+    any trading intervals. Special sessions are matched against the calendar date of the
+    data, including for trading intervals that spill over to the next day.
+    """
+    def __init__(self, securities_and_trading_hours, securities_and_special_sessions=None):
+        """
+        Args:
+            securities_and_trading_hours (Dict {security (str): List(tuple(datetime.time(), datetime.time()))}):
+                regular trading intervals of each security.
+            securities_and_special_sessions
+                (Dict {security (str): Dict {date (datetime.date): List(tuple(datetime.time(), datetime.time()))}}):
+                trading intervals replacing regular trading intervals on holidays and half-days.
+        """
+        securities_and_special_sessions = securities_and_special_sessions or {}
+
+        # internal data structures
+        self.securities_and_codes = {}
+        self.schedules_and_rows = {}
+        self.on_the_second_tables = []
+        self.within_the_second_tables = []
+
+        # Compiles regular trading intervals
+        schedule_rows = []
+        for security, trading_intervals in securities_and_trading_hours.items():
+            self.securities_and_codes[security] = len(schedule_rows)
+            schedule_rows.append(self._compile_schedule(trading_intervals))
+        self.schedule_rows = np.array(schedule_rows, dtype=np.intp)
+
+        # Compiles special sessions, keyed by (security, date)
+        self.special_sessions_and_rows = {}
+        for security, dates_and_trading_intervals in securities_and_special_sessions.items():
+            for date, trading_intervals in dates_and_trading_intervals.items():
+                self.special_sessions_and_rows[(security, date)] = self._compile_schedule(trading_intervals)
+
+        # Sorted keys of special sessions for vectorized lookups
+        special_session_keys = [_special_session_key(self.securities_and_codes[security], np.datetime64(date, 'D'))
+                                for security, date in self.special_sessions_and_rows]
+        sorting_order = np.argsort(special_session_keys)
+        self.special_session_keys = np.array(special_session_keys, dtype=np.int64)[sorting_order]
+        self.special_session_rows = np.array(list(self.special_sessions_and_rows.values()),
+                                             dtype=np.intp)[sorting_order]
+
+        self.on_the_second_tables = np.array(self.on_the_second_tables, dtype=bool)
+        self.within_the_second_tables = np.array(self.within_the_second_tables, dtype=bool)
+
+    def is_within_trading_hours(self, security, timestamp):
+        """
+        Args:
+            security (str): symbol code for the security
+            timestamp (datetime.datetime)
+
+        Returns:
+            within_trading_hours (bool)
+        """
+        row = self.schedule_rows[self.securities_and_codes[security]]
+        if self.special_sessions_and_rows:
+            row = self.special_sessions_and_rows.get((security, timestamp.date()), row)
+
+        second_of_day = (timestamp.hour * 60 + timestamp.minute) * 60 + timestamp.second
+        if timestamp.microsecond:
+            return bool(self.within_the_second_tables[row, second_of_day])
+
+        return bool(self.on_the_second_tables[row, second_of_day])
+
+    def are_within_trading_hours(self, security_codes, timestamps):
+        """
+        Vectorized variant of is_within_trading_hours, validating a whole array of timestamps at once.
+
+        Args:
+            security_codes (np.array[int]): codes of securities, from securities_and_codes
+            timestamps (np.array[np.datetime64])
+
+        Returns:
+            within_trading_hours (np.array[bool])
+        """
+        timestamps = timestamps.astype('datetime64[us]')
+        dates = timestamps.astype('datetime64[D]')
+        microseconds_of_day = (timestamps - dates).astype(np.int64)
+        seconds_of_day = microseconds_of_day // 1_000_000
+
+        rows = self.schedule_rows[security_codes]
+        if self.special_session_keys.size:
+            keys = _special_session_key(security_codes, dates)
+            positions = np.searchsorted(self.special_session_keys, keys)
+            positions = np.minimum(positions, self.special_session_keys.size - 1)
+            is_special_session = self.special_session_keys[positions] == keys
+            rows = np.where(is_special_session, self.special_session_rows[positions], rows)
+
+        within_trading_hours = np.where(microseconds_of_day % 1_000_000 == 0,
+                                        self.on_the_second_tables[rows, seconds_of_day],
+                                        self.within_the_second_tables[rows, seconds_of_day])
+        return within_trading_hours
+
+    def _compile_schedule(self, trading_intervals):
+        """
+        Compiles trading intervals into lookup tables, reusing tables of identical schedules.
+
+        Args:
+            trading_intervals (List(tuple(datetime.time(), datetime.time())))
+
+        Returns:
+            row (int): row of the schedule in the lookup tables
+        """
+        schedule = tuple(sorted(trading_intervals))
+        if schedule in self.schedules_and_rows:
+            return self.schedules_and_rows[schedule]
+
+        seconds_of_day = np.arange(SECONDS_IN_A_DAY)
+        on_the_second = np.zeros(SECONDS_IN_A_DAY, dtype=bool)
+        within_the_second = np.zeros(SECONDS_IN_A_DAY, dtype=bool)
+
+        for trading_interval in schedule:
+            start, end = (_second_of_day(boundary) for boundary in trading_interval)
+            # If trading hours spill over to next day
+            if end < start:
+                on_the_second |= (start < seconds_of_day) | (seconds_of_day < end)
+                within_the_second |= (start <= seconds_of_day) | (seconds_of_day < end)
+            else:
+                on_the_second |= (start < seconds_of_day) & (seconds_of_day < end)
+                within_the_second |= (start <= seconds_of_day) & (seconds_of_day < end)
+
+        row = len(self.schedules_and_rows)
+        self.schedules_and_rows[schedule] = row
+        self.on_the_second_tables.append(on_the_second)
+        self.within_the_second_tables.append(within_the_second)
+
+        return row
+
+
+def _second_of_day(time):
+    """
+    Args:
+        time (datetime.time): boundary of a trading interval
+
+    Returns:
+        second_of_day (int)
+    """
+    if time.microsecond:
+        raise ValueError(f"Trading interval boundary {time} is not a whole second!")
+
+    return (time.hour * 60 + time.minute) * 60 + time.second
+
+
+def _special_session_key(security_codes, dates):
+    """
+    Combines security codes and dates into a single integer key.
+
+    Args:
+        security_codes (int or np.array[int])
+        dates (np.datetime64 or np.array[np.datetime64]): dates in days
+
+    Returns:
+        key (int or np.array[int])
+    """
+    days_since_epoch = np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+    return (np.asarray(security_codes).astype(np.int64) << 32) + days_since_epoch + (1 << 31)
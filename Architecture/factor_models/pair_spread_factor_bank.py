@@ -0,0 +1,148 @@
+"""Vectorized bank of pair-trading factor models"""
+
+import numpy as np
+
+
+class PairSpreadFactorBank:
+    """
+    Trades every pair of securities in a single factor model. The state of each pair is kept
+    in contiguous arrays, and all pairs are updated together with one vectorized step.
+
+    Each pair (security_1, security_2) follows the Kalman filter strategy in
+    Strategies/kalman_filter.py: hedge ratios are estimated by regressing security_2 prices
+    on security_1 prices with a Kalman filter, and positions are taken in the spread based
+    on Bollinger Bands of the prediction error zscores.
+    """
+    def __init__(self, pairs_of_indices, number_of_securities,
+                 learning_rate=1e-4, covariance=1e-3, zscore_threshold=2, burn_in=100):
+        """
+        Args:
+            pairs_of_indices (np.array[int] (P, 2)): security indices of each pair,
+                the first security is the regressor and the second the regressand.
+            number_of_securities (int): number of securities in the trading universe
+            learning_rate (float): controls rate of updating hedge ratios
+            covariance (float): serial covariance of linear regression error term.
+            zscore_threshold (float): threshold to enter positions
+            burn_in (int): number of observations before positions are taken, to allow
+                hedge ratios to stabilise
+        """
+        # hyperparameters
+        self.state_transition_variance = learning_rate / (1 - learning_rate)
+        self.covariance = covariance
+        self.zscore_threshold = zscore_threshold
+        self.burn_in = burn_in
+
+        # internal data structures, one row per pair
+        self.leg_indices = np.asarray(pairs_of_indices, dtype=np.intp).reshape(-1, 2)
+        number_of_pairs = self.leg_indices.shape[0]
+        self.number_of_securities = number_of_securities
+
+        self.beta = np.zeros((number_of_pairs, 2))  # regression coefficients (hedge ratio, intercept)
+        self.beta_covariance = np.zeros((number_of_pairs, 2, 2))  # beta error covariance after update
+        self.error = np.zeros(number_of_pairs)  # prediction error
+        self.error_variance = np.zeros(number_of_pairs)  # prediction error variance
+        self.zscores = np.zeros(number_of_pairs)
+        self.number_of_observations = np.zeros(number_of_pairs, dtype=np.int64)
+
+        # Bollinger Bands positions, nan until entry or exit thresholds are first crossed
+        self.long_positions = np.full(number_of_pairs, np.nan)
+        self.short_positions = np.full(number_of_pairs, np.nan)
+
+    def pairs_trading_securities(self, security_indices):
+        """
+        Args:
+            security_indices (np.array[int])
+
+        Returns:
+            pair_indices (np.array[int]): pairs with at least one leg in security_indices
+        """
+        is_pair_trading_security = np.isin(self.leg_indices, security_indices).any(axis=1)
+        return np.flatnonzero(is_pair_trading_security)
+
+    def receive_data(self, prices, pair_indices=None):
+        """
+        Updates pairs with latest prices, with a single vectorized Kalman filter and Bollinger
+        Bands step. Pairs with a missing price in either leg are not updated.
+
+        Args:
+            prices (np.array[float]): latest price of each security, by security index
+            pair_indices (np.array[int]): pairs to update, all pairs by default
+        """
+        if pair_indices is None:
+            pair_indices = np.arange(self.leg_indices.shape[0])
+
+        legs = self.leg_indices[pair_indices]
+        x, y = prices[legs[:, 0]], prices[legs[:, 1]]
+        has_prices = ~(np.isnan(x) | np.isnan(y))
+        pair_indices, x, y = pair_indices[has_prices], x[has_prices], y[has_prices]
+
+        # predicted beta error covariance, which is zero for the first observation
+        R = self.beta_covariance[pair_indices]
+        R[:, 0, 0] += self.state_transition_variance
+        R[:, 1, 1] += self.state_transition_variance
+        R[self.number_of_observations[pair_indices] == 0] = 0
+
+        # calculating prediction error and error variance, x is augmented with ones for intercept
+        beta = self.beta[pair_indices]
+        error = y - (x * beta[:, 0] + beta[:, 1])
+        xR_0 = x * R[:, 0, 0] + R[:, 1, 0]
+        xR_1 = x * R[:, 0, 1] + R[:, 1, 1]
+        error_variance = xR_0 * x + xR_1 + self.covariance
+
+        # updating beta (hedge ratios)
+        K_0 = (R[:, 0, 0] * x + R[:, 0, 1]) / error_variance
+        K_1 = (R[:, 1, 0] * x + R[:, 1, 1]) / error_variance
+        beta[:, 0] += K_0 * error
+        beta[:, 1] += K_1 * error
+
+        beta_covariance = np.empty_like(R)
+        beta_covariance[:, 0, 0] = R[:, 0, 0] - K_0 * xR_0
+        beta_covariance[:, 0, 1] = R[:, 0, 1] - K_0 * xR_1
+        beta_covariance[:, 1, 0] = R[:, 1, 0] - K_1 * xR_0
+        beta_covariance[:, 1, 1] = R[:, 1, 1] - K_1 * xR_1
+
+        self.beta[pair_indices] = beta
+        self.beta_covariance[pair_indices] = beta_covariance
+        self.error[pair_indices] = error
+        self.error_variance[pair_indices] = error_variance
+        self.number_of_observations[pair_indices] += 1
+
+        # Bollinger Bands, enter when zscore crosses threshold, exit when spread reverts
+        zscores = error / np.sqrt(error_variance)
+        self.zscores[pair_indices] = zscores
+
+        long_positions = self.long_positions[pair_indices]
+        long_positions[zscores < -self.zscore_threshold] = 1
+        long_positions[zscores > 0] = 0
+        self.long_positions[pair_indices] = long_positions
+
+        short_positions = self.short_positions[pair_indices]
+        short_positions[zscores > self.zscore_threshold] = -1
+        short_positions[zscores < 0] = 0
+        self.short_positions[pair_indices] = short_positions
+
+    def generate_positions(self):
+        """
+        Returns:
+            positions (np.array[float]): position in the spread of each pair
+        """
+        positions = np.nan_to_num(self.long_positions) + np.nan_to_num(self.short_positions)
+        # burn-in to allow hedge ratios to stabilise
+        positions[self.number_of_observations <= self.burn_in] = 0
+
+        return positions
+
+    def generate_signals(self):
+        """
+        Scatter-adds positions of each pair into positions of each security. A unit spread
+        is long 1 unit of the second security and short round(hedge ratio) units of the first.
+
+        Returns:
+            signals (np.array[float]): positions to take, by security index
+        """
+        positions = self.generate_positions()
+        leg_positions = np.stack([-np.round(self.beta[:, 0]) * positions, positions], axis=1)
+
+        signals = np.bincount(self.leg_indices.ravel(), weights=leg_positions.ravel(),
+                              minlength=self.number_of_securities)
+        return signals
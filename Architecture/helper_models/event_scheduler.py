@@ -0,0 +1,171 @@
+"""Conflation of market data events and scheduling of primary model stages."""
+
+from datetime import timedelta
+
+import numpy as np
+
+
+class EventScheduler:
+    """
+    Decides when each stage of the main event loop runs, so that the alpha, portfolio and
+    execution stages keep up with market data arriving at high rates.
+
+    Quotes are conflated: within a conflation window only the latest quote of each security
+    is kept, and earlier quotes are dropped rather than queued. A window closes once it spans
+    a given amount of time, or a given number of quotes, after which the latest quotes are
+    released for processing. Pending quotes are also released whenever another event (bar,
+    trade or order event) is processed, and at the end of a backtest. Stale quotes, older
+    than a quote already received for the same security, are always dropped.
+
+    Each stage has its own cadence. By default, alpha runs on every conflated update,
+    portfolio runs at most once every 100ms, and execution runs when orders change. Times
+    may be given as datetime.datetime or np.datetime64 (e.g. from batches of market data).
+    """
+    def __init__(self, conflation_window=None, conflation_events=None,
+                 portfolio_interval=timedelta(milliseconds=100)):
+        """
+        Args:
+            conflation_window (datetime.timedelta): time spanned by a conflation window.
+            conflation_events (int): number of quotes in a conflation window. If neither
+                conflation_window nor conflation_events is given, quotes are not conflated.
+            portfolio_interval (datetime.timedelta): minimum time between portfolio stages
+        """
+        # hyperparameters
+        self.conflation_window = conflation_window
+        self.conflation_events = conflation_events
+        self.portfolio_interval = portfolio_interval
+
+        # internal data structures
+        self.security_ids_and_pending_quote = {}
+        self.security_ids_and_latest_quote_time = {}
+        self.pending_events = 0
+        self.window_start_time = None
+        self.last_portfolio_time = None
+        self.execution_due = False
+
+        # statistics
+        self.conflated_events = 0
+        self.stale_events = 0
+
+    def conflate_quote(self, quote):
+        """
+        Adds latest quote to the current conflation window.
+
+        Args:
+            quote (Quote): latest quote received
+
+        Returns:
+            released_quotes (List[Quote]): latest quote of each security if the conflation
+                window closed, otherwise an empty list.
+        """
+        security_id = quote.security_id
+
+        # Drops quotes older than a quote already received for the security
+        latest_quote_time = self.security_ids_and_latest_quote_time.get(security_id)
+        if latest_quote_time is not None and quote.datetime < latest_quote_time:
+            self.stale_events += 1
+            return []
+        self.security_ids_and_latest_quote_time[security_id] = quote.datetime
+
+        # Only the latest quote of a security is kept within the window
+        if security_id in self.security_ids_and_pending_quote:
+            self.conflated_events += 1
+        self.security_ids_and_pending_quote[security_id] = quote
+
+        self.pending_events += 1
+        if self.window_start_time is None:
+            self.window_start_time = quote.datetime
+
+        if self.is_window_closed(quote.datetime):
+            return self.release_pending_quotes()
+
+        return []
+
+    def is_window_closed(self, current_time):
+        """
+        Args:
+            current_time (datetime.datetime)
+
+        Returns:
+            window_closed (bool)
+        """
+        if self.conflation_window is None and self.conflation_events is None:
+            return True
+
+        if self.conflation_events is not None and self.pending_events >= self.conflation_events:
+            return True
+
+        if self.conflation_window is not None and\
+           current_time - self.window_start_time >= self.conflation_window:
+            return True
+
+        return False
+
+    def release_pending_quotes(self):
+        """
+        Closes the current conflation window. Called by main strategy before processing any
+        other event, and at the end of a backtest (or e.g. by a timer), so that quotes are
+        not held back when no further quotes arrive.
+
+        Returns:
+            released_quotes (List[Quote]): latest quote of each security in the window
+        """
+        released_quotes = list(self.security_ids_and_pending_quote.values())
+
+        self.security_ids_and_pending_quote = {}
+        self.pending_events = 0
+        self.window_start_time = None
+
+        return released_quotes
+
+    def is_portfolio_due(self, current_time):
+        """
+        Args:
+            current_time (datetime.datetime or np.datetime64)
+
+        Returns:
+            portfolio_due (bool)
+        """
+        return self.last_portfolio_time is None or\
+            _as_datetime(current_time) - self.last_portfolio_time >= self.portfolio_interval
+
+    def record_portfolio_run(self, current_time, orders_to_execute):
+        """
+        Args:
+            current_time (datetime.datetime or np.datetime64)
+            orders_to_execute (Dict {security (str): position (int)}): orders emitted by portfolio
+        """
+        self.last_portfolio_time = _as_datetime(current_time)
+        if any(orders_to_execute.values()):
+            self.execution_due = True
+
+    def record_order_event(self):
+        """ Called when state of an order changes (e.g. filled, cancelled), execution runs next.
+        """
+        self.execution_due = True
+
+    def is_execution_due(self):
+        """
+        Returns:
+            execution_due (bool)
+        """
+        return self.execution_due
+
+    def record_execution_run(self):
+        """ Called once execution has run, execution waits for the next change in orders.
+        """
+        self.execution_due = False
+
+
+def _as_datetime(current_time):
+    """
+    Args:
+        current_time (datetime.datetime or np.datetime64)
+
+    Returns:
+        current_time (datetime.datetime): datetimes are truncated to microseconds
+    """
+    if isinstance(current_time, np.datetime64):
+        return current_time.astype('datetime64[us]').item()
+
+    return current_time
@@ -0,0 +1,182 @@
+"""Replays historical market data from memory-mapped files to backtest the main strategy."""
+
+import heapq
+import logging
+import time
+import numpy as np
+
+from Architecture.data_structures.market_data import BAR, QUOTE, TRADE, events_from_rows
+
+logging.basicConfig(format='%(asctime)s %(name)s: [%(levelname)s] %(message)s',
+                    datefmt='%Y/%m/%d %H:%M:%S',
+                    level=logging.WARNING)
+
+
+class ReplayEngine:
+    """
+    Drives a backtest by replaying historical bars, quotes and trades to the main strategy in
+    timestamp order.
+
+    Historical data is stored in .npy files of structured arrays, one file per data type (and
+    e.g. per day or per security), with the fields of BAR_DTYPE, QUOTE_DTYPE or TRADE_DTYPE. Rows within a file
+    are sorted by datetime. Files are memory-mapped, so only the rows being replayed are read
+    into memory, and days larger than memory can be replayed.
+
+    Files are merged with a k-way heap merge. Rather than pushing every row through the heap,
+    the file with the earliest row is replayed up to the next row of any other file, so each
+    heap operation dispatches a run of consecutive rows. Runs are dispatched to the batch API
+    of the strategy (on_bars/on_quotes/on_trades), or one row at a time to on_bar/on_quote/on_trade.
+    Rows with identical timestamps are replayed in the order files were added. Once all rows
+    are replayed, quotes still held back by the strategy (e.g. conflated quotes) are flushed.
+    """
+    def __init__(self, strategy, chunk_size=65_536, dispatch_batches=True):
+        """
+        Args:
+            strategy (MainStrategy): strategy receiving market data
+            chunk_size (int): number of rows of each source read into memory at once
+            dispatch_batches (bool): whether to dispatch runs of rows to the batch API
+        """
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.dispatch_batches = dispatch_batches
+
+        # internal data structures
+        self.sources = []  # List [tuple(data_type (str), rows (np.memmap))]
+
+        # controls verbosity of replay engine
+        self.logger = logging.getLogger(name=self.__class__.__name__)
+
+    def add_source(self, path, data_type):
+        """
+        Memory-maps a file of historical market data for replay.
+
+        Args:
+            path (str): path to .npy file of a structured array
+            data_type (str): type of market data in the file, 'bar', 'quote' or 'trade'
+        """
+        if data_type not in (BAR, QUOTE, TRADE):
+            raise NotImplementedError(f"Data type {data_type} is not supported!")
+
+        rows = np.load(path, mmap_mode='r')
+        if rows.dtype['datetime'] != np.dtype('datetime64[ns]'):
+            raise ValueError(f"Expected datetime64[ns] datetimes in {path}, got {rows.dtype['datetime']}!")
+
+        self.sources.append((data_type, rows))
+
+    def run(self):
+        """
+        Replays all sources to the strategy in timestamp order.
+
+        Returns:
+            replay_statistics (dict {'events': int, 'dispatches': int,
+                                     'seconds': float, 'events_per_second': float})
+        """
+        # Chunk of rows read into memory for each source, with its timestamps and position in the source
+        chunks = [_read_chunk(rows, 0, self.chunk_size) for _, rows in self.sources]
+
+        # Heap of (timestamp of next row, source number, position of next row in chunk)
+        heap = [(int(timestamps[0]), source_number, 0)
+                for source_number, (_, timestamps, _) in enumerate(chunks) if timestamps.size]
+        heapq.heapify(heap)
+
+        number_of_events = 0
+        number_of_dispatches = 0
+        start_time = time.perf_counter()
+
+        while heap:
+            _, source_number, position = heapq.heappop(heap)
+            data_type, rows = self.sources[source_number]
+            chunk, timestamps, chunk_start = chunks[source_number]
+
+            # Replays the source up to the next row of any other source
+            if heap:
+                next_timestamp, next_source_number, _ = heap[0]
+                # Ties are replayed in the order sources were added
+                side = 'right' if source_number < next_source_number else 'left'
+                run_end = max(int(np.searchsorted(timestamps, next_timestamp, side=side)), position + 1)
+            else:
+                run_end = timestamps.size
+
+            self.dispatch(data_type, chunk[position:run_end])
+            number_of_events += run_end - position
+            number_of_dispatches += 1
+
+            # Reads next chunk of the source once current chunk is replayed
+            if run_end == timestamps.size:
+                chunks[source_number] = _read_chunk(rows, chunk_start + timestamps.size, self.chunk_size)
+                _, timestamps, _ = chunks[source_number]
+                run_end = 0
+
+            if run_end < timestamps.size:
+                heapq.heappush(heap, (int(timestamps[run_end]), source_number, run_end))
+
+        self.strategy.flush_conflated_quotes()
+
+        seconds = time.perf_counter() - start_time
+        replay_statistics = {'events': number_of_events,
+                             'dispatches': number_of_dispatches,
+                             'seconds': seconds,
+                             'events_per_second': number_of_events / seconds if seconds else float('nan')}
+
+        self.logger.info(f"Replayed {number_of_events} events in {seconds:.3f}s | "
+                         f"{replay_statistics['events_per_second']:.0f} events/sec\n")
+        return replay_statistics
+
+    def dispatch(self, data_type, rows):
+        """
+        Dispatches rows of market data to the strategy.
+
+        Args:
+            data_type (str): type of market data, 'bar', 'quote' or 'trade'
+            rows (np.ndarray): structured array of consecutive rows from a source
+        """
+        if self.dispatch_batches:
+            if data_type == BAR:
+                self.strategy.on_bars(rows)
+            elif data_type == QUOTE:
+                self.strategy.on_quotes(rows)
+            else:
+                self.strategy.on_trades(rows)
+            return
+
+        if data_type == BAR:
+            on_data = self.strategy.on_bar
+        elif data_type == QUOTE:
+            on_data = self.strategy.on_quote
+        else:
+            on_data = self.strategy.on_trade
+
+        for event in events_from_rows(rows, data_type):
+            on_data(event)
+
+
+def write_replay_file(path, rows):
+    """
+    Writes historical market data to a file which can be replayed, sorting rows by datetime.
+
+    Args:
+        path (str): path to .npy file
+        rows (np.ndarray): structured array with fields 'security_id' and 'datetime'
+    """
+    rows = rows[np.argsort(rows['datetime'], kind='stable')]
+    np.save(path, rows)
+
+
+def _read_chunk(rows, chunk_start, chunk_size):
+    """
+    Reads a chunk of rows of a memory-mapped source into memory.
+
+    Args:
+        rows (np.memmap): structured array of market data
+        chunk_start (int): position of first row of the chunk in the source
+        chunk_size (int)
+
+    Returns:
+        chunk (np.ndarray): rows of the chunk
+        timestamps (np.array[int]): datetimes of the rows, as integers
+        chunk_start (int)
+    """
+    chunk = np.array(rows[chunk_start:chunk_start + chunk_size])
+    timestamps = chunk['datetime'].view(np.int64)
+
+    return chunk, timestamps, chunk_start
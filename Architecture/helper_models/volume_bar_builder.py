@@ -0,0 +1,151 @@
+"""Incremental sampling of market data by the volume clock."""
+
+from array import array
+
+from Architecture.data_structures.market_data import Bar, as_datetimes
+
+
+class VolumeBarBuilder:
+    """
+    Builds volume or dollar bars from trades (or time bars) as they arrive, so that the live
+    event loop can run on the volume clock rather than on every trade.
+
+    Each trade is added to the bar being built for its security, and a bar is sampled each
+    time the volume (or market value) collected crosses the sampling size of the security,
+    with any excess carried over to the next bar, as in Sampling.sampler.
+
+    Bars differ from Sampling.sampler when a trade crosses several multiples of the sampling
+    size, completing several bars at once. The bar is then emitted once, with the volume of
+    all trades it spans, together with the number of bars completed, so that the event loop
+    runs once per trade. Sampling.sampler instead emits one bar per multiple crossed, with
+    identical prices and times, splitting volume evenly across them. Repeating each bar
+    emitted by its number of bars completed, with volume divided by it, gives the bars of
+    Sampling.sampler on the same trades.
+
+    Time bars are only added to volume bars when fed explicitly with update_with_bar, e.g.
+    for data feeds providing time bars only.
+
+    Accumulators of the bars being built are kept in preallocated arrays, one slot per
+    security, so each trade is processed in constant time without allocating. Objects are
+    only created when a bar is completed.
+    """
+    def __init__(self, security_ids_and_sampling_sizes, method='VOLUME'):
+        """
+        Args:
+            security_ids_and_sampling_sizes (dict {security_id (int): sampling_size (float)}):
+                amount of volume/market value to collect before sampling 1 bar, for each security.
+            method (str): method to do sampling, either 'VOLUME' or 'DOLLAR'
+        """
+        # hyperparameters
+        if method.upper() not in ('VOLUME', 'DOLLAR'):
+            raise NotImplementedError(f"Sampling method: {method} is not supported!")
+        self.is_dollar_sampled = method.upper() == 'DOLLAR'
+        self.security_ids_and_indices = {security_id: index for index, security_id
+                                         in enumerate(security_ids_and_sampling_sizes)}
+        self.sampling_sizes = array('d', security_ids_and_sampling_sizes.values())
+
+        # internal data structures, accumulators of the bar being built for each security
+        number_of_securities = len(self.sampling_sizes)
+        self.sampling_counters = array('d', [0.]) * number_of_securities  # volume/dollar counters
+        self.opens = array('d', [0.]) * number_of_securities
+        self.highs = array('d', [0.]) * number_of_securities
+        self.lows = array('d', [0.]) * number_of_securities
+        self.closes = array('d', [0.]) * number_of_securities
+        self.volumes = array('d', [0.]) * number_of_securities
+        self.tick_counts = array('q', [0]) * number_of_securities
+
+        self.latest_bar = None  # latest bar completed, of any security
+        self.latest_number_of_bars = 0  # number of bars completed at once by latest bar
+
+        # statistics
+        self.bars_completed = 0
+
+    def update_with_trade(self, trade):
+        """
+        Args:
+            trade (Trade)
+
+        Returns:
+            number_of_bars_completed (int): number of bars completed by the trade, as latest_bar
+        """
+        return self.update(trade.security_id, trade.datetime, trade.last, trade.volume)
+
+    def update_with_trades(self, trades):
+        """
+        Adds a batch of trades, one trade at a time, in order of arrival.
+
+        Args:
+            trades (np.recarray): batch of trades, with the fields of TRADE_DTYPE
+
+        Returns:
+            completed_bars (List[tuple(position (int), bar (Bar), number_of_bars_completed (int))]):
+                bars completed by the batch in order of completion, with the position of the
+                trade completing each bar in the batch
+        """
+        completed_bars = []
+        for position, (security_id, datetime, price, volume) in\
+                enumerate(zip(trades.security_id.tolist(), as_datetimes(trades.datetime),
+                              trades.last.tolist(), trades.volume.tolist())):
+            number_of_bars_completed = self.update(security_id, datetime, price, volume)
+            if number_of_bars_completed:
+                completed_bars.append((position, self.latest_bar, number_of_bars_completed))
+
+        return completed_bars
+
+    def update_with_bar(self, bar):
+        """
+        Adds a time bar as a single tick, at its close price, as in Sampling.sampler.
+
+        Args:
+            bar (Bar)
+
+        Returns:
+            number_of_bars_completed (int): number of bars completed by the bar, as latest_bar
+        """
+        return self.update(bar.security_id, bar.datetime, bar.close, bar.volume)
+
+    def update(self, security_id, datetime, price, volume):
+        """
+        Adds a tick to the bar being built for the security.
+
+        Args:
+            security_id (int)
+            datetime (datetime.datetime)
+            price (float)
+            volume (float)
+
+        Returns:
+            number_of_bars_completed (int): number of bars completed by the tick, as latest_bar
+        """
+        index = self.security_ids_and_indices[security_id]
+
+        # first tick of the bar
+        if not self.tick_counts[index]:
+            self.opens[index] = price
+            self.highs[index] = price
+            self.lows[index] = price
+        elif price > self.highs[index]:
+            self.highs[index] = price
+        elif price < self.lows[index]:
+            self.lows[index] = price
+
+        self.closes[index] = price
+        self.volumes[index] += volume
+        self.tick_counts[index] += 1
+
+        sampling_counter = self.sampling_counters[index] + (price * volume if self.is_dollar_sampled else volume)
+        number_of_bars_completed = int(sampling_counter / self.sampling_sizes[index])
+
+        if number_of_bars_completed > 0:
+            self.latest_bar = Bar(security_id, datetime, self.opens[index], self.highs[index],
+                                  self.lows[index], price, self.volumes[index])
+            self.latest_number_of_bars = number_of_bars_completed
+            self.bars_completed += number_of_bars_completed
+
+            # Once a bar is completed, the next bar starts from the next tick.
+            self.volumes[index] = 0.
+            self.tick_counts[index] = 0
+            sampling_counter -= number_of_bars_completed * self.sampling_sizes[index]
+
+        self.sampling_counters[index] = sampling_counter
+        return number_of_bars_completed
@@ -8,6 +8,8 @@ from primary_models.data_model import DataModel
 from primary_models.alpha_model import AlphaModel
 from primary_models.portfolio_model import PortfolioModel
 from primary_models.execution_model import ExecutionModel
+from helper_models.replay_engine import ReplayEngine
+from data_structures.market_data import BAR, QUOTE, TRADE
 
 
 class MainStrategy:
@@ -23,8 +25,16 @@ class MainStrategy:
         self.portfolio_model = PortfolioModel()
         self.execution_model = ExecutionModel()
 
+        # hyperparameters
+        self.share_market_state = True  # models read latest data through a shared market state
+
+        # helper models
+        self.event_scheduler = None  # conflates events and schedules stages, if set
+        self.volume_bar_builder = None  # samples bars from trades by the volume clock, if set
+
         # internal data structures
         self.backtest_start_date = None
+        self.orders_to_execute = None  # orders emitted by portfolio, pending execution
 
     def main_event_loop(self):
         """
@@ -58,52 +68,247 @@ class MainStrategy:
         self.execution_model.execute_orders(orders_to_execute)
         self.execution_model.send_pending_orders()
 
+    def scheduled_event_loop(self):
+        """
+        Variant of main_event_loop used when an event scheduler is set, where each stage
+        runs at its own cadence rather than on every event:
+            1. Alpha Model: runs on every (conflated) update.
+            2. Portfolio Model: runs when due, e.g. at most once every 100ms.
+            3. Execution Model: runs when portfolio emits orders, or when state of an order changes.
+        """
+        current_time = self.data_model.current_time
+
+        # Alpha Model
+        self.alpha_model.update_factors_with_latest_data()
+        self.alpha_model.aggregate_signals_from_strategies()
+        signal = self.alpha_model.emit_alpha_signal()
+
+        # Portfolio Model
+        if self.event_scheduler.is_portfolio_due(current_time):
+            optimal_portfolio = self.portfolio_model.create_portfolio(signal)
+            self.orders_to_execute = self.portfolio_model.calculate_order_vector_and_emit(optimal_portfolio)
+            self.event_scheduler.record_portfolio_run(current_time, self.orders_to_execute)
+
+        # Execution Model
+        if self.event_scheduler.is_execution_due():
+            self.run_execution_stage()
+
+    def run_execution_stage(self):
+        """ Executes orders emitted by portfolio since execution last ran, and sends pending orders.
+        """
+        if self.orders_to_execute is not None:
+            self.execution_model.execute_orders(self.orders_to_execute)
+            self.orders_to_execute = None
+
+        self.execution_model.send_pending_orders()
+        self.event_scheduler.record_execution_run()
+
+    def run_event_loop(self):
+        """ Runs the main event loop, or the scheduled event loop if an event scheduler is set.
+        """
+        if self.event_scheduler is None:
+            self.main_event_loop()
+        else:
+            self.scheduled_event_loop()
+
+    def propagate_latest_data(self):
+        """
+        Publishes fresh data to the shared market state read by the other models, or sends
+        latest data to each model if market state is not shared.
+        """
+        if self.share_market_state:
+            self.data_model.publish_data()
+        else:
+            self.data_model.propagate_data([self.alpha_model, self.portfolio_model,
+                                            self.execution_model])
+
     def on_bar(self, bar):
         """
         Called whenever we receive a bar. Data model checks if bar is clean, collects the bar
         if it is and performs any preprocessing before propagating data to other models.
         """
+        self.flush_conflated_quotes()
+
         # First checks if bar received is clean
         bar_is_clean = self.data_model.assert_clean_data(bar)
 
         if bar_is_clean:
             self.data_model.collect_data(bar)
             self.data_model.preprocess_data(bar)
-            self.data_model.propagate_data([self.alpha_model, self.portfolio_model,
-                                            self.execution_model])
-            self.main_event_loop()
+            self.propagate_latest_data()
+            self.run_event_loop()
 
     def on_quote(self, quote):
         """
         Called whenever we receive a quote. Data model checks if quote is clean,
         collects the quote if it is and performs any preprocessing before
         propagating data to other models.
+
+        If an event scheduler is set, quotes are first conflated, and only the latest
+        quote of each security is processed once the conflation window closes, or once
+        any other event is received (see flush_conflated_quotes).
         """
+        if self.event_scheduler is not None:
+            self.on_conflated_quotes(self.event_scheduler.conflate_quote(quote))
+            return
+
         # First checks if quote received is clean
         quote_is_clean = self.data_model.assert_clean_data(quote)
 
         if quote_is_clean:
             self.data_model.collect_data(quote)
             self.data_model.preprocess_data(quote)
-            self.data_model.propagate_data([self.alpha_model, self.portfolio_model,
-                                            self.execution_model])
+            self.propagate_latest_data()
             self.main_event_loop()
 
+    def on_conflated_quotes(self, quotes):
+        """
+        Called whenever a conflation window closes, with the latest quote of each security
+        in the window. Clean quotes are collected and preprocessed together, before
+        propagating data to other models and running the event loop once.
+
+        Args:
+            quotes (List[Quote])
+        """
+        any_quote_is_clean = False
+        for quote in quotes:
+            if self.data_model.assert_clean_data(quote):
+                self.data_model.collect_data(quote)
+                self.data_model.preprocess_data(quote)
+                any_quote_is_clean = True
+
+        if any_quote_is_clean:
+            self.propagate_latest_data()
+            self.run_event_loop()
+
+    def flush_conflated_quotes(self):
+        """
+        Processes quotes pending in the current conflation window, if an event scheduler is
+        set. Called before any other event is processed, so that events are processed in
+        the order they are received, and at the end of a backtest, so that quotes are not
+        held back when no further quotes arrive.
+        """
+        if self.event_scheduler is not None and self.event_scheduler.pending_events:
+            self.on_conflated_quotes(self.event_scheduler.release_pending_quotes())
+
+    def on_order_event(self, order_event):
+        """
+        Called whenever state of an order changes (e.g. filled, cancelled). If an event
+        scheduler is set, execution runs on order state changes.
+
+        Args:
+            order_event (order event): latest order event received
+        """
+        if self.event_scheduler is not None:
+            self.flush_conflated_quotes()
+            self.event_scheduler.record_order_event()
+            self.run_execution_stage()
+
     def on_trade(self, trade):
         """
         Called whenever we receive a trade. Data model checks if trade is clean,
         collects the trade if it is and performs any preprocessing before
         propagating data to other models.
+
+        If a volume bar builder is set, the event loop runs on the volume clock instead:
+        clean trades are added to the volume bars being built, and each completed bar is
+        processed once by on_bar, even if the trade completes several bars at once. Time
+        bars received by on_bar/on_bars are processed as they are, and are not added to
+        volume bars.
         """
+        self.flush_conflated_quotes()
+
         # First checks if trade received is clean
         trade_is_clean = self.data_model.assert_clean_data(trade)
 
         if trade_is_clean:
             self.data_model.collect_data(trade)
             self.data_model.preprocess_data(trade)
-            self.data_model.propagate_data([self.alpha_model, self.portfolio_model,
-                                            self.execution_model])
-            self.main_event_loop()
+
+            if self.volume_bar_builder is None:
+                self.propagate_latest_data()
+                self.run_event_loop()
+                return
+
+            # number of bars completed at once is kept by the builder, see latest_number_of_bars
+            if self.volume_bar_builder.update_with_trade(trade):
+                self.on_bar(self.volume_bar_builder.latest_bar)
+
+    def on_bars(self, bars):
+        """
+        Called whenever we receive a batch of bars, e.g. a burst of updates in a single
+        packet. Data model checks which bars are clean, and collects and preprocesses the
+        clean bars together before propagating data to other models. The main event loop
+        runs once for the whole batch.
+
+        Args:
+            bars (np.ndarray or dict {field (str): values (np.array)}): structured array,
+                or columnar batch, of bars
+        """
+        self.on_batch(bars, data_type=BAR)
+
+    def on_quotes(self, quotes):
+        """
+        Called whenever we receive a batch of quotes. The main event loop runs once for
+        the whole batch, see on_bars.
+
+        Args:
+            quotes (np.ndarray or dict {field (str): values (np.array)}): structured array,
+                or columnar batch, of quotes
+        """
+        self.on_batch(quotes, data_type=QUOTE)
+
+    def on_trades(self, trades):
+        """
+        Called whenever we receive a batch of trades. The main event loop runs once for
+        the whole batch, see on_bars.
+
+        Args:
+            trades (np.ndarray or dict {field (str): values (np.array)}): structured array,
+                or columnar batch, of trades
+        """
+        self.on_batch(trades, data_type=TRADE)
+
+    def on_batch(self, batch, data_type):
+        """
+        Cleans, collects and preprocesses a batch of market data, and propagates data to other
+        models before running the main event loop once.
+
+        If a volume bar builder is set, clean trades in a batch are added to the volume bars
+        being built instead. The batch is split at trades completing a bar: trades up to
+        each such trade are collected and preprocessed, before the bar is processed by
+        on_bar, so that current time never moves back.
+
+        Args:
+            batch (np.ndarray or dict {field (str): values (np.array)})
+            data_type (str): type of market data in the batch, 'bar', 'quote' or 'trade'
+        """
+        self.flush_conflated_quotes()
+
+        # First filters clean rows from batch received
+        clean_batch = self.data_model.filter_clean_batch(batch, data_type)
+
+        if not len(clean_batch):
+            return
+
+        if data_type == TRADE and self.volume_bar_builder is not None:
+            segment_start = 0
+            for position, bar, _ in self.volume_bar_builder.update_with_trades(clean_batch):
+                self.data_model.collect_batch(clean_batch[segment_start:position + 1], data_type)
+                self.data_model.preprocess_batch(clean_batch[segment_start:position + 1], data_type)
+                self.on_bar(bar)
+                segment_start = position + 1
+
+            # trades after the last bar completed are collected, as in on_trade
+            if segment_start < len(clean_batch):
+                self.data_model.collect_batch(clean_batch[segment_start:], data_type)
+                self.data_model.preprocess_batch(clean_batch[segment_start:], data_type)
+            return
+
+        self.data_model.collect_batch(clean_batch, data_type)
+        self.data_model.preprocess_batch(clean_batch, data_type)
+        self.propagate_latest_data()
+        self.run_event_loop()
 
     def on_strategy_start(self):
         """ Called when strategy is first started, prepares the primary models for trading.
@@ -114,6 +319,26 @@ class MainStrategy:
         self.prepare_portfolio_model()
         self.prepare_execution_model()
 
+    def run_backtest(self, replay_files):
+        """
+        Backtests the strategy from backtest start date, by replaying historical market data
+        from memory-mapped files in timestamp order.
+
+        Args:
+            replay_files (List[tuple(path (str), data_type (str))]): .npy files of historical
+                bars, quotes or trades, see ReplayEngine.
+
+        Returns:
+            replay_statistics (dict): number of events replayed and events per second
+        """
+        self.on_strategy_start()
+
+        replay_engine = ReplayEngine(self)
+        for path, data_type in replay_files:
+            replay_engine.add_source(path, data_type)
+
+        return replay_engine.run()
+
     def prepare_universe_model(self):
         """
         Prepares the universe model by calling it to:
@@ -136,10 +361,17 @@ class MainStrategy:
                                                 self.portfolio_model, self.execution_model])
 
     def prepare_data_model(self):
-        """ Prepares data model by initialising data structures for each security in the universe.
+        """ Prepares data model by initialising data structures for each security in the universe,
+        and registers the shared market state with the other models.
         """
+        # Per-pair factor models read whole events, while the factor bank only reads the market data store.
+        self.data_model.keep_latest_events = not self.alpha_model.use_pair_spread_factor_bank
         self.data_model.initialise_data_structures()
 
+        if self.share_market_state:
+            self.data_model.register_models([self.alpha_model, self.portfolio_model,
+                                             self.execution_model])
+
     def prepare_alpha_model(self):
         """ Prepares alpha model by initialising factor models based on trading universe.
         """
@@ -1,6 +1,8 @@
+import numpy as np
 from itertools import combinations
 
 from Architecture.factor_models.pair_spread_factor import PairSpreadFactor
+from Architecture.factor_models.pair_spread_factor_bank import PairSpreadFactorBank
 
 
 class AlphaModel:
@@ -10,8 +12,18 @@ class AlphaModel:
     indicators and generate signals based off the indicators.
     """
     def __init__(self):
+        # hyperparameters
+        self.use_pair_spread_factor_bank = False  # trade all pairs in one vectorized factor model
+
         # internal data structures
         self.factor_universes_and_models = {}
+        self.pair_spread_factor_bank = None
+        self.pair_spread_factor_bank_signals = None  # latest signals generated by factor bank
+        self.indices_and_securities = []
+        self.securities_and_factor_universes = {}  # inverted index of factor universes
+        self.factor_universes_and_indices = {}  # security indices of each factor universe
+        self.factor_universes_and_signals = {}  # latest signals generated by each factor model, by security
+        self.updated_factor_universes = set()  # factor models updated since signals were aggregated
 
         # data structures received from data model
         self.securities_and_latest_quote = {}
@@ -19,22 +31,47 @@ class AlphaModel:
         self.securities_and_latest_bar = {}
         self.securities_and_latest_usd_price = {}
         self.current_time = None
+        self.market_data = None  # read-only view of columnar market data store
+        self.market_state = None  # shared market state, if registered with data model
+        self.market_state_version = 0  # version of market state when factors were last updated
+        self.updated_securities = set()
+        self.repriced_securities = set()  # securities whose price in USD changed, a subset of updated securities
 
         # data structures received from universe model
         self.securities_and_ids = {}
+        self.securities_and_indices = {}
         self.security_clusters = {}
 
         # data structures to pass to portfolio model
+        self.alpha_signal_vector = np.zeros(0)  # aggregated alpha signals, by security index
         self.alpha_signals = {}
 
     def update_factors_with_latest_data(self):
-        """ Updates each factor model with latest data for factor model to function
         """
-        # Loop through each factor model, and the subset of securities traded by the factor
-        for factor_universe, factor_model in self.factor_universes_and_models.items():
-            # Loops through each security in the factor universe to update factor model
-            for security in factor_universe:
-                self.update_specific_factor_model(security, factor_model)
+        Updates factor models with latest data for factor models to function. Only factor
+        models trading securities which changed since the last update are updated.
+        """
+        # Reads securities which changed from market state, unless market state is unchanged
+        if self.market_state is not None:
+            if self.market_state.version == self.market_state_version:
+                return
+            self.market_state_version = self.market_state.version
+            self.current_time = self.market_state.current_time
+            self.updated_securities = self.market_state.updated_securities
+            self.repriced_securities = self.market_state.repriced_securities
+
+        # Loop through each security which changed, and the factor models trading the security
+        for security in self.updated_securities:
+            for factor_universe in self.securities_and_factor_universes.get(security, ()):
+                self.update_specific_factor_model(security, self.factor_universes_and_models[factor_universe])
+                self.updated_factor_universes.add(factor_universe)
+
+        # Factor bank updates all pairs trading securities repriced in one step. Pairs only
+        # observe prices in USD, so trades and bars would feed the same prices again.
+        if self.pair_spread_factor_bank is not None and self.repriced_securities:
+            updated_indices = [self.securities_and_indices[security] for security in self.repriced_securities]
+            updated_pairs = self.pair_spread_factor_bank.pairs_trading_securities(updated_indices)
+            self.pair_spread_factor_bank.receive_data(self.market_data.usd_price, updated_pairs)
 
     def update_specific_factor_model(self, security, factor_model):
         """
@@ -52,18 +89,44 @@ class AlphaModel:
                                    "latest_usd_price": self.securities_and_latest_usd_price[security]})
 
     def aggregate_signals_from_strategies(self):
-        """ Calls each factor model to generate signals, and aggregates signals across factors
         """
-        # Initialise aggregated alpha signals
-        alpha_signals = {security: 0 for security in self.securities_and_ids}
-
-        # Loop through each factor model, and the subset of securities traded by the factor
-        for factor_universe, factor_model in self.factor_universes_and_models.items():
-            signals = factor_model.generate_signals()
-            for security in factor_universe:
-                alpha_signals[security] += signals[security]
-
-        self.alpha_signals = alpha_signals
+        Calls factor models updated since signals were last aggregated to generate signals,
+        and aggregates signals across factors. Signals of factor models which were not
+        updated are unchanged and contribute nothing, so only the change in signals of
+        updated factors is accumulated, into an array of signals indexed by security index.
+        """
+        # Collects change in signals of each updated factor model, by security index
+        changed_indices = []
+        signal_changes = []
+        for factor_universe in self.updated_factor_universes:
+            signals = self.factor_universes_and_models[factor_universe].generate_signals()
+            signals = np.array([signals[security] for security in factor_universe], dtype=float)
+
+            changed_indices.append(self.factor_universes_and_indices[factor_universe])
+            signal_changes.append(signals - self.factor_universes_and_signals[factor_universe])
+            self.factor_universes_and_signals[factor_universe] = signals
+
+        self.updated_factor_universes = set()
+
+        # Accumulates changes across factors, securities may be traded by several factors
+        if changed_indices:
+            aggregated_signal_changes = np.bincount(np.concatenate(changed_indices),
+                                                    weights=np.concatenate(signal_changes),
+                                                    minlength=self.alpha_signal_vector.size)
+        else:
+            aggregated_signal_changes = np.zeros(self.alpha_signal_vector.size)
+
+        # Change in signals of factor bank
+        if self.pair_spread_factor_bank is not None:
+            signals = self.pair_spread_factor_bank.generate_signals()
+            aggregated_signal_changes += signals - self.pair_spread_factor_bank_signals
+            self.pair_spread_factor_bank_signals = signals
+
+        self.alpha_signal_vector += aggregated_signal_changes
+
+        # Updates alpha signals of securities whose signals changed only
+        for index in np.flatnonzero(aggregated_signal_changes).tolist():
+            self.alpha_signals[self.indices_and_securities[index]] = self.alpha_signal_vector[index]
 
     def emit_alpha_signal(self):
         """
@@ -82,8 +145,24 @@ class AlphaModel:
             trading_universe (dict): securities and currencies to trade
         """
         self.securities_and_ids = trading_universe['securities_and_ids']
+        self.securities_and_indices = trading_universe['securities_and_indices']
         self.security_clusters = trading_universe['security_clusters']
 
+    def receive_market_state(self, market_state):
+        """
+        Receives shared market state from data model, once at startup. Latest data is then
+        read through the market state rather than received on every event.
+
+        Args:
+            market_state (MarketState)
+        """
+        self.market_state = market_state
+        self.securities_and_latest_quote = market_state.securities_and_latest_quote
+        self.securities_and_latest_trade = market_state.securities_and_latest_trade
+        self.securities_and_latest_bar = market_state.securities_and_latest_bar
+        self.securities_and_latest_usd_price = market_state.securities_and_latest_usd_price
+        self.market_data = market_state.market_data
+
     def receive_latest_data(self, latest_data):
         """
         Receives latest data from data model.
@@ -96,6 +175,9 @@ class AlphaModel:
         self.securities_and_latest_bar = latest_data['securities_and_latest_bar']
         self.securities_and_latest_usd_price = latest_data['securities_and_latest_usd_price']
         self.current_time = latest_data['current_time']
+        self.market_data = latest_data['market_data']
+        self.updated_securities = latest_data['updated_securities']
+        self.repriced_securities = latest_data['repriced_securities']
 
     def initialise_factor_models(self):
         """
@@ -105,7 +187,9 @@ class AlphaModel:
 
         As an example, we will create factors for each pair of securities in the trading
         universe. Such factors focus on pair-trading; a common strategy used by traders to
-        take long-short positions in a pair of highly correlated securities.
+        take long-short positions in a pair of highly correlated securities. For large
+        clusters, all pairs may be traded by a single vectorized factor bank instead of
+        creating one factor model per pair.
         """
         # Create pairs of securities from clusters
         pairs_of_securities = []
@@ -113,5 +197,26 @@ class AlphaModel:
         for cluster in self.security_clusters.values():
             pairs_of_securities.extend(list(combinations(cluster, 2)))
 
-        for pair in pairs_of_securities:
-            self.factor_universes_and_models[pair] = PairSpreadFactor(pair)
+        self.indices_and_securities = sorted(self.securities_and_indices, key=self.securities_and_indices.get)
+
+        if self.use_pair_spread_factor_bank:
+            pairs_of_indices = [(self.securities_and_indices[security_1], self.securities_and_indices[security_2])
+                                for security_1, security_2 in pairs_of_securities]
+            self.pair_spread_factor_bank = PairSpreadFactorBank(pairs_of_indices, len(self.securities_and_indices))
+            self.pair_spread_factor_bank_signals = np.zeros(len(self.securities_and_indices))
+        else:
+            for pair in pairs_of_securities:
+                self.factor_universes_and_models[pair] = PairSpreadFactor(pair)
+
+        # Inverted index, to look up factor models affected by changes in a security
+        for factor_universe in self.factor_universes_and_models:
+            for security in factor_universe:
+                self.securities_and_factor_universes.setdefault(security, []).append(factor_universe)
+
+            self.factor_universes_and_indices[factor_universe] =\
+                np.array([self.securities_and_indices[security] for security in factor_universe], dtype=np.intp)
+            self.factor_universes_and_signals[factor_universe] = np.zeros(len(factor_universe))
+
+        # Initialise aggregated alpha signals
+        self.alpha_signal_vector = np.zeros(len(self.securities_and_indices))
+        self.alpha_signals = {security: 0 for security in self.securities_and_ids}
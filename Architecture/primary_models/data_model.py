@@ -1,6 +1,11 @@
 import logging
 import numpy as np
-from collections import deque
+
+from Architecture.data_structures.market_data import BAR, QUOTE, TRADE, as_datetimes, events_from_rows
+from Architecture.data_structures.market_data_store import MarketDataStore
+from Architecture.data_structures.market_state import MarketState
+from Architecture.data_structures.rolling_median import RollingMedian
+from Architecture.data_structures.trading_hours_index import TradingHoursIndex
 
 logging.basicConfig(format='%(asctime)s %(name)s: [%(levelname)s] %(message)s',
                     datefmt='%Y/%m/%d %H:%M:%S',
@@ -14,15 +19,22 @@ class DataModel:
     """
     def __init__(self):
         # internal data structures
-        self.bar_object = None
-        self.quote_object = None
-        self.trade_object = None
         self.trading_hours = {}
+        self.special_trading_hours = {}  # holidays and half-days, Dict {security: Dict {date: trading_intervals}}
+        self.trading_hours_index = None
         self.currencies_and_latest_bar = {}
 
-        # data structures used to check for outliers
+        # hyperparameters to check for outliers
+        self.maximum_acceptable_pct_change = .333
+        self.data_points_needed = 1000
+
+        # hyperparameters
+        self.keep_latest_events = True  # keeps latest bar/quote/trade objects, for models reading whole events
+
+        # data structures used to check for outliers, rolling medians of clean prices
         self.securities_and_clean_bars = {}
-        self.securities_and_clean_quotes = {}
+        self.securities_and_clean_asks = {}
+        self.securities_and_clean_bids = {}
         self.securities_and_clean_trades = {}
         self.currencies_and_clean_bars = {}
 
@@ -35,10 +47,17 @@ class DataModel:
         self.securities_and_latest_bar = {}
         self.securities_and_latest_usd_price = {}
         self.current_time = None
+        self.market_data_store = None
+        self.currencies_and_quoted_securities = {}  # Dict {currency: (securities, security indices)}
+        self.updated_securities = set()  # securities which changed since data was last propagated
+        self.repriced_securities = set()  # securities whose price in USD changed since data was last propagated
+        self.market_state = None  # shared with other models, registered once at startup
 
         # data structures received from universe model
         self.securities_and_ids = {}
+        self.securities_and_indices = {}
         self.currencies_and_ids = {}
+        self.ids_and_securities = {}
 
     def assert_clean_data(self, data):
         """
@@ -47,7 +66,7 @@ class DataModel:
         reasonable
 
         Args:
-            data (bar/tick/trade): latest market data received
+            data (Bar/Quote/Trade): latest market data received
 
         Returns:
             data_is_clean (bool)
@@ -58,7 +77,8 @@ class DataModel:
         # Checks first for whether data is within trading hours
         within_trading_hours = self.assert_within_trading_hours(data)
         if not within_trading_hours:
-            self.logger.warning(f"Data received outside trading hours | Security: {data.security} | Time: {data.datetime}\n")
+            self.logger.warning(f"Data received outside trading hours | "
+                                f"Security: {self.ids_and_securities[data.security_id]} | Time: {data.datetime}\n")
             return data_is_clean
 
         # Outlier checks
@@ -69,29 +89,17 @@ class DataModel:
 
     def assert_within_trading_hours(self, data):
         """
-        Checks if latest data is received during trading hours.
+        Checks if latest data is received during trading hours, by looking up trading
+        hours compiled when the trading universe is loaded.
 
         Args:
-            data (bar/tick/trade): latest market data received
+            data (Bar/Quote/Trade): latest market data received
 
         Returns:
             within_trading_hours (bool)
         """
-        # initialise boolean
-        within_trading_hours = False
-
-        security = data.security
-        for trading_intervals in self.trading_hours[security]:
-            # If trading hours spill over to next day
-            if trading_intervals[1] < trading_intervals[0]:
-                within_trading_hours = trading_intervals[0] < data.datetime.time() or\
-                                       data.datetime.time() < trading_intervals[1]
-            else:
-                within_trading_hours = trading_intervals[0] < data.datetime.time() < trading_intervals[1]
-
-            if within_trading_hours:
-                break
-
+        security = self.ids_and_securities[data.security_id]
+        within_trading_hours = self.trading_hours_index.is_within_trading_hours(security, data.datetime)
         return within_trading_hours
 
     def assert_not_outlier(self, data):
@@ -99,118 +107,360 @@ class DataModel:
         Checks if the latest data is not an outlier, by making sure that latest prices
         reflected are reasonable.
 
-        For example, we may keep a deque of previous prices, compute the median and check that latest
-        price is not too far away (relatively) from the median.
+        For example, we keep a rolling median of previous clean prices, and check that latest
+        price is not too far away (relatively) from the median. Rolling medians are updated
+        incrementally, so each check costs O(log n) in the number of data points needed.
 
         Args:
-            data (bar/tick/trade): latest market data received
+            data (Bar/Quote/Trade): latest market data received
 
         Returns:
             not_outlier (bool)
         """
-        # initialise boolean
-        not_outlier = False
-
-        # hyperparameters to check for outliers
-        maximum_acceptable_pct_change = .333
-        data_points_needed = 1000
-
-        security = data.security
-        if isinstance(data, self.bar_object):
-            # Not enough data to ascertain if latest data is clean, so assume it is
-            if len(self.securities_and_clean_bars[security]) < data_points_needed:
-                self.securities_and_clean_bars[security].append(data.close)
-                not_outlier = True
-            else:
-                median_close_price = np.median(self.securities_and_clean_bars[security])
-                # Data is not outlier, so append it to clean bars and pop oldest bar
-                if abs((data.close - median_close_price) / median_close_price) < maximum_acceptable_pct_change:
-                    self.securities_and_clean_bars[security].append(data.close)
-                    self.securities_and_clean_bars[security].popleft()
-                    not_outlier = True
-                else:
-                    self.logger.warning(f"Outlier bar | Security: {security} | Close: {data.close}\n")
-
-        elif isinstance(data, self.trade_object):
-            # Not enough data to ascertain if latest data is clean, so assume it is
-            if len(self.securities_and_clean_trades[security]) < data_points_needed:
-                self.securities_and_clean_trades[security].append(data.last)
-                not_outlier = True
-            else:
-                median_last_price = np.median(self.securities_and_clean_trades[security])
-                # Data is not outlier, so append it to clean trades and pop oldest trade
-                if abs((data.last - median_last_price) / median_last_price) < maximum_acceptable_pct_change:
-                    self.securities_and_clean_trades[security].append(data.last)
-                    self.securities_and_clean_trades[security].popleft()
-                    not_outlier = True
-                else:
-                    self.logger.warning(f"Outlier trade | Security: {security} | Last: {data.last}\n")
-
-        elif isinstance(data, self.quote_object):
-            # Not enough data to ascertain if latest data is clean, so assume it is
-            if len(self.securities_and_clean_quotes[security]) < data_points_needed:
-                self.securities_and_clean_quotes[security].append((data.ask, data.bid))
-                not_outlier = True
+        security = self.ids_and_securities[data.security_id]
+        data_type = data.data_type
+        if data_type == BAR:
+            # Checks if data belongs to a security or a currency
+            if security in self.securities_and_clean_bars:
+                clean_bars = self.securities_and_clean_bars[security]
             else:
-                median_quote_price = np.median(self.securities_and_clean_quotes[security], axis=0)
-                median_ask_price = median_quote_price[0]
-                median_bid_price = median_quote_price[1]
-                # Data is not outlier, so append it to clean quotes and pop oldest quote
-                if abs((data.ask - median_ask_price) / median_ask_price) < maximum_acceptable_pct_change and\
-                   abs((data.bid - median_bid_price) / median_bid_price) < maximum_acceptable_pct_change:
-                    self.securities_and_clean_quotes[security].append((data.ask, data.bid))
-                    self.securities_and_clean_quotes[security].popleft()
-                    not_outlier = True
-                else:
-                    self.logger.warning(f"Outlier quote | Security: {security} | Ask: {data.ask} | Bid: {data.bid}\n")
-                    
+                clean_bars = self.currencies_and_clean_bars[security]
+
+            not_outlier = self._assert_within_median_range(data.close, clean_bars)
+            if not not_outlier:
+                self.logger.warning(f"Outlier bar | Security: {security} | Close: {data.close}\n")
+
+        elif data_type == TRADE:
+            not_outlier = self._assert_within_median_range(data.last,
+                                                           self.securities_and_clean_trades[security])
+            if not not_outlier:
+                self.logger.warning(f"Outlier trade | Security: {security} | Last: {data.last}\n")
+
+        elif data_type == QUOTE:
+            not_outlier = self._assert_quote_within_median_range(data.ask, data.bid,
+                                                                 self.securities_and_clean_asks[security],
+                                                                 self.securities_and_clean_bids[security])
+            if not not_outlier:
+                self.logger.warning(f"Outlier quote | Security: {security} | Ask: {data.ask} | Bid: {data.bid}\n")
+
         else:
-            raise NotImplementedError(f"Data type {type(data)} is not supported!")
+            raise NotImplementedError(f"Data type {data_type} is not supported!")
 
         return not_outlier
 
+    def _assert_within_median_range(self, price, clean_prices):
+        """
+        Checks a price against the rolling median of clean prices, and appends the
+        price to clean prices if it is not an outlier.
+
+        Args:
+            price (float): latest price received
+            clean_prices (RollingMedian): rolling median of previous clean prices
+
+        Returns:
+            not_outlier (bool)
+        """
+        # Not enough data to ascertain if latest data is clean, so assume it is
+        if not clean_prices.is_full():
+            not_outlier = True
+        else:
+            not_outlier = self._is_within_median_range(price, clean_prices.median())
+
+        # Data is not outlier, so append it to clean prices (oldest price is popped)
+        if not_outlier:
+            clean_prices.append(price)
+
+        return not_outlier
+
+    def _assert_quote_within_median_range(self, ask, bid, clean_asks, clean_bids):
+        """
+        Checks ask and bid prices against the rolling medians of clean asks and bids, and
+        appends both prices if the quote is not an outlier.
+
+        Args:
+            ask (float): latest ask price received
+            bid (float): latest bid price received
+            clean_asks (RollingMedian): rolling median of previous clean ask prices
+            clean_bids (RollingMedian): rolling median of previous clean bid prices
+
+        Returns:
+            not_outlier (bool)
+        """
+        # Not enough data to ascertain if latest data is clean, so assume it is
+        if not clean_asks.is_full():
+            not_outlier = True
+        else:
+            not_outlier = self._is_within_median_range(ask, clean_asks.median()) and\
+                          self._is_within_median_range(bid, clean_bids.median())
+
+        # Data is not outlier, so append it to clean quotes (oldest quote is popped)
+        if not_outlier:
+            clean_asks.append(ask)
+            clean_bids.append(bid)
+
+        return not_outlier
+
+    def _is_within_median_range(self, price, median_price):
+        """
+        Args:
+            price (float)
+            median_price (float)
+
+        Returns:
+            within_median_range (bool)
+        """
+        # relative change is infinite (or undefined) around a zero median
+        if median_price == 0:
+            return False
+
+        return abs((price - median_price) / median_price) < self.maximum_acceptable_pct_change
+
     def collect_data(self, data):
         """
         Collects market data and updates data structures. Called after ensuring
-        that data is clean.
+        that data is clean. Latest market data of securities is written to the columnar
+        market data store, and only kept as event objects if keep_latest_events is set.
 
         Args:
-            data (bar/tick/trade): latest market data received
+            data (Bar/Quote/Trade): latest market data received
         """
-        security = data.security
+        security = self.ids_and_securities[data.security_id]
         self.current_time = data.datetime
-        if isinstance(data, self.bar_object):
+        data_type = data.data_type
+        if data_type == BAR:
             # Checks if data belongs to a security or a currency
             if self.securities_and_ids.get(security) is not None:
-                self.securities_and_latest_bar[security] = data
+                if self.keep_latest_events:
+                    self.securities_and_latest_bar[security] = data
+                self.updated_securities.add(security)
+                self.market_data_store.update_bar(self.securities_and_indices[security],
+                                                  data.close, data.volume, data.datetime)
             else:
                 self.currencies_and_latest_bar[security] = data
-        elif isinstance(data, self.trade_object):
-            self.securities_and_latest_trade[security] = data
-        elif isinstance(data, self.quote_object):
-            self.securities_and_latest_quote[security] = data
+        elif data_type == TRADE:
+            if self.keep_latest_events:
+                self.securities_and_latest_trade[security] = data
+            self.updated_securities.add(security)
+            self.market_data_store.update_trade(self.securities_and_indices[security], data.last, data.datetime)
+        elif data_type == QUOTE:
+            if self.keep_latest_events:
+                self.securities_and_latest_quote[security] = data
+            self.updated_securities.add(security)
+            self.market_data_store.update_quote(self.securities_and_indices[security],
+                                                data.ask, data.bid, data.datetime)
         else:
-            raise NotImplementedError(f"Data type {type(data)} is not supported!")
+            raise NotImplementedError(f"Data type {data_type} is not supported!")
 
     def preprocess_data(self, data):
         """
         Performs any necessary preprocessing for strategies to create indicators.
 
         As an example, we will calculate latest price in USD based on the mid-price of
-        latest quote data. Currency conversions will be done if necessary.
+        latest quote data. Currency conversions will be done if necessary, using conversion
+        rates by security which are only updated when a currency bar arrives. A currency bar
+        reprices all securities quoted in the currency at once.
 
         Args:
-            data (bar/tick/trade): latest market data received
+            data (Bar/Quote/Trade): latest market data received
         """
-        if isinstance(data, self.quote_object):
-            security = data.security
-            mid_price = (data.ask + data.bid) / 2
-            # If base currency is not in USD, need to perform conversion
-            if security.quote_currency != 'USD':
-                conversion_rate = self.currencies_and_latest_bar[f"{security.quote_currency}USD"].close
-                mid_price *= conversion_rate
+        data_type = data.data_type
+        if data_type == QUOTE:
+            security = self.ids_and_securities[data.security_id]
+            index = self.securities_and_indices[security]
+            usd_price = (data.ask + data.bid) / 2 * self.market_data_store.usd_conversion_rate[index]
+
+            self.securities_and_latest_usd_price[security] = usd_price
+            self.market_data_store.update_usd_price(index, usd_price)
+            self.repriced_securities.add(security)
+
+        elif data_type == BAR:
+            security = self.ids_and_securities[data.security_id]
+            if security in self.currencies_and_quoted_securities:
+                self.update_usd_conversion_rate(security, data.close)
+
+    def update_usd_conversion_rate(self, currency, conversion_rate):
+        """
+        Updates conversion rate of a currency to USD, and reprices securities quoted in the
+        currency with a single vectorized multiply.
 
-            self.securities_and_latest_usd_price[security] = mid_price
+        Args:
+            currency (str): currency symbol, e.g. 'EURUSD'
+            conversion_rate (float): latest conversion rate
+        """
+        securities, indices = self.currencies_and_quoted_securities[currency]
+        if not securities:
+            return
+
+        usd_prices = self.market_data_store.update_usd_conversion_rate(indices, conversion_rate)
+
+        # Securities are repriced once they receive a quote
+        has_quote = ~np.isnan(usd_prices)
+        repriced_securities = [security for security, is_repriced in zip(securities, has_quote.tolist()) if is_repriced]
+        self.securities_and_latest_usd_price.update(zip(repriced_securities, usd_prices[has_quote].tolist()))
+        self.updated_securities.update(repriced_securities)
+        self.repriced_securities.update(repriced_securities)
+
+    def filter_clean_batch(self, batch, data_type):
+        """
+        Batch counterpart of assert_clean_data, used when market data arrives in bursts.
+        Checks that each row in a batch of market data is clean and reasonable, and
+        returns the clean rows only.
+
+        Args:
+            batch (np.ndarray or dict {field (str): values (np.array)}): structured array, or
+                columnar batch, of market data, with the fields of BAR_DTYPE, QUOTE_DTYPE or
+                TRADE_DTYPE. Only 'security_id', 'datetime', and 'close' and 'volume' for bars,
+                'ask' and 'bid' for quotes, or 'last' for trades are required.
+            data_type (str): type of market data in the batch, 'bar', 'quote' or 'trade'
+
+        Returns:
+            clean_batch (np.recarray): rows in the batch which are clean, in order of arrival
+        """
+        batch = _as_record_batch(batch)
+
+        # Checks first for whether data is within trading hours
+        within_trading_hours = self.assert_within_trading_hours_batch(batch)
+        if not within_trading_hours.all():
+            self.logger.warning(f"{np.count_nonzero(~within_trading_hours)} {data_type}(s) in batch "
+                                f"received outside trading hours\n")
+            batch = batch[within_trading_hours]
+
+        # Outlier checks
+        not_outlier = self.assert_not_outlier_batch(batch, data_type)
+
+        clean_batch = batch[not_outlier]
+        return clean_batch
+
+    def assert_within_trading_hours_batch(self, batch):
+        """
+        Checks if each row in a batch of market data is received during trading hours,
+        with a single lookup in compiled trading hours for all rows.
+
+        Args:
+            batch (np.recarray): batch of market data
+
+        Returns:
+            within_trading_hours (np.array[bool])
+        """
+        security_ids, security_positions = np.unique(batch.security_id, return_inverse=True)
+        security_codes = np.array([self.trading_hours_index.securities_and_codes[self.ids_and_securities[security_id]]
+                                   for security_id in security_ids.tolist()], dtype=np.intp)
+
+        within_trading_hours =\
+            self.trading_hours_index.are_within_trading_hours(security_codes[security_positions], batch.datetime)
+        return within_trading_hours
+
+    def assert_not_outlier_batch(self, batch, data_type):
+        """
+        Checks if each row in a batch of market data is not an outlier. Rows are checked
+        in order of arrival, as every clean price updates the rolling medians used to
+        check the prices that follow it, so decisions are identical to assert_not_outlier.
+
+        Args:
+            batch (np.recarray): batch of market data
+            data_type (str): type of market data in the batch, 'bar', 'quote' or 'trade'
+
+        Returns:
+            not_outlier (np.array[bool])
+        """
+        security_ids, security_positions = np.unique(batch.security_id, return_inverse=True)
+        securities = [self.ids_and_securities[security_id] for security_id in security_ids.tolist()]
+        security_positions = security_positions.tolist()
+
+        if data_type == BAR:
+            clean_bars = [self.securities_and_clean_bars[security] if security in self.securities_and_clean_bars
+                          else self.currencies_and_clean_bars[security] for security in securities]
+            not_outlier = [self._assert_within_median_range(close, clean_bars[position]) for
+                           close, position in zip(batch.close.tolist(), security_positions)]
+
+        elif data_type == TRADE:
+            clean_trades = [self.securities_and_clean_trades[security] for security in securities]
+            not_outlier = [self._assert_within_median_range(last, clean_trades[position]) for
+                           last, position in zip(batch.last.tolist(), security_positions)]
+
+        elif data_type == QUOTE:
+            clean_asks = [self.securities_and_clean_asks[security] for security in securities]
+            clean_bids = [self.securities_and_clean_bids[security] for security in securities]
+            not_outlier = [self._assert_quote_within_median_range(ask, bid, clean_asks[position], clean_bids[position])
+                           for ask, bid, position in zip(batch.ask.tolist(), batch.bid.tolist(), security_positions)]
+
+        else:
+            raise NotImplementedError(f"Data type {data_type} is not supported!")
+
+        not_outlier = np.array(not_outlier, dtype=bool)
+        if not not_outlier.all():
+            self.logger.warning(f"{np.count_nonzero(~not_outlier)} outlier {data_type}(s) in batch\n")
+
+        return not_outlier
+
+    def collect_batch(self, clean_batch, data_type):
+        """
+        Batch counterpart of collect_data. Only the latest row of each security is kept,
+        which leaves data structures in the same state as collecting rows one at a time:
+        latest rows are kept as Bar/Quote/Trade events (if keep_latest_events is set), and
+        current time as datetime.datetime.
+
+        Args:
+            clean_batch (np.recarray): clean rows of market data, in order of arrival
+            data_type (str): type of market data in the batch, 'bar', 'quote' or 'trade'
+        """
+        self.current_time = as_datetimes(clean_batch.datetime[-1:])[0]
+
+        security_ids, latest_rows = _latest_rows_by_security(clean_batch)
+        securities = [self.ids_and_securities[security_id] for security_id in security_ids]
+
+        # Checks if data belongs to a security or a currency
+        is_security = np.array([security in self.securities_and_indices for security in securities], dtype=bool)
+        securities_in_universe = [security for security in securities if security in self.securities_and_indices]
+        indices = np.array([self.securities_and_indices[security] for security in securities_in_universe],
+                           dtype=np.intp)
+        security_rows = latest_rows[is_security]
+        security_events = events_from_rows(security_rows, data_type) if self.keep_latest_events else []
+        self.updated_securities.update(securities_in_universe)
+
+        if data_type == BAR:
+            self.securities_and_latest_bar.update(zip(securities_in_universe, security_events))
+            currencies = [security for security, security_flag in zip(securities, is_security.tolist())
+                          if not security_flag]
+            self.currencies_and_latest_bar.update(zip(currencies, events_from_rows(latest_rows[~is_security],
+                                                                                   data_type)))
+            self.market_data_store.update_bar(indices, security_rows.close, security_rows.volume,
+                                              security_rows.datetime)
+        elif data_type == TRADE:
+            self.securities_and_latest_trade.update(zip(securities_in_universe, security_events))
+            self.market_data_store.update_trade(indices, security_rows.last, security_rows.datetime)
+        elif data_type == QUOTE:
+            self.securities_and_latest_quote.update(zip(securities_in_universe, security_events))
+            self.market_data_store.update_quote(indices, security_rows.ask, security_rows.bid,
+                                                security_rows.datetime)
+        else:
+            raise NotImplementedError(f"Data type {data_type} is not supported!")
+
+    def preprocess_batch(self, clean_batch, data_type):
+        """
+        Batch counterpart of preprocess_data. Latest prices in USD are calculated from the
+        mid-prices of the latest quote of each security in the batch, and currency bars
+        reprice securities quoted in the currency.
+
+        Args:
+            clean_batch (np.recarray): clean rows of market data, in order of arrival
+            data_type (str): type of market data in the batch, 'bar', 'quote' or 'trade'
+        """
+        security_ids, latest_rows = _latest_rows_by_security(clean_batch)
+        securities = [self.ids_and_securities[security_id] for security_id in security_ids]
+
+        if data_type == QUOTE:
+            indices = np.array([self.securities_and_indices[security] for security in securities], dtype=np.intp)
+            usd_prices = (latest_rows.ask + latest_rows.bid) / 2 * self.market_data_store.usd_conversion_rate[indices]
+
+            self.securities_and_latest_usd_price.update(zip(securities, usd_prices.tolist()))
+            self.market_data_store.update_usd_price(indices, usd_prices)
+            self.repriced_securities.update(securities)
+
+        elif data_type == BAR:
+            for security, close in zip(securities, latest_rows.close.tolist()):
+                if security in self.currencies_and_quoted_securities:
+                    self.update_usd_conversion_rate(security, close)
 
     def initialise_data_structures(self):
         """
@@ -223,14 +473,40 @@ class DataModel:
             self.securities_and_latest_trade[security] = None
             self.securities_and_latest_quote[security] = None
             self.securities_and_latest_usd_price[security] = None
-            self.securities_and_clean_bars[security] = deque()
-            self.securities_and_clean_trades[security] = deque()
-            self.securities_and_clean_trades[security] = deque()
+            self.securities_and_clean_bars[security] = RollingMedian(self.data_points_needed)
+            self.securities_and_clean_trades[security] = RollingMedian(self.data_points_needed)
+            self.securities_and_clean_asks[security] = RollingMedian(self.data_points_needed)
+            self.securities_and_clean_bids[security] = RollingMedian(self.data_points_needed)
 
         # Data structures for currency data
         for currency in self.currencies_and_ids:
             self.currencies_and_latest_bar[currency] = None
-            self.currencies_and_clean_bars[currency] = deque()
+            self.currencies_and_clean_bars[currency] = RollingMedian(self.data_points_needed)
+
+        # Preallocates columnar store of latest market data
+        self.market_data_store = MarketDataStore(self.securities_and_indices)
+
+        # Market state shares data structures above with other models
+        self.market_state = MarketState(self.securities_and_latest_bar, self.securities_and_latest_quote,
+                                        self.securities_and_latest_trade, self.securities_and_latest_usd_price,
+                                        self.market_data_store.read_only_view)
+
+        # Securities quoted in each currency, prices in USD need no conversion
+        self.currencies_and_quoted_securities = {currency: ([], []) for currency in self.currencies_and_ids}
+        for security, index in self.securities_and_indices.items():
+            if security.quote_currency == 'USD':
+                self.market_data_store.usd_conversion_rate[index] = 1
+            else:
+                securities, indices = self.currencies_and_quoted_securities[f"{security.quote_currency}USD"]
+                securities.append(security)
+                indices.append(index)
+
+        self.currencies_and_quoted_securities = {currency: (securities, np.array(indices, dtype=np.intp))
+                                                 for currency, (securities, indices) in
+                                                 self.currencies_and_quoted_securities.items()}
+
+        # Compiles trading hours into lookup tables
+        self.trading_hours_index = TradingHoursIndex(self.trading_hours, self.special_trading_hours)
 
     def receive_trading_universe(self, trading_universe):
         """
@@ -240,19 +516,96 @@ class DataModel:
             trading_universe (dict): securities and currencies to trade
         """
         self.securities_and_ids = trading_universe['securities_and_ids']
+        self.securities_and_indices = trading_universe['securities_and_indices']
         self.currencies_and_ids = trading_universe['currencies_and_ids']
 
+        # used to look up securities in batches of market data
+        self.ids_and_securities = {security_id: security for security, security_id in
+                                   {**self.securities_and_ids, **self.currencies_and_ids}.items()}
+
+    def register_models(self, models):
+        """
+        Registers the shared market state with the other primary models, called once at
+        startup after data structures are initialised.
+
+        Args:
+            models (list): list of models reading the market state.
+        """
+        for model in models:
+            model.receive_market_state(self.market_state)
+
+    def publish_data(self):
+        """
+        Publishes fresh data to models registered with the market state, by incrementing its
+        version together with the securities which changed since data was last published.
+        Nothing is allocated per event: securities which changed are collected into one of
+        two sets in turn, the other set being the one published.
+        """
+        published_securities = self.market_state.updated_securities
+        published_repriced_securities = self.market_state.repriced_securities
+        self.market_state.publish(self.current_time, self.updated_securities, self.repriced_securities)
+
+        # starts tracking changes afresh, models have read the previously published sets
+        published_securities.clear()
+        published_repriced_securities.clear()
+        self.updated_securities = published_securities
+        self.repriced_securities = published_repriced_securities
+
     def propagate_data(self, models):
         """
-        Propagates fresh data to the other primary models
+        Propagates fresh data to the other primary models, together with the securities
+        which changed since data was last propagated. Kept for models which do not read
+        the shared market state, data is also published to the market state.
 
         Args:
-            models (list): list of models receiving the trading universe.
+            models (list): list of models receiving the latest data.
         """
+        self.publish_data()
+
         for model in models:
             model.receive_latest_data({"securities_and_latest_bar": self.securities_and_latest_bar,
                                        "securities_and_latest_quote": self.securities_and_latest_quote,
                                        "securities_and_latest_trade": self.securities_and_latest_trade,
                                        "securities_and_latest_usd_price": self.securities_and_latest_usd_price,
-                                       "current_time": self.current_time})
+                                       "current_time": self.current_time,
+                                       "market_data": self.market_data_store.read_only_view,
+                                       "updated_securities": self.market_state.updated_securities,
+                                       "repriced_securities": self.market_state.repriced_securities})
+
+
+def _as_record_batch(batch):
+    """
+    Converts a batch of market data into a record array, so that fields can be accessed
+    as attributes for whole columns (batch.close) as well as single rows (batch[0].close).
+
+    Args:
+        batch (np.ndarray or dict {field (str): values (np.array)}): structured array, or
+            columnar batch, of market data
+
+    Returns:
+        record_batch (np.recarray)
+    """
+    if isinstance(batch, np.ndarray):
+        return batch.view(np.recarray)
+
+    fields = list(batch.keys())
+    return np.rec.fromarrays([np.asarray(batch[field]) for field in fields], names=fields)
+
+
+def _latest_rows_by_security(batch):
+    """
+    Finds the latest row of each security in a batch of market data.
+
+    Args:
+        batch (np.recarray): batch of market data, in order of arrival
+
+    Returns:
+        security_ids (List[int])
+        latest_rows (np.recarray)
+    """
+    # np.unique returns first occurrences, so it is called on the reversed security ids
+    security_ids, reversed_positions = np.unique(batch.security_id[::-1], return_index=True)
+    latest_rows = batch[len(batch) - 1 - reversed_positions]
+
+    return security_ids.tolist(), latest_rows
 
@@ -18,9 +18,12 @@ class ExecutionModel:
         self.securities_and_latest_quote = {}
         self.securities_and_latest_trade = {}
         self.current_time = None
+        self.market_data = None  # read-only view of columnar market data store
+        self.market_state = None  # shared market state, if registered with data model
 
         # data structures received from universe model
         self.securities_and_ids = {}
+        self.securities_and_indices = {}
 
     def execute_orders(self, orders_to_execute):
         """
@@ -65,6 +68,21 @@ class ExecutionModel:
             trading_universe (dict): securities and currencies to trade
         """
         self.securities_and_ids = trading_universe['securities_and_ids']
+        self.securities_and_indices = trading_universe['securities_and_indices']
+
+    def receive_market_state(self, market_state):
+        """
+        Receives shared market state from data model, once at startup. Latest data is then
+        read through the market state rather than received on every event. Current time is
+        not copied, as it changes on every event, and is read as market_state.current_time.
+
+        Args:
+            market_state (MarketState)
+        """
+        self.market_state = market_state
+        self.securities_and_latest_quote = market_state.securities_and_latest_quote
+        self.securities_and_latest_trade = market_state.securities_and_latest_trade
+        self.market_data = market_state.market_data
 
     def receive_latest_data(self, latest_data):
         """
@@ -76,3 +94,4 @@ class ExecutionModel:
         self.securities_and_latest_quote = latest_data['securities_and_latest_quote']
         self.securities_and_latest_trade = latest_data['securities_and_latest_trade']
         self.current_time = latest_data['current_time']
+        self.market_data = latest_data['market_data']
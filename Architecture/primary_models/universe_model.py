@@ -21,6 +21,7 @@ class UniverseModel:
 
         # data structures to be propagated
         self.filtered_securities_and_ids = {}
+        self.securities_and_indices = {}
         self.security_clusters = {}
 
     def filter_and_cluster_universe(self, time_now):
@@ -45,6 +46,7 @@ class UniverseModel:
         # Filter model
         self.filter_model.receive_historical_data(securities_and_historical_data)
         self.filtered_securities_and_ids = self.filter_model.filter_liquid_securities()
+        self.assign_security_indices()
 
         # Cluster model
         self.cluster_model.receive_historical_data(securities_and_historical_data)
@@ -80,6 +82,15 @@ class UniverseModel:
 
         return securities_and_historical_data
 
+    def assign_security_indices(self):
+        """
+        Assigns a dense integer index to each security in the filtered universe, from 0 to
+        number of securities - 1. Other models use these indices to store and read
+        per-security data in arrays instead of dicts.
+        """
+        self.securities_and_indices = {security: index for index, security in
+                                       enumerate(self.filtered_securities_and_ids)}
+
     def retrieve_full_universe(self):
         """ Called on strategy start, initialises the full universe of securities.
         """
@@ -111,6 +122,7 @@ class UniverseModel:
         """
         for model in models:
             model.receive_trading_universe({"securities_and_ids": self.filtered_securities_and_ids,
+                                            "securities_and_indices": self.securities_and_indices,
                                             "security_clusters": self.security_clusters,
                                             "currencies_and_ids": self.currencies_and_ids})
 
@@ -31,7 +31,11 @@ def resample_by_volume_clock(time_sampled_data, security, start_date,
                            'high': List(float),
                            'low': List(float),
                            'close': List(float),
-                           'volume': List(float)}})
+                           'volume': List(float),
+                           'vwap': List(float),
+                           'start_time': List(datetime.datetime),
+                           'end_time': List(datetime.datetime),
+                           'tick_count': List(int)}}): see _resample_by_sampling_size
     """
     # Downloads historical data
     historical_data = yf.download(tickers=security, start=start_date, end=end_date)
@@ -113,45 +117,79 @@ def _resample_by_sampling_size(time_sampled_data, sampling_size, method):
     Resamples time sampled data by volume clock, based on the calculated pre-defined
     amount to sample each bar, and the method provided.
 
+    A bar is sampled each time the cumulative volume (or market value) crosses a multiple
+    of the sampling size, so bars are formed at once by bucketing cumulative sums, rather
+    than by looping over every time bar. A bar spans the rows since the previous bar, and a
+    row crossing several multiples creates several bars with identical prices and times.
+    Volume and tick count of such bars are split across them, so that summing bars gives
+    the volume traded: volume is divided evenly, and tick count is divided as integers,
+    with the remainder on the first bar. The live VolumeBarBuilder emits such bars once
+    instead, see Architecture.helper_models.volume_bar_builder.
+
     Args:
         time_sampled_data (pd.DataFrame)
         sampling_size (int)
         method (str)
 
     Returns:
-        resampled_data (pd.DataFrame)
+        resampled_data (pd.DataFrame
+            {index (int): {'open': List(float),
+                           'high': List(float),
+                           'low': List(float),
+                           'close': List(float),
+                           'volume': List(float): volume traded over rows of the bar,
+                               split evenly across bars created by the same row,
+                           'vwap': List(float): volume weighted average close price,
+                           'start_time': List(datetime.datetime): time of first row of the bar,
+                           'end_time': List(datetime.datetime): time of last row of the bar,
+                           'tick_count': List(int): number of rows of the bar, split
+                               across bars created by the same row}})
     """
     # data structures used to calculate OHLCV for each bar
     # 'sampling' represents either VOLUME or DOLLAR, depending on method.
-    prices = time_sampled_data['close'].values
+    prices = time_sampled_data['close'].to_numpy(dtype=float)
+    volumes = time_sampled_data['volume'].to_numpy(dtype=float)
     if method.upper() == 'VOLUME':
-        sampling_data = time_sampled_data['volume'].values
+        sampling_data = volumes
     elif method.upper() == 'DOLLAR':
-        sampling_data = prices * time_sampled_data['volume'].values
+        sampling_data = prices * volumes
     else:
         raise NotImplementedError(f"Resampling method: {method} is not supported!")
 
-    sampling_counter = 0  # volume/dollar counter
-    start_index = 0
-
-    resampled_bars = []
-    for current_index in range(len(prices)):
-        sampling_counter += sampling_data[current_index]
-
-        number_of_bars_created = int(sampling_counter/ sampling_size)
-        if number_of_bars_created > 0:
-            for _ in range(number_of_bars_created):
-                resampled_bars.append(
-                    {'open': prices[start_index: current_index + 1][0],
-                     'high': np.max(prices[start_index: current_index + 1]),
-                     'low': np.min(prices[start_index: current_index + 1]),
-                     'close': prices[start_index: current_index + 1][-1]})
-
-            # Once a bar is created, we update the starting index to be the next data point.
-            # This is equivalent to "clearing" the list of trades that is collected one at a time,
-            # for bar creation in the events-based version.
-            start_index = current_index + 1
-            sampling_counter -= number_of_bars_created * sampling_size
-
-    resampled_data = pd.DataFrame(resampled_bars)
+    # number of bars created up to each row, and rows where bars are created
+    number_of_bars_created = np.floor(np.cumsum(sampling_data) / sampling_size).astype(np.int64)
+    end_indices = np.flatnonzero(np.diff(number_of_bars_created, prepend=0) > 0)
+
+    # Once a bar is created, the next bar starts from the next data point.
+    start_indices = np.concatenate(([0], end_indices[:-1] + 1)).astype(np.int64)
+    bars_per_row = np.diff(number_of_bars_created[end_indices], prepend=0)
+
+    if end_indices.size:
+        rows = slice(0, end_indices[-1] + 1)
+        volume = np.add.reduceat(volumes[rows], start_indices)
+        resampled_data = pd.DataFrame(
+            {'open': prices[start_indices],
+             'high': np.maximum.reduceat(prices[rows], start_indices),
+             'low': np.minimum.reduceat(prices[rows], start_indices),
+             'close': prices[end_indices],
+             'volume': volume,
+             'vwap': np.add.reduceat(prices[rows] * volumes[rows], start_indices) / volume,
+             'start_time': time_sampled_data.index[start_indices],
+             'end_time': time_sampled_data.index[end_indices],
+             'tick_count': end_indices - start_indices + 1})
+    else:
+        resampled_data = pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume', 'vwap',
+                                               'start_time', 'end_time', 'tick_count'])
+
+    # rows crossing several multiples of sampling size create several bars, splitting volume and tick count
+    resampled_data = resampled_data.loc[resampled_data.index.repeat(bars_per_row)].reset_index(drop=True)
+    if resampled_data.shape[0] > end_indices.size:
+        repeats = np.repeat(bars_per_row, bars_per_row)
+        is_first_repeat = np.zeros(repeats.size, dtype=bool)
+        is_first_repeat[np.cumsum(bars_per_row) - bars_per_row] = True
+        tick_counts = resampled_data['tick_count'].to_numpy()
+
+        resampled_data['volume'] = resampled_data['volume'].to_numpy() / repeats
+        resampled_data['tick_count'] = tick_counts // repeats + np.where(is_first_repeat, tick_counts % repeats, 0)
+
     return resampled_data
@@ -1,6 +1,97 @@
 import numpy as np
 import pandas as pd
 
+from array import array
+
+
+class StreamingKalmanFilter:
+    """
+    Estimates the hedge ratio between two securities with a Kalman filter, one observation at
+    a time, for live trading.
+
+    Kalman filter assumes a linear relation: y = beta^T X + epsilon, epsilon follows a normal
+    distribution with zero mean, and X is x augmented with ones for the regression 'intercept'.
+    As X has two elements, every matrix operation of the filter is written out in closed form
+    with scalars, so each update takes constant time and allocates no arrays.
+    """
+    __slots__ = ('state_transition_variance', 'covariance', 'hedge_ratio', 'intercept',
+                 'P_00', 'P_01', 'P_10', 'P_11', 'number_of_observations')
+
+    def __init__(self, learning_rate, covariance):
+        """
+        Args:
+            learning_rate (float): controls rate of updating hedge ratios
+            covariance (float): serial covariance of linear regression error term.
+        """
+        # hyperparameters
+        self.state_transition_variance = learning_rate / (1 - learning_rate)
+        self.covariance = covariance
+
+        # regression coefficients (beta)
+        self.hedge_ratio = 0.
+        self.intercept = 0.
+
+        # beta error covariance after update
+        self.P_00 = self.P_01 = self.P_10 = self.P_11 = 0.
+        self.number_of_observations = 0
+
+    def update(self, x, y):
+        """
+        Updates hedge ratios with the latest prices of both securities.
+
+        Args:
+            x (float): latest price of security 1
+            y (float): latest price of security 2
+
+        Returns:
+            beta (tuple(hedge_ratio (float), intercept (float))): regression coefficients
+            error (float): prediction error (y - yhat)
+            error_variance (float): prediction error variance
+        """
+        # predicted beta error covariance, which is zero for the first observation
+        if self.number_of_observations:
+            R_00 = self.P_00 + self.state_transition_variance
+            R_01 = self.P_01
+            R_10 = self.P_10
+            R_11 = self.P_11 + self.state_transition_variance
+        else:
+            R_00 = R_01 = R_10 = R_11 = 0.
+
+        # calculating prediction error and error variance
+        error = y - (x * self.hedge_ratio + self.intercept)
+        error_variance = (x * R_00 + R_10) * x + (x * R_01 + R_11) + self.covariance
+
+        # updating beta (hedge ratios)
+        K_0 = (R_00 * x + R_01) / error_variance
+        K_1 = (R_10 * x + R_11) / error_variance
+        self.hedge_ratio += K_0 * error
+        self.intercept += K_1 * error
+
+        K_0_x = K_0 * x
+        K_1_x = K_1 * x
+        self.P_00 = R_00 - (K_0_x * R_00 + K_0 * R_10)
+        self.P_01 = R_01 - (K_0_x * R_01 + K_0 * R_11)
+        self.P_10 = R_10 - (K_1_x * R_00 + K_1 * R_10)
+        self.P_11 = R_11 - (K_1_x * R_01 + K_1 * R_11)
+        self.number_of_observations += 1
+
+        return (self.hedge_ratio, self.intercept), error, error_variance
+
+    def snapshot(self):
+        """
+        Returns:
+            state (dict): state of the filter, which can be restored later
+        """
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def restore(self, state):
+        """
+        Args:
+            state (dict): state of the filter, from snapshot
+        """
+        for slot in self.__slots__:
+            setattr(self, slot, state[slot])
+
 
 def get_hedge_ratios_from_kalman_filter(security_1_prices, security_2_prices,
                                         learning_rate, covariance):
@@ -9,7 +100,8 @@ def get_hedge_ratios_from_kalman_filter(security_1_prices, security_2_prices,
 
     Kalman filter assumes a linear relation: y = beta^T X + epsilon, epsilon follows a normal
     distribution with zero mean. Beta is updated using a Bayesian method, by comparing predicted
-    and observed values of y.
+    and observed values of y. Prices are fed one at a time to StreamingKalmanFilter, so hedge
+    ratios are identical to the ones estimated in live trading.
 
     Args:
         security_1_prices (np.array[float])
@@ -22,40 +114,88 @@ def get_hedge_ratios_from_kalman_filter(security_1_prices, security_2_prices,
         error (np.array[float]): prediction error (y - yhat)
         error_variance (np.array[float]): prediction error variance
     """
-    # Kalman filter variables
-    x = np.stack([security_1_prices,
-                  np.ones(security_1_prices.size)],
-                 axis=1)  # Augment x with ones for regression 'intercept'
-    y = security_2_prices
+    kalman_filter = StreamingKalmanFilter(learning_rate, covariance)
+    update = kalman_filter.update
 
-    beta = np.zeros((y.size, 2))  # regression coefficients
-    yhat = np.zeros(y.size)  # linear regression prediction
+    # Python floats are faster to operate on than numpy scalars, and arrays of doubles
+    # store outputs without keeping a float object for each value
+    x = np.asarray(security_1_prices, dtype=float).tolist()
+    y = np.asarray(security_2_prices, dtype=float).tolist()
 
-    e = np.zeros(y.size)  # prediction error
-    Q = np.zeros(y.size)  # prediction error variance
+    hedge_ratios = array('d', bytes(8 * len(y)))
+    intercepts = array('d', bytes(8 * len(y)))
+    e = array('d', bytes(8 * len(y)))  # prediction error
+    Q = array('d', bytes(8 * len(y)))  # prediction error variance
+
+    # Kalman filter algorithm
+    for t in range(len(y)):
+        (hedge_ratios[t], intercepts[t]), e[t], Q[t] = update(x[t], y[t])
 
-    R = np.zeros((2, 2))  # beta error covariance
-    P = np.zeros((2, 2))  # predicted beta error covariance
+    beta = np.stack([np.frombuffer(hedge_ratios), np.frombuffer(intercepts)], axis=1)  # regression coefficients
 
-    Vw = learning_rate / (1 - learning_rate) * np.eye(2)  # state transition covariance
+    return beta, np.frombuffer(e), np.frombuffer(Q)
+
+
+def get_hedge_ratios_from_batched_kalman_filter(security_1_prices, security_2_prices,
+                                                learning_rates, covariances):
+    """
+    Estimates hedge ratios between price series for two securities with K Kalman filters at
+    once, one for each pair of learning rate and covariance, e.g. for grid searching. All
+    filters are advanced together, with one vectorized step over the K filters per
+    observation. Each filter performs the same operations as StreamingKalmanFilter, so
+    outputs are identical to get_hedge_ratios_from_kalman_filter.
+
+    Args:
+        security_1_prices (np.array[float])
+        security_2_prices (np.array[float])
+        learning_rates (np.array[float] (K,) or float): controls rate of updating hedge ratios
+        covariances (np.array[float] (K,) or float): serial covariance of linear regression error term.
+
+    Returns:
+        beta (np.array[float] (K, T, 2)): regression coefficients (used for hedge ratios)
+        error (np.array[float] (K, T)): prediction error (y - yhat)
+        error_variance (np.array[float] (K, T)): prediction error variance
+    """
+    learning_rates = np.asarray(learning_rates, dtype=float)
+    covariances = np.asarray(covariances, dtype=float)
+    state_transition_variance = learning_rates / (1 - learning_rates)
+    number_of_filters = np.broadcast(learning_rates, covariances).size
+
+    x = np.asarray(security_1_prices, dtype=float).tolist()
+    y = np.asarray(security_2_prices, dtype=float).tolist()
+
+    # state of each filter, with filters along the last axis
+    beta_t = np.zeros((2, number_of_filters))  # regression coefficients (hedge ratio, intercept)
+    P = np.zeros((2, 2, number_of_filters))  # beta error covariance, zero before the first observation
+    state_transition_covariance = np.eye(2)[:, :, np.newaxis] * state_transition_variance
+
+    # outputs are filled one time step (row) at a time
+    beta = np.zeros((len(y), 2, number_of_filters))
+    e = np.zeros((len(y), number_of_filters))
+    Q = np.zeros((len(y), number_of_filters))
 
     # Kalman filter algorithm
     for t in range(len(y)):
-        if t > 0:
-            beta[t] = beta[t - 1]
-            R = P + Vw
+        x_t = x[t]
+
+        # predicted beta error covariance
+        R = P + state_transition_covariance if t > 0 else P
 
         # calculating prediction error and error variance
-        yhat[t] = np.dot(x[t], beta[t])
-        e[t] = y[t] - yhat[t]
-        Q[t] = np.dot(np.dot(x[t], R), x[t].T) + covariance
+        error = y[t] - (x_t * beta_t[0] + beta_t[1])
+        xR = x_t * R[0] + R[1]
+        error_variance = xR[0] * x_t + xR[1] + covariances
 
         # updating beta (hedge ratios)
-        K = np.dot(R, x[t].T) / Q[t]
-        beta[t] = beta[t] + np.dot(K, e[t])
-        P = R - np.dot(np.outer(K, x[t]), R)
+        K = (R[:, 0] * x_t + R[:, 1]) / error_variance
+        beta_t = beta_t + K * error
+        P = R - ((K * x_t)[:, np.newaxis] * R[0] + K[:, np.newaxis] * R[1])
+
+        beta[t] = beta_t
+        e[t] = error
+        Q[t] = error_variance
 
-    return beta, e, Q
+    return beta.transpose(2, 0, 1).copy(), e.T.copy(), Q.T.copy()
 
 
 def get_bollinger_bands_positions(error, error_variance, zscore_threshold):
@@ -93,10 +233,9 @@ def get_bollinger_bands_positions(error, error_variance, zscore_threshold):
     return positions
 
 
-def kalman_filter_strategy(price_data, learning_rate, covariance, zscore_threshold):
+def kalman_filter_hedge_ratios_stage(price_data, learning_rate, covariance):
     """
-    Calculates hedge ratios and creates portfolio positions by tying up both functions
-    together. Used for grid searching.
+    First stage of kalman_filter_strategy, estimates hedge ratios with a Kalman filter.
 
     Args:
         price_data (pd.DataFrame
@@ -104,22 +243,62 @@ def kalman_filter_strategy(price_data, learning_rate, covariance, zscore_thresho
                                         security_2 (str): prices (List[float])}})
         learning_rate (float): controls rate of updating hedge ratios
         covariance (float): serial covariance of linear regression error term.
-        zscore_threshold (float): threshold to enter positions
 
     Returns:
-          positions (pd.Series): entry and exit behaviour
-          hedge_ratios (pd.DataFrame): ratios of each security in the pair
+        kalman_filter_outputs (tuple(beta (np.array[float]), error (np.array[float]),
+                                     error_variance (np.array[float])))
+    """
+    # preprocess data
+    security_1_prices = price_data.iloc[:, 0].values
+    security_2_prices = price_data.iloc[:, 1].values
+
+    return get_hedge_ratios_from_kalman_filter(security_1_prices,
+                                               security_2_prices,
+                                               learning_rate=learning_rate,
+                                               covariance=covariance)
+
+
+def batched_kalman_filter_hedge_ratios_stage(price_data, learning_rate, covariance):
+    """
+    Runs kalman_filter_hedge_ratios_stage for K pairs of learning rate and covariance at once,
+    with batched Kalman filters.
+
+    Args:
+        price_data (pd.DataFrame)
+        learning_rate (np.array[float] (K,))
+        covariance (np.array[float] (K,))
+
+    Returns:
+        kalman_filter_outputs (List[tuple(beta, error, error_variance)]): outputs of
+            kalman_filter_hedge_ratios_stage for each pair of learning rate and covariance
     """
     # preprocess data
     security_1_prices = price_data.iloc[:, 0].values
     security_2_prices = price_data.iloc[:, 1].values
 
-    # get hedge ratios
     beta, error, error_variance =\
-        get_hedge_ratios_from_kalman_filter(security_1_prices,
-                                            security_2_prices,
-                                            learning_rate=learning_rate,
-                                            covariance=covariance)
+        get_hedge_ratios_from_batched_kalman_filter(security_1_prices,
+                                                    security_2_prices,
+                                                    learning_rates=learning_rate,
+                                                    covariances=covariance)
+
+    return list(zip(beta, error, error_variance))
+
+
+def bollinger_bands_positions_stage(kalman_filter_outputs, zscore_threshold):
+    """
+    Second stage of kalman_filter_strategy, creates portfolio positions from Kalman filter
+    prediction errors.
+
+    Args:
+        kalman_filter_outputs (tuple(beta, error, error_variance)): from kalman_filter_hedge_ratios_stage
+        zscore_threshold (float): threshold to enter positions
+
+    Returns:
+          positions (pd.Series): entry and exit behaviour
+          hedge_ratios (pd.DataFrame): ratios of each security in the pair
+    """
+    beta, error, error_variance = kalman_filter_outputs
 
     hedge_ratios = pd.DataFrame(np.stack([-np.round(beta[:, 0]), np.ones(error.size)], axis=1))
 
@@ -129,3 +308,38 @@ def kalman_filter_strategy(price_data, learning_rate, covariance, zscore_thresho
                                               zscore_threshold=zscore_threshold)
 
     return positions, hedge_ratios
+
+
+def kalman_filter_strategy(price_data, learning_rate, covariance, zscore_threshold):
+    """
+    Calculates hedge ratios and creates portfolio positions by tying up both functions
+    together. Used for grid searching.
+
+    Args:
+        price_data (pd.DataFrame
+            {Date (datetime.datetime): {security_1 (str): prices (List[float]),
+                                        security_2 (str): prices (List[float])}})
+        learning_rate (float): controls rate of updating hedge ratios
+        covariance (float): serial covariance of linear regression error term.
+        zscore_threshold (float): threshold to enter positions
+
+    Returns:
+          positions (pd.Series): entry and exit behaviour
+          hedge_ratios (pd.DataFrame): ratios of each security in the pair
+    """
+    # get hedge ratios
+    kalman_filter_outputs = kalman_filter_hedge_ratios_stage(price_data,
+                                                             learning_rate=learning_rate,
+                                                             covariance=covariance)
+
+    # creating positions
+    return bollinger_bands_positions_stage(kalman_filter_outputs, zscore_threshold=zscore_threshold)
+
+
+# pipeline of kalman_filter_strategy, so that grid_search reuses hedge ratios across zscore thresholds,
+# and estimates hedge ratios for many learning rates and covariances at once
+kalman_filter_strategy.stages = [{'stage': kalman_filter_hedge_ratios_stage,
+                                  'batched_stage': batched_kalman_filter_hedge_ratios_stage,
+                                  'hyperparameters': ('learning_rate', 'covariance')},
+                                 {'stage': bollinger_bands_positions_stage,
+                                  'hyperparameters': ('zscore_threshold',)}]
@@ -3,9 +3,9 @@ import pandas as pd
 
 from itertools import product as cartesian_product
 from functools import partial
+from multiprocessing.pool import ThreadPool
 from scipy.stats import pearsonr
-from numpy_ext import rolling_apply
-from multiprocessing import cpu_count
+from scipy.special import betainc
 
 
 def create_portfolio_positions(price_data, past_returns, hurst_exponents,
@@ -61,56 +61,332 @@ def create_portfolio_positions(price_data, past_returns, hurst_exponents,
     return portfolio_positions, portfolio_ratios
 
 
+def create_batched_portfolio_positions(past_returns, hurst_exponents, forward, entry_hurst, exit_hurst):
+    """
+    Creates positions of many securities and hyperparameters at once, identical to calling
+    create_portfolio_positions for each of them. The entry and exit state machine is run in
+    a single pass over time, each step updating the state of every batch element at once.
+
+    Inputs are broadcast against each other, so e.g. past returns and hurst exponents of N
+    securities with shape (N, 1, T), and P values of hyperparameters with shape (P,), give
+    positions of every security and hyperparameter with shape (N, P, T). Positions can be
+    fed, once reshaped to (K, T), into calculate_batched_pnl_with_transaction_costs.
+
+    Args:
+        past_returns (np.array[float]): (..., T) past returns based on a lookback period
+        hurst_exponents (np.array[float]): (..., T) rolling hurst exponent calculations
+        forward (np.array[int]): (...) holding period (A.K.A time stop)
+        entry_hurst (np.array[float]): (...) hurst threshold to consider regime as trending
+        exit_hurst (np.array[float]): (...) hurst threshold to consider regime as mean-reverting.
+
+    Returns:
+        portfolio_positions (np.array[float]): (..., T) entry and exit behaviour
+    """
+    past_returns = np.asarray(past_returns, dtype=float)
+    hurst_exponents = np.asarray(hurst_exponents, dtype=float)
+    number_of_observations = past_returns.shape[-1]
+    batch_shape = np.broadcast_shapes(past_returns.shape[:-1], hurst_exponents.shape[:-1], np.shape(forward),
+                                      np.shape(entry_hurst), np.shape(exit_hurst))
+
+    # time first, so each step reads and writes contiguous rows of the batch
+    def to_time_major(values):
+        return np.broadcast_to(values, batch_shape + (number_of_observations,)).reshape(-1, number_of_observations).T
+
+    past_return_signs = np.ascontiguousarray(to_time_major(np.sign(past_returns)))
+    hurst_exponents = np.ascontiguousarray(to_time_major(hurst_exponents))
+    forward, entry_hurst, exit_hurst = (np.broadcast_to(hyperparameter, batch_shape).ravel()
+                                        for hyperparameter in (forward, entry_hurst, exit_hurst))
+
+    portfolio_positions = np.zeros(hurst_exponents.shape)
+    trade_entry_index = np.zeros(hurst_exponents.shape[1], dtype=int)
+
+    for index in range(1, number_of_observations):
+        positions = portfolio_positions[index]
+        previous_positions = portfolio_positions[index - 1]
+
+        # hurst exponent above entry threshold, regime likely to be trending, enter trade
+        is_entering = (hurst_exponents[index] > entry_hurst) & (trade_entry_index == 0)
+        np.copyto(positions, past_return_signs[index], where=is_entering)
+        trade_entry_index[is_entering] = index
+
+        # hurst exponent below exit threshold, regime likely changed to mean reverting, exit trade
+        is_exiting = hurst_exponents[index] < exit_hurst
+        positions[is_exiting] = 0
+        trade_entry_index[is_exiting] = 0
+
+        # hurst exponent doesn't hit any threshold, but reached maximum holding period
+        is_in_trade = previous_positions != 0
+        is_time_stopped = is_in_trade & (index - trade_entry_index > forward)
+        positions[is_time_stopped] = 0
+        trade_entry_index[is_time_stopped] = 0
+
+        # forward filling positions when time/pnl stops not hit
+        is_holding = is_in_trade & (trade_entry_index != 0)
+        np.copyto(positions, previous_positions, where=is_holding)
+
+    return portfolio_positions.T.reshape(batch_shape + (number_of_observations,))
+
+
+def create_panel_portfolio_positions(price_data, lookback, forward, entry_hurst, exit_hurst,
+                                     maximum_chunk_size=2 ** 22, number_of_workers=1):
+    """
+    Runs the serial momentum strategy on every security of a panel of prices at once, rather
+    than on one price series at a time: rolling hurst exponents (with lookback as window
+    size), past returns and positions of all securities are calculated together, see
+    generate_hurst_array and create_batched_portfolio_positions.
+
+    Securities are processed in chunks of columns, each holding at most maximum_chunk_size
+    prices, so memory stays bounded for large universes. With more than one worker, chunks
+    are processed by a pool of threads, as numpy releases the GIL in vectorised operations
+    and threads share price data without copying.
+
+    Args:
+        price_data (pd.DataFrame
+            {Date (datetime.datetime): {security_1 (str): prices (List[float]),
+                                        security_2 (str): prices (List[float]),
+                                                        .
+                                                        .
+                                                        .}})
+        lookback (int): lookback period of past returns, and rolling window of hurst exponents
+        forward (int): holding period (A.K.A time stop)
+        entry_hurst (float): hurst threshold to consider regime as trending
+        exit_hurst (float): hurst threshold to consider regime as mean-reverting.
+        maximum_chunk_size (int): maximum number of prices processed at once
+        number_of_workers (int): number of threads processing chunks
+
+    Returns:
+        portfolio_positions (pd.DataFrame): entry and exit behaviour of each security
+        portfolio_ratios (pd.DataFrame): ratios of each security in its unit portfolio
+        hurst_exponents (pd.DataFrame)
+        past_returns (pd.DataFrame)
+
+        All aligned with price_data, so that e.g. price_data[[security]],
+        portfolio_positions[security] and portfolio_ratios[[security]] can be fed into
+        calculate_pnl_with_transaction_costs.
+    """
+    prices = price_data.to_numpy(dtype=float)
+    chunk_width = max(1, maximum_chunk_size // max(1, prices.shape[0]))
+    chunks = [prices[:, chunk_start:chunk_start + chunk_width]
+              for chunk_start in range(0, prices.shape[1], chunk_width)]
+
+    create_chunk_portfolio_positions = partial(_create_chunk_portfolio_positions, lookback=lookback,
+                                               forward=forward, entry_hurst=entry_hurst, exit_hurst=exit_hurst)
+    if number_of_workers > 1:
+        with ThreadPool(number_of_workers) as pool:
+            chunk_outputs = pool.map(create_chunk_portfolio_positions, chunks)
+    else:
+        chunk_outputs = [create_chunk_portfolio_positions(chunk) for chunk in chunks]
+
+    # convert data structures to necessary formats for pnl calculations
+    portfolio_positions, hurst_exponents, past_returns =\
+        (pd.DataFrame(np.concatenate(outputs, axis=1), index=price_data.index, columns=price_data.columns)
+         for outputs in zip(*chunk_outputs))
+    portfolio_ratios = np.sign(price_data)
+
+    return portfolio_positions, portfolio_ratios, hurst_exponents, past_returns
+
+
 def gridsearch_lookback_forward_periods(prices, parameters):
     """
     Performs a grid search for various lookback and holding periods,
     obtaining corresponding Pearson correlation coefficient values and p values.
 
+    Correlations of the whole grid are calculated at once, see
+    calculate_past_future_returns_correlations, for a single security or for every
+    column of a matrix of prices.
+
+    Args:
+        prices (np.array[float]): (T,) prices of a security, or (T, N) prices of N
+            securities, as an array or a pd.DataFrame.
+        parameters(Dict{'lookback': array[int],
+                        'forward': array[int]})
+
+    Returns:
+        results (pd.DataFrame): tabular results of grid search. For a matrix of prices,
+            each combination has a row for each security, in a 'security' column
+            holding column names (or column numbers for arrays).
+    """
+    keys = parameters.keys()
+    results = pd.DataFrame([dict(zip(keys, combination)) for combination in cartesian_product(*parameters.values())])
+
+    correlation_coefficients, p_values =\
+        calculate_past_future_returns_correlations(np.asarray(prices), results['lookback'].to_numpy(),
+                                                   results['forward'].to_numpy())
+
+    if correlation_coefficients.ndim == 2:
+        number_of_securities = correlation_coefficients.shape[1]
+        securities = getattr(prices, 'columns', range(number_of_securities))
+        results = results.loc[results.index.repeat(number_of_securities)].reset_index(drop=True)
+        results['security'] = np.tile(np.asarray(securities), len(correlation_coefficients))
+
+    results['correlation_coefficient'] = correlation_coefficients.ravel()
+    results['p_value'] = p_values.ravel()
+    return results
+
+
+def calculate_past_future_returns_correlations(prices, lookbacks, forwards, maximum_chunk_size=2 ** 24):
+    """
+    Calculates the Pearson correlation coefficient between past and future returns of many
+    combinations of lookback and forward periods at once, identical to calling
+    _calculate_past_future_returns_correlation for each combination.
+
+    Strided indices of every combination are concatenated, so past and future returns of all
+    combinations are gathered with a single fancy indexing operation. Sums of each combination
+    are then reduced over its segment of returns with np.add.reduceat, and p values follow in
+    closed form from the beta distribution of the coefficient of uncorrelated samples, as in
+    scipy.stats.pearsonr.
+
+    Args:
+        prices (np.array[float]): (T,) prices of a security, or (T, N) prices of N securities
+        lookbacks (np.array[int]): (K,) lookback period of each combination
+        forwards (np.array[int]): (K,) forward period of each combination
+        maximum_chunk_size (int): maximum number of returns gathered at once, combinations are
+            processed in chunks to bound memory for large numbers of securities.
+
+    Returns:
+        correlation_coefficients (np.array[float]): (K,) or (K, N) Pearson coefficients, nan
+            for combinations with less than 2 pairs of returns.
+        p_values (np.array[float]): (K,) or (K, N)
+    """
+    prices = np.asarray(prices, dtype=float)
+    is_single_security = prices.ndim == 1
+    if is_single_security:
+        prices = prices[:, np.newaxis]
+
+    lookbacks = np.asarray(lookbacks, dtype=int)
+    forwards = np.asarray(forwards, dtype=int)
+    windows = np.minimum(lookbacks, forwards)
+
+    # number of pairs of returns of each combination, i.e. len(range(lookback, T - forward, window))
+    numbers_of_samples = np.maximum(0, -((lookbacks + forwards - prices.shape[0]) // windows))
+
+    correlation_coefficients = np.full((lookbacks.size, prices.shape[1]), np.nan)
+    p_values = np.full((lookbacks.size, prices.shape[1]), np.nan)
+
+    # chunks of combinations with at least 2 pairs of returns, bounded in number of returns
+    combinations = np.flatnonzero(numbers_of_samples >= 2)
+    chunk_ends = np.cumsum(numbers_of_samples[combinations]) * prices.shape[1] // maximum_chunk_size
+    for chunk_end in np.unique(chunk_ends):
+        chunk = combinations[chunk_ends == chunk_end]
+        correlation_coefficients[chunk], p_values[chunk] =\
+            _calculate_correlations_of_combinations(prices, lookbacks[chunk], forwards[chunk],
+                                                    windows[chunk], numbers_of_samples[chunk])
+
+    if is_single_security:
+        return correlation_coefficients[:, 0], p_values[:, 0]
+    return correlation_coefficients, p_values
+
+
+def successive_halving_lookback_forward_periods(prices, parameters, reduction_factor=2, minimum_samples=10,
+                                                compare_with_exhaustive=False):
+    """
+    Searches lookback and holding periods by successive halving, rather than calculating
+    correlations of every combination on all prices. Correlations of every combination
+    are first calculated on a short prefix of prices, and only the most correlated
+    combinations are calculated again on progressively longer prefixes, see
+    utils.performance_metrics.run_successive_halving.
+
     Args:
         prices (np.array[float])
         parameters(Dict{'lookback': array[int],
                         'forward': array[int]})
+        reduction_factor (int): fraction 1 / reduction_factor of combinations is kept after each
+            round, while prefixes of prices grow reduction_factor times longer.
+        minimum_samples (int): minimum number of pairs of past and future returns of every
+            combination on the shortest prefix.
+        compare_with_exhaustive (bool): whether to also run the exhaustive grid search, and
+            compare rankings of both searches.
 
     Returns:
-        results (pd.DataFrame): tabular results of grid search.
+        results (pd.DataFrame): results of every combination on the longest prefix it was
+            evaluated on, most correlated combinations first.
+        search_statistics (dict): see run_successive_halving and compare_search_rankings
     """
-    # Create a partial function so that only parameters need to be fed.
-    calculate_correlation =\
-        partial(_calculate_past_future_returns_correlation, prices=prices)
+    # imported here, as performance metrics depend on plotting, progress bars and result caches
+    from utils.performance_metrics import run_successive_halving, compare_search_rankings
 
-    # Grid search
-    results = []
     keys = parameters.keys()
-    for combination in cartesian_product(*parameters.values()):
-        parameter_combination = dict(zip(keys, combination))
+    parameter_combinations = [dict(zip(keys, combination)) for combination in cartesian_product(*parameters.values())]
 
-        # calculate correlation between past and future returns
-        correlation_coefficient, p_value = calculate_correlation(**parameter_combination)
-        parameter_combination['correlation_coefficient'] = correlation_coefficient
-        parameter_combination['p_value'] = p_value
-        results.append(parameter_combination)
+    # shortest prefix providing minimum_samples returns for every combination
+    minimum_observations = max(combination['lookback'] + combination['forward'] + 1 +
+                               (minimum_samples - 1) * min(combination['lookback'], combination['forward'])
+                               for combination in parameter_combinations)
 
-    # convert results into a tabular form
-    results = pd.DataFrame(results)
-    return results
+    def evaluate(parameter_combinations, number_of_observations):
+        correlation_coefficients, p_values =\
+            calculate_past_future_returns_correlations(prices[:number_of_observations],
+                                                       [combination['lookback'] for combination in parameter_combinations],
+                                                       [combination['forward'] for combination in parameter_combinations])
+        return [{**parameter_combination,
+                 'correlation_coefficient': correlation_coefficient,
+                 'p_value': p_value}
+                for parameter_combination, correlation_coefficient, p_value
+                in zip(parameter_combinations, correlation_coefficients, p_values)]
+
+    results, search_statistics = run_successive_halving(evaluate, parameter_combinations, prices.size,
+                                                        minimum_observations, 'correlation_coefficient',
+                                                        reduction_factor)
+
+    if compare_with_exhaustive:
+        exhaustive_results = gridsearch_lookback_forward_periods(prices, parameters)
+        search_statistics.update(compare_search_rankings(results, exhaustive_results, list(keys),
+                                                         'correlation_coefficient'))
+
+    return results, search_statistics
 
 
 def generate_hurst_array(log_prices, rolling_window):
     """
-    Generates an array of rolling hurst exponent calculations.
+    Generates an array of rolling hurst exponent calculations, identical to applying
+    _calculate_hurst to each rolling window.
+
+    Rather than calculating variances of every lag from scratch for each window, squared
+    differences of each lag are summed cumulatively once, so the variance of a lag over any
+    window is the difference of two cumulative sums. The log-log regression is then solved
+    in closed form for all windows together, as log lags are the same for every window:
+
+                    H = 0.5 * Σ (log τ - mean(log τ)) * log variance_τ / Σ (log τ - mean(log τ))**2
 
     Args:
-        log_prices (np.array[float]): array of log price data
+        log_prices (np.array[float]): (T,) array of log price data, or (T, N) log prices
+            of N securities, rolled over time.
         rolling_window (int): size of rolling window.
 
     Returns:
-        hurst_values (np.array[float])
+        hurst_values (np.array[float]): (T,) or (T, N), nan for first rolling_window - 1
+            values, and for windows containing nan.
     """
-    # use numpy_ext parallel rolling window calculations
-    hurst_values = rolling_apply(_calculate_hurst,
-                                 rolling_window,
-                                 log_prices,
-                                 n_jobs=cpu_count()-1)
+    log_prices = np.asarray(log_prices, dtype=float)
+    hurst_values = np.full(log_prices.shape, np.nan)
+    number_of_windows = log_prices.shape[0] - rolling_window + 1
+    if number_of_windows <= 0:
+        return hurst_values
+
+    log_lags = np.log(np.arange(1, rolling_window // 2))
+    centred_log_lags = log_lags - log_lags.mean()
+    window_starts = np.arange(number_of_windows)
+
+    regression_numerators = np.zeros((number_of_windows,) + log_prices.shape[1:])
+    missing_values = np.zeros(regression_numerators.shape, dtype=bool)
+    for lag, centred_log_lag in enumerate(centred_log_lags, start=1):
+        squared_differences = (log_prices[lag:] - log_prices[:-lag]) ** 2
+        is_missing = np.isnan(squared_differences)
+
+        # sums of squared differences over each window, from cumulative sums
+        cumulative_sums = np.zeros((squared_differences.shape[0] + 1,) + squared_differences.shape[1:])
+        cumulative_missing = np.zeros(cumulative_sums.shape, dtype=int)
+        np.cumsum(np.where(is_missing, 0., squared_differences), axis=0, out=cumulative_sums[1:])
+        np.cumsum(is_missing, axis=0, out=cumulative_missing[1:])
+        window_ends = window_starts + rolling_window - lag
+        variances = (cumulative_sums[window_ends] - cumulative_sums[window_starts]) / (rolling_window - lag)
+        missing_values |= cumulative_missing[window_ends] > cumulative_missing[window_starts]
+
+        regression_numerators += centred_log_lag * np.log(variances)
+
+    regression_gradients = regression_numerators / np.sum(centred_log_lags ** 2)
+    regression_gradients[missing_values] = np.nan
+    hurst_values[rolling_window - 1:] = 0.5 * regression_gradients
 
     return hurst_values
 
@@ -143,6 +419,78 @@ def _calculate_past_future_returns_correlation(prices, lookback, forward):
     return correlation_coefficient, p_value
 
 
+def _create_chunk_portfolio_positions(prices, lookback, forward, entry_hurst, exit_hurst):
+    """
+    Args:
+        prices (np.array[float]): (T, N) prices of a chunk of securities
+        lookback (int)
+        forward (int)
+        entry_hurst (float)
+        exit_hurst (float)
+
+    Returns:
+        portfolio_positions (np.array[float]): (T, N)
+        hurst_exponents (np.array[float]): (T, N)
+        past_returns (np.array[float]): (T, N)
+    """
+    hurst_exponents = generate_hurst_array(np.log(prices), lookback)
+
+    past_returns = np.full(prices.shape, np.nan)
+    past_returns[lookback:] = prices[lookback:] / prices[:-lookback] - 1
+
+    portfolio_positions = create_batched_portfolio_positions(past_returns.T, hurst_exponents.T,
+                                                             forward, entry_hurst, exit_hurst)
+
+    return portfolio_positions.T, hurst_exponents, past_returns
+
+
+def _calculate_correlations_of_combinations(prices, lookbacks, forwards, windows, numbers_of_samples):
+    """
+    Args:
+        prices (np.array[float]): (T, N)
+        lookbacks (np.array[int]): (K,)
+        forwards (np.array[int]): (K,)
+        windows (np.array[int]): (K,) strides between pairs of returns
+        numbers_of_samples (np.array[int]): (K,) number of pairs of returns, at least 2
+
+    Returns:
+        correlation_coefficients (np.array[float]): (K, N)
+        p_values (np.array[float]): (K, N)
+    """
+    # segment of concatenated returns belonging to each combination
+    segment_starts = np.concatenate(([0], np.cumsum(numbers_of_samples)[:-1]))
+    segments = np.repeat(np.arange(numbers_of_samples.size), numbers_of_samples)
+    index = lookbacks[segments] + (np.arange(segments.size) - segment_starts[segments]) * windows[segments]
+
+    lookback_prices = prices[index - lookbacks[segments]]
+    lookback_returns = (prices[index] - lookback_prices) / lookback_prices
+    forward_returns = (prices[index + forwards[segments]] - prices[index]) / prices[index]
+
+    # normalised deviations from mean of each combination
+    numbers_of_samples = numbers_of_samples[:, np.newaxis]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalised_returns = []
+        for returns in (lookback_returns, forward_returns):
+            deviations = returns - (np.add.reduceat(returns, segment_starts, axis=0) / numbers_of_samples)[segments]
+            norms = np.sqrt(np.add.reduceat(deviations ** 2, segment_starts, axis=0))
+            normalised_returns.append(deviations / norms[segments])
+
+        correlation_coefficients = np.add.reduceat(normalised_returns[0] * normalised_returns[1],
+                                                   segment_starts, axis=0)
+    correlation_coefficients = np.clip(correlation_coefficients, -1, 1)
+
+    # coefficients of uncorrelated samples follow a beta distribution on (-1, 1) with a = b = n/2 - 1
+    shape = numbers_of_samples / 2 - 1
+    p_values = np.minimum(1, 2 * betainc(shape, shape, (1 - np.abs(correlation_coefficients)) / 2))
+
+    # two samples are always perfectly correlated
+    is_pair = np.broadcast_to(numbers_of_samples == 2, correlation_coefficients.shape)
+    correlation_coefficients[is_pair] = np.round(correlation_coefficients[is_pair])
+    p_values[is_pair] = np.where(np.isnan(correlation_coefficients[is_pair]), np.nan, 1)
+
+    return correlation_coefficients, p_values
+
+
 def _calculate_hurst(log_prices):
     """
     Calculates hurst exponent of a log price series. Hurst Exponent provides
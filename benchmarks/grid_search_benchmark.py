@@ -0,0 +1,55 @@
+"""
+Benchmark of grid_search on kalman_filter_strategy, comparing the serial path against pools
+of worker processes with price data in shared memory. Speedups depend on the number of cores
+available, see os.cpu_count().
+
+Run from the repository root:
+    python -m benchmarks.grid_search_benchmark
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from Strategies.kalman_filter import kalman_filter_strategy
+from utils.performance_metrics import grid_search
+
+NUMBER_OF_POINTS = 5_000
+NUMBERS_OF_WORKERS = [2, 4, 8]
+HYPERPARAMETERS = {'learning_rate': [1e-6, 1e-5, 1e-4, 1e-3, 1e-2],
+                   'covariance': [1e-3, 1e-2, 1e-1, 1],
+                   'zscore_threshold': [.5, 1, 1.5, 2, 2.5, 3]}
+COMMISSIONS_IN_PERCENT = .1
+BID_ASK_SPREAD = .01
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    security_1_prices = 100 + np.cumsum(random_state.normal(0, 1, NUMBER_OF_POINTS))
+    security_2_prices = 1.5 * security_1_prices + 3 + random_state.normal(0, 2, NUMBER_OF_POINTS)
+    price_data = pd.DataFrame({'security_1': security_1_prices, 'security_2': security_2_prices},
+                              index=pd.date_range('2000-01-01', periods=NUMBER_OF_POINTS))
+
+    start = time.perf_counter()
+    serial_results = grid_search(price_data, kalman_filter_strategy, HYPERPARAMETERS,
+                                 COMMISSIONS_IN_PERCENT, BID_ASK_SPREAD)
+    serial_time = time.perf_counter() - start
+
+    print(f"\n{os.cpu_count()} cores, {len(serial_results)} combinations")
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{1:>8} {serial_time:>8.2f} {1:>7.1f}x")
+
+    for number_of_workers in NUMBERS_OF_WORKERS:
+        start = time.perf_counter()
+        parallel_results = grid_search(price_data, kalman_filter_strategy, HYPERPARAMETERS,
+                                       COMMISSIONS_IN_PERCENT, BID_ASK_SPREAD,
+                                       number_of_workers=number_of_workers)
+        parallel_time = time.perf_counter() - start
+
+        assert parallel_results.equals(serial_results), "Parallel and serial results differ!"
+        print(f"{number_of_workers:>8} {parallel_time:>8.2f} {serial_time / parallel_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmark of rolling hurst exponents, comparing _calculate_hurst applied to every rolling
+window, as numpy_ext.rolling_apply previously did, against generate_hurst_array, built on
+cumulative sums of squared lag differences and a closed-form regression.
+
+Run from the repository root:
+    python -m benchmarks.hurst_benchmark
+"""
+
+import time
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+from Strategies.serial_momentum_functions import generate_hurst_array, _calculate_hurst
+
+NUMBER_OF_POINTS = 20_000
+ROLLING_WINDOWS = [20, 100, 252]
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    log_prices = np.log(100) + np.cumsum(random_state.normal(0, .01, NUMBER_OF_POINTS))
+
+    print(f"{'window':>8} {'per window (s)':>15} {'rolling (s)':>12} {'speedup':>9} {'max difference':>15}")
+    for rolling_window in ROLLING_WINDOWS:
+        start = time.perf_counter()
+        window_hurst_values = np.full(NUMBER_OF_POINTS, np.nan)
+        window_hurst_values[rolling_window - 1:] = [_calculate_hurst(window) for window
+                                                    in sliding_window_view(log_prices, rolling_window)]
+        window_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hurst_values = generate_hurst_array(log_prices, rolling_window)
+        rolling_time = time.perf_counter() - start
+
+        # differences of cumulative sums agree with direct sums up to rounding
+        assert np.allclose(window_hurst_values, hurst_values, rtol=0, atol=1e-10, equal_nan=True), \
+            "Hurst exponents differ!"
+
+        print(f"{rolling_window:>8} {window_time:>15.2f} {rolling_time:>12.3f} {window_time / rolling_time:>8.0f}x "
+              f"{np.nanmax(np.abs(window_hurst_values - hurst_values)):>15.1e}")
+
+
+if __name__ == '__main__':
+    main()
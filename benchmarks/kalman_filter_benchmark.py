@@ -0,0 +1,88 @@
+"""
+Benchmark of Kalman filter hedge ratios on 10M points, comparing the previous implementation
+with 2x2 numpy matrices against the closed-form scalar updates of StreamingKalmanFilter, which
+get_hedge_ratios_from_kalman_filter is built on.
+
+Run from the repository root:
+    python -m benchmarks.kalman_filter_benchmark
+"""
+
+import time
+import numpy as np
+
+from Strategies.kalman_filter import StreamingKalmanFilter, get_hedge_ratios_from_kalman_filter
+
+NUMBER_OF_POINTS = 10_000_000
+LEARNING_RATE = 1e-4
+COVARIANCE = 1e-3
+
+
+def numpy_kalman_filter(security_1_prices, security_2_prices, learning_rate, covariance):
+    """
+    Previous implementation, with np.dot and np.outer on 2x2 matrices for every observation.
+
+    Returns:
+        beta (np.array[float])
+        error (np.array[float])
+        error_variance (np.array[float])
+    """
+    x = np.stack([security_1_prices, np.ones(security_1_prices.size)], axis=1)
+    y = security_2_prices
+
+    beta = np.zeros((y.size, 2))
+    yhat = np.zeros(y.size)
+    e = np.zeros(y.size)
+    Q = np.zeros(y.size)
+    R = np.zeros((2, 2))
+    P = np.zeros((2, 2))
+    Vw = learning_rate / (1 - learning_rate) * np.eye(2)
+
+    for t in range(len(y)):
+        if t > 0:
+            beta[t] = beta[t - 1]
+            R = P + Vw
+
+        yhat[t] = np.dot(x[t], beta[t])
+        e[t] = y[t] - yhat[t]
+        Q[t] = np.dot(np.dot(x[t], R), x[t].T) + covariance
+
+        K = np.dot(R, x[t].T) / Q[t]
+        beta[t] = beta[t] + np.dot(K, e[t])
+        P = R - np.dot(np.outer(K, x[t]), R)
+
+    return beta, e, Q
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    security_1_prices = 100 + np.cumsum(random_state.normal(0, .1, NUMBER_OF_POINTS))
+    security_2_prices = 1.5 * security_1_prices + 3 + random_state.normal(0, .5, NUMBER_OF_POINTS)
+
+    start = time.perf_counter()
+    numpy_outputs = numpy_kalman_filter(security_1_prices, security_2_prices, LEARNING_RATE, COVARIANCE)
+    numpy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalar_outputs = get_hedge_ratios_from_kalman_filter(security_1_prices, security_2_prices,
+                                                         LEARNING_RATE, COVARIANCE)
+    scalar_time = time.perf_counter() - start
+
+    # numpy matrix products may fuse multiply-adds, so outputs agree up to rounding
+    for numpy_output, scalar_output in zip(numpy_outputs, scalar_outputs):
+        assert np.allclose(numpy_output, scalar_output, rtol=1e-6), "Kalman filter outputs differ!"
+
+    # streaming updates, one observation at a time, are identical to the batch function
+    kalman_filter = StreamingKalmanFilter(LEARNING_RATE, COVARIANCE)
+    x, y = security_1_prices[:100_000].tolist(), security_2_prices[:100_000].tolist()
+    start = time.perf_counter()
+    errors = [kalman_filter.update(x_t, y_t)[1] for x_t, y_t in zip(x, y)]
+    streaming_time = (time.perf_counter() - start) / len(x)
+    assert np.array_equal(errors, scalar_outputs[1][:len(x)]), "Streaming and batch outputs differ!"
+
+    print(f"{'points':>12} {'numpy (s)':>10} {'scalar (s)':>11} {'speedup':>8} {'update (us)':>12}")
+    print(f"{NUMBER_OF_POINTS:>12} {numpy_time:>10.1f} {scalar_time:>11.1f} {numpy_time / scalar_time:>7.1f}x "
+          f"{1e6 * streaming_time:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
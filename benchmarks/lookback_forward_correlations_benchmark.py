@@ -0,0 +1,47 @@
+"""
+Benchmark of the lookback/forward correlation grid search over many securities, comparing
+_calculate_past_future_returns_correlation called for every combination and security against
+calculate_past_future_returns_correlations, computing the whole grid at once.
+
+Run from the repository root:
+    python -m benchmarks.lookback_forward_correlations_benchmark
+"""
+
+import time
+import numpy as np
+
+from Strategies.serial_momentum_functions import (calculate_past_future_returns_correlations,
+                                                  _calculate_past_future_returns_correlation)
+
+NUMBER_OF_POINTS = 2_520
+NUMBER_OF_SECURITIES = 1_000
+LOOKBACKS = [5, 10, 20, 60, 120, 250]
+FORWARDS = [5, 10, 20, 60, 120, 250]
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    prices = 100 * np.exp(np.cumsum(random_state.normal(0, .01, (NUMBER_OF_POINTS, NUMBER_OF_SECURITIES)), axis=0))
+    lookbacks, forwards = (np.ravel(periods) for periods in np.meshgrid(LOOKBACKS, FORWARDS, indexing='ij'))
+
+    start = time.perf_counter()
+    looped_correlations = np.array([[_calculate_past_future_returns_correlation(prices[:, security], lookback, forward)
+                                     for security in range(NUMBER_OF_SECURITIES)]
+                                    for lookback, forward in zip(lookbacks, forwards)])
+    looped_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    correlation_coefficients, p_values = calculate_past_future_returns_correlations(prices, lookbacks, forwards)
+    vectorised_time = time.perf_counter() - start
+
+    assert np.allclose(looped_correlations[..., 0], correlation_coefficients, rtol=0, atol=1e-12), \
+        "Correlation coefficients differ!"
+    assert np.allclose(looped_correlations[..., 1], p_values, rtol=1e-10, atol=0), "P values differ!"
+
+    print(f"{'securities':>11} {'combinations':>13} {'looped (s)':>11} {'vectorised (s)':>15} {'speedup':>8}")
+    print(f"{NUMBER_OF_SECURITIES:>11} {lookbacks.size:>13} {looped_time:>11.2f} {vectorised_time:>15.3f} "
+          f"{looped_time / vectorised_time:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Microbenchmark of market data events, comparing construction cost and per-event memory of
+the slotted Quote against a plain object with a __dict__, and against rows of QUOTE_DTYPE
+viewed in bulk from a buffer.
+
+Run from the repository root:
+    python -m benchmarks.market_data_events_benchmark
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+from datetime import datetime
+
+from Architecture.data_structures.market_data import QUOTE, QUOTE_DTYPE, Quote, events_from_rows, view_buffer
+
+NUMBER_OF_EVENTS = 200_000
+
+
+class PlainQuote:
+    def __init__(self, security_id, datetime, bid, ask):
+        self.security_id = security_id
+        self.datetime = datetime
+        self.bid = bid
+        self.ask = ask
+
+
+def measure(create_events):
+    """
+    Returns:
+        seconds_per_event (float)
+        bytes_per_event (float)
+    """
+    start = time.perf_counter()
+    events = create_events()
+    seconds = time.perf_counter() - start
+    del events
+
+    tracemalloc.start()
+    events = create_events()
+    bytes_allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+
+    return seconds / NUMBER_OF_EVENTS, bytes_allocated / NUMBER_OF_EVENTS
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    security_ids = random_state.integers(0, 1_000, NUMBER_OF_EVENTS).tolist()
+    bids = (100 + random_state.normal(0, 1, NUMBER_OF_EVENTS)).tolist()
+    asks = [bid + .01 for bid in bids]
+    now = datetime(2021, 1, 4, 9, 30)
+
+    rows = np.zeros(NUMBER_OF_EVENTS, dtype=QUOTE_DTYPE)
+    rows['security_id'], rows['bid'], rows['ask'] = security_ids, bids, asks
+    rows['datetime'] = np.datetime64(now, 'ns')
+    buffer = rows.tobytes()
+
+    # shared datetime, only the event itself is measured
+    candidates = {
+        'plain object': lambda: [PlainQuote(*fields) for fields in zip(security_ids, [now] * NUMBER_OF_EVENTS,
+                                                                       bids, asks)],
+        'slotted Quote': lambda: [Quote(*fields) for fields in zip(security_ids, [now] * NUMBER_OF_EVENTS,
+                                                                   bids, asks)],
+        'Quote from rows': lambda: events_from_rows(rows, QUOTE),
+        'view of buffer': lambda: view_buffer(buffer, QUOTE),
+    }
+
+    print(f"{'events':>16} {'ns/event':>10} {'bytes/event':>12}")
+    for name, create_events in candidates.items():
+        seconds_per_event, bytes_per_event = measure(create_events)
+        print(f"{name:>16} {1e9 * seconds_per_event:>10.1f} {bytes_per_event:>12.1f}")
+
+    plain_quote = PlainQuote(0, now, 1., 1.)
+    print(f"\nsizes in bytes: plain object {sys.getsizeof(plain_quote) + sys.getsizeof(plain_quote.__dict__)} "
+          f"(incl. __dict__), slotted Quote {sys.getsizeof(Quote(0, now, 1., 1.))}, row {QUOTE_DTYPE.itemsize}")
+
+
+if __name__ == '__main__':
+    main()
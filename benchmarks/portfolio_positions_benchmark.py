@@ -0,0 +1,67 @@
+"""
+Benchmark of serial momentum positions of 1k securities x 100 hyperparameter sets, comparing
+create_portfolio_positions, looped over every security and hyperparameter set, against
+create_batched_portfolio_positions. The looped implementation is timed on a sample of runs
+and extrapolated to the whole batch.
+
+Run from the repository root:
+    python -m benchmarks.portfolio_positions_benchmark
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from Strategies.serial_momentum_functions import (create_portfolio_positions, create_batched_portfolio_positions,
+                                                  generate_hurst_array)
+
+NUMBER_OF_POINTS = 1_000
+NUMBER_OF_SECURITIES = 1_000
+SECURITIES_PER_BATCH = 100
+NUMBER_OF_SAMPLED_RUNS = 200
+LOOKBACK = 30
+FORWARDS = [5, 10, 25, 50]
+ENTRY_HURSTS = np.linspace(.5, .7, 5)
+EXIT_HURSTS = np.linspace(.3, .45, 5)
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    prices = 100 * np.exp(np.cumsum(random_state.normal(0, .01, (NUMBER_OF_SECURITIES, NUMBER_OF_POINTS)), axis=1))
+    hurst_exponents = np.stack([generate_hurst_array(np.log(security_prices), LOOKBACK) for security_prices in prices])
+    past_returns = prices[:, LOOKBACK:] / prices[:, :-LOOKBACK] - 1
+    past_returns = np.concatenate([np.full((NUMBER_OF_SECURITIES, LOOKBACK), np.nan), past_returns], axis=1)
+
+    forwards, entry_hursts, exit_hursts = (np.ravel(hyperparameter) for hyperparameter
+                                           in np.meshgrid(FORWARDS, ENTRY_HURSTS, EXIT_HURSTS, indexing='ij'))
+    number_of_runs = NUMBER_OF_SECURITIES * forwards.size
+
+    # securities in batches, with every hyperparameter set, to bound memory of positions
+    start = time.perf_counter()
+    batched_positions = []
+    for batch_start in range(0, NUMBER_OF_SECURITIES, SECURITIES_PER_BATCH):
+        batch = slice(batch_start, batch_start + SECURITIES_PER_BATCH)
+        batched_positions.append(create_batched_portfolio_positions(past_returns[batch, np.newaxis],
+                                                                    hurst_exponents[batch, np.newaxis],
+                                                                    forwards, entry_hursts, exit_hursts))
+    batched_positions = np.concatenate(batched_positions)
+    batched_time = time.perf_counter() - start
+
+    sampled_runs = random_state.choice(number_of_runs, NUMBER_OF_SAMPLED_RUNS, replace=False)
+    start = time.perf_counter()
+    for run in sampled_runs:
+        security, hyperparameter_set = divmod(run, forwards.size)
+        positions, _ = create_portfolio_positions(pd.DataFrame(prices[security]), past_returns[security],
+                                                  hurst_exponents[security], forwards[hyperparameter_set],
+                                                  entry_hursts[hyperparameter_set], exit_hursts[hyperparameter_set])
+        assert np.array_equal(positions.to_numpy(), batched_positions[security, hyperparameter_set],
+                              equal_nan=True), "Positions differ!"
+    looped_time = (time.perf_counter() - start) * number_of_runs / NUMBER_OF_SAMPLED_RUNS
+
+    print(f"{'securities':>11} {'hyperparameters':>16} {'looped (s)':>11} {'batched (s)':>12} {'speedup':>8}")
+    print(f"{NUMBER_OF_SECURITIES:>11} {forwards.size:>16} {looped_time:>11.1f} {batched_time:>12.2f} "
+          f"{looped_time / batched_time:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
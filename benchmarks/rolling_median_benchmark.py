@@ -0,0 +1,88 @@
+"""
+Microbenchmark of the outlier filter in DataModel.assert_not_outlier, comparing the
+previous deque + np.median path against the incremental RollingMedian.
+
+Run from the repository root:
+    python -m benchmarks.rolling_median_benchmark
+"""
+
+import time
+import numpy as np
+from collections import deque
+
+from Architecture.data_structures.rolling_median import RollingMedian
+
+WINDOW_SIZES = [1_000, 10_000, 100_000]
+NUMBER_OF_TICKS = 2_000
+MAXIMUM_ACCEPTABLE_PCT_CHANGE = .333
+
+
+def deque_median_filter(prices, window_size):
+    """
+    Previous implementation, np.median is called on the whole deque for every tick.
+
+    Returns:
+        decisions (List[bool])
+    """
+    clean_prices = deque(prices[:window_size])
+    decisions = []
+    for price in prices[window_size:]:
+        median_price = np.median(clean_prices)
+        not_outlier = abs((price - median_price) / median_price) < MAXIMUM_ACCEPTABLE_PCT_CHANGE
+        if not_outlier:
+            clean_prices.append(price)
+            clean_prices.popleft()
+        decisions.append(not_outlier)
+
+    return decisions
+
+
+def rolling_median_filter(prices, window_size):
+    """
+    Current implementation, median is maintained incrementally.
+
+    Returns:
+        decisions (List[bool])
+    """
+    clean_prices = RollingMedian(window_size)
+    for price in prices[:window_size]:
+        clean_prices.append(price)
+
+    decisions = []
+    for price in prices[window_size:]:
+        median_price = clean_prices.median()
+        not_outlier = abs((price - median_price) / median_price) < MAXIMUM_ACCEPTABLE_PCT_CHANGE
+        if not_outlier:
+            clean_prices.append(price)
+        decisions.append(not_outlier)
+
+    return decisions
+
+
+def main():
+    random_state = np.random.default_rng(0)
+    print(f"{'window':>10} {'deque (us/tick)':>16} {'rolling (us/tick)':>18} {'speedup':>8}")
+
+    for window_size in WINDOW_SIZES:
+        # random walk, with occasional bad ticks
+        prices = 100 * np.exp(np.cumsum(random_state.normal(0, 1e-4, window_size + NUMBER_OF_TICKS)))
+        bad_ticks = random_state.random(prices.size) < 0.01
+        prices[bad_ticks] *= 2
+        prices = prices.tolist()
+
+        start = time.perf_counter()
+        deque_decisions = deque_median_filter(prices, window_size)
+        deque_time = (time.perf_counter() - start) / NUMBER_OF_TICKS
+
+        # includes filling the window, which is O(n log n) for the rolling median
+        start = time.perf_counter()
+        rolling_decisions = rolling_median_filter(prices, window_size)
+        rolling_time = (time.perf_counter() - start) / NUMBER_OF_TICKS
+
+        assert deque_decisions == rolling_decisions, "Outlier decisions differ!"
+        print(f"{window_size:>10} {1e6 * deque_time:>16.2f} {1e6 * rolling_time:>18.2f} "
+              f"{deque_time / rolling_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
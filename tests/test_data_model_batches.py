@@ -0,0 +1,185 @@
+import logging
+import os
+import sys
+from collections import namedtuple
+from datetime import time
+
+import numpy as np
+import pytest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY]
+
+from Architecture.data_structures.market_data import (BAR, QUOTE, TRADE, BAR_DTYPE, QUOTE_DTYPE,  # noqa: E402
+                                                      TRADE_DTYPE, events_from_rows)
+from Architecture.primary_models.data_model import DataModel  # noqa: E402
+
+Security = namedtuple('Security', 'name quote_currency')
+SECURITIES = [Security('A', 'USD'), Security('B', 'EUR'), Security('C', 'EUR')]
+CURRENCY = 'EURUSD'
+DATA_TYPES_AND_DTYPES = {BAR: BAR_DTYPE, QUOTE: QUOTE_DTYPE, TRADE: TRADE_DTYPE}
+
+
+def create_data_model(keep_latest_events=True):
+    """ Data model trading three securities, two of them quoted in EUR, between 9:30 and 16:00.
+    """
+    data_model = DataModel()
+    data_model.keep_latest_events = keep_latest_events
+    data_model.receive_trading_universe({'securities_and_ids': {security: index + 1
+                                                                for index, security in enumerate(SECURITIES)},
+                                         'securities_and_indices': {security: index
+                                                                    for index, security in enumerate(SECURITIES)},
+                                         'currencies_and_ids': {CURRENCY: len(SECURITIES) + 1}})
+    data_model.data_points_needed = 20
+    data_model.trading_hours = {security: [(time(9, 30), time(16, 0))] for security in SECURITIES + [CURRENCY]}
+    data_model.logger.setLevel(logging.ERROR)
+    data_model.initialise_data_structures()
+
+    return data_model
+
+
+def create_batches(number_of_batches, seed):
+    """
+    Batches of bars (of securities and currency), quotes and trades, with rows outside trading
+    hours and outliers. Rows are in order of arrival, within and across batches.
+    """
+    random_generator = np.random.default_rng(seed)
+    current_time = np.datetime64('2024-01-02T09:00:00', 'us')
+    prices = {security_id: 100. for security_id in range(1, len(SECURITIES) + 1)}
+    prices[len(SECURITIES) + 1] = 1.1
+
+    batches = []
+    for _ in range(number_of_batches):
+        data_type = random_generator.choice([BAR, QUOTE, TRADE])
+        number_of_rows = int(random_generator.integers(1, 30))
+        security_ids = random_generator.integers(1, len(SECURITIES) + (2 if data_type == BAR else 1), number_of_rows)
+
+        batch = np.zeros(number_of_rows, dtype=DATA_TYPES_AND_DTYPES[data_type])
+        batch['security_id'] = security_ids
+        batch['datetime'] = current_time + np.cumsum(random_generator.integers(0, 30_000_000, number_of_rows))
+        current_time = batch['datetime'][-1].astype('datetime64[us]')
+
+        row_prices = []
+        for security_id in security_ids.tolist():
+            prices[security_id] *= np.exp(random_generator.normal(0, 0.01))
+            # occasional outliers
+            row_prices.append(prices[security_id] * (3 if random_generator.random() < 0.05 else 1))
+        row_prices = np.array(row_prices)
+
+        if data_type == BAR:
+            batch['open'] = batch['high'] = batch['low'] = batch['close'] = row_prices
+            batch['volume'] = random_generator.integers(1, 1000, number_of_rows)
+        elif data_type == QUOTE:
+            batch['bid'] = row_prices
+            batch['ask'] = row_prices * 1.001
+        else:
+            batch['last'] = row_prices
+            batch['volume'] = random_generator.integers(1, 1000, number_of_rows)
+
+        batches.append((batch, data_type))
+
+    return batches
+
+
+def process_one_at_a_time(data_model, batch, data_type):
+    """
+    Returns:
+        clean_mask (np.array[bool]): rows collected
+    """
+    clean_mask = []
+    for event in events_from_rows(batch, data_type):
+        data_is_clean = data_model.assert_clean_data(event)
+        if data_is_clean:
+            data_model.collect_data(event)
+            data_model.preprocess_data(event)
+        clean_mask.append(data_is_clean)
+
+    return np.array(clean_mask, dtype=bool)
+
+
+def process_batch(data_model, batch, data_type):
+    """
+    Returns:
+        clean_batch (np.recarray): rows collected
+    """
+    clean_batch = data_model.filter_clean_batch(batch, data_type)
+    if len(clean_batch):
+        data_model.collect_batch(clean_batch, data_type)
+        data_model.preprocess_batch(clean_batch, data_type)
+
+    return clean_batch
+
+
+def assert_same_rolling_medians(securities_and_rolling_medians, securities_and_expected_rolling_medians):
+    for security, rolling_median in securities_and_rolling_medians.items():
+        expected_rolling_median = securities_and_expected_rolling_medians[security]
+        assert list(rolling_median.window) == list(expected_rolling_median.window)
+        np.testing.assert_equal(rolling_median.median(), expected_rolling_median.median())
+
+
+def assert_same_events(securities_and_events, securities_and_expected_events):
+    for security, event in securities_and_events.items():
+        expected_event = securities_and_expected_events[security]
+        if expected_event is None:
+            assert event is None
+            continue
+
+        assert type(event) is type(expected_event)
+        for field in type(expected_event).__slots__:
+            assert getattr(event, field) == getattr(expected_event, field), (security, field)
+
+
+def assert_same_state(data_model, expected_data_model):
+    for attribute in ('securities_and_clean_bars', 'securities_and_clean_asks', 'securities_and_clean_bids',
+                      'securities_and_clean_trades', 'currencies_and_clean_bars'):
+        assert_same_rolling_medians(getattr(data_model, attribute), getattr(expected_data_model, attribute))
+
+    for attribute in ('securities_and_latest_bar', 'securities_and_latest_quote', 'securities_and_latest_trade',
+                      'currencies_and_latest_bar'):
+        assert_same_events(getattr(data_model, attribute), getattr(expected_data_model, attribute))
+
+    for field in ('bid', 'ask', 'last', 'close', 'volume', 'usd_price', 'usd_conversion_rate', 'timestamp'):
+        np.testing.assert_array_equal(getattr(data_model.market_data_store, field),
+                                      getattr(expected_data_model.market_data_store, field), err_msg=field)
+
+    np.testing.assert_equal(data_model.securities_and_latest_usd_price,
+                            expected_data_model.securities_and_latest_usd_price)
+    assert data_model.updated_securities == expected_data_model.updated_securities
+    assert data_model.repriced_securities == expected_data_model.repriced_securities
+    assert data_model.current_time == expected_data_model.current_time
+
+
+@pytest.mark.parametrize('keep_latest_events', [True, False])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batches_match_one_at_a_time(seed, keep_latest_events):
+    one_at_a_time_data_model = create_data_model(keep_latest_events)
+    batch_data_model = create_data_model(keep_latest_events)
+
+    number_of_clean_rows = 0
+    for batch, data_type in create_batches(300, seed):
+        clean_mask = process_one_at_a_time(one_at_a_time_data_model, batch, data_type)
+        clean_batch = process_batch(batch_data_model, batch, data_type)
+
+        np.testing.assert_array_equal(clean_batch.tolist(), batch[clean_mask].tolist())
+        if clean_mask.any():
+            assert_same_state(batch_data_model, one_at_a_time_data_model)
+
+        number_of_clean_rows += clean_mask.sum()
+        one_at_a_time_data_model.publish_data()
+        batch_data_model.publish_data()
+
+    # rows outside trading hours and outliers were filtered
+    number_of_rows = sum(len(batch) for batch, _ in create_batches(300, seed))
+    assert 0 < number_of_clean_rows < number_of_rows
+
+
+def test_latest_events_are_only_kept_in_store_without_keep_latest_events():
+    data_model = create_data_model(keep_latest_events=False)
+    for batch, data_type in create_batches(100, 0):
+        process_batch(data_model, batch, data_type)
+        data_model.publish_data()
+
+    for attribute in ('securities_and_latest_bar', 'securities_and_latest_quote', 'securities_and_latest_trade'):
+        assert all(event is None for event in getattr(data_model, attribute).values()), attribute
+    assert any(bar is not None for bar in data_model.currencies_and_latest_bar.values())
+    assert not np.isnan(data_model.market_data_store.last).all()
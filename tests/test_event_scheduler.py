@@ -0,0 +1,123 @@
+import logging
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY, os.path.join(REPOSITORY, 'Architecture')]
+
+from main_strategy import MainStrategy  # noqa: E402
+from Architecture.data_structures.market_data import QUOTE, QUOTE_DTYPE, TRADE_DTYPE, Quote, Trade  # noqa: E402
+from Architecture.helper_models.event_scheduler import EventScheduler  # noqa: E402
+from Architecture.helper_models.replay_engine import ReplayEngine, write_replay_file  # noqa: E402
+
+Security = namedtuple('Security', 'name quote_currency')
+SECURITIES = [Security('A', 'USD'), Security('B', 'USD')]
+START_TIME = np.datetime64('2024-01-02T10:00:00', 'ns')
+
+
+def create_strategy(event_scheduler):
+    """ Main strategy trading two securities around the clock, with an event scheduler set.
+    """
+    strategy = MainStrategy()
+    strategy.event_scheduler = event_scheduler
+    strategy.alpha_model.use_pair_spread_factor_bank = True
+
+    trading_universe = {'securities_and_ids': {security: index + 1 for index, security in enumerate(SECURITIES)},
+                        'securities_and_indices': {security: index for index, security in enumerate(SECURITIES)},
+                        'currencies_and_ids': {},
+                        'security_clusters': {0: SECURITIES}}
+    for model in (strategy.data_model, strategy.alpha_model, strategy.portfolio_model, strategy.execution_model):
+        model.receive_trading_universe(trading_universe)
+
+    strategy.data_model.data_points_needed = 20
+    strategy.data_model.trading_hours = {security: [(time(0, 0), time(23, 59, 59))] for security in SECURITIES}
+    strategy.data_model.logger.setLevel(logging.ERROR)
+
+    strategy.prepare_data_model()
+    strategy.prepare_alpha_model()
+    strategy.prepare_portfolio_model()
+    strategy.prepare_execution_model()
+    return strategy
+
+
+def create_batch(dtype, number_of_rows, **fields):
+    batch = np.zeros(number_of_rows, dtype=dtype)
+    batch['security_id'] = np.arange(number_of_rows) % len(SECURITIES) + 1
+    batch['datetime'] = START_TIME + np.arange(number_of_rows) * np.timedelta64(10, 'ms')
+    for field, value in fields.items():
+        batch[field] = value
+
+    return batch
+
+
+def record_portfolio_runs(strategy):
+    """ Records times at which portfolio runs, portfolio holds no positions as no optimizer is set.
+    """
+    portfolio_runs = []
+
+    def create_portfolio(signals):
+        portfolio_runs.append(strategy.data_model.current_time)
+        return {security: 0 for security in signals}
+
+    strategy.portfolio_model.create_portfolio = create_portfolio
+    return portfolio_runs
+
+
+def test_on_quotes_and_on_trades_with_event_scheduler():
+    strategy = create_strategy(EventScheduler(portfolio_interval=timedelta(milliseconds=100)))
+    portfolio_runs = record_portfolio_runs(strategy)
+
+    strategy.on_quotes(create_batch(QUOTE_DTYPE, 4, bid=100., ask=100.1))
+    strategy.on_trades(create_batch(TRADE_DTYPE, 4, last=100.05, volume=10.))
+    assert len(portfolio_runs) == 1
+    assert isinstance(strategy.event_scheduler.last_portfolio_time, datetime)
+
+    # Portfolio runs again once the portfolio interval has passed
+    later_quotes = create_batch(QUOTE_DTYPE, 2, bid=100.2, ask=100.3)
+    later_quotes['datetime'] += np.timedelta64(200, 'ms')
+    strategy.on_quotes(later_quotes)
+    assert len(portfolio_runs) == 2
+
+
+def test_is_portfolio_due_with_datetime64():
+    event_scheduler = EventScheduler(portfolio_interval=timedelta(milliseconds=100))
+    event_scheduler.record_portfolio_run(START_TIME, {})
+
+    assert not event_scheduler.is_portfolio_due(START_TIME + np.timedelta64(50, 'ms'))
+    assert event_scheduler.is_portfolio_due(START_TIME + np.timedelta64(100, 'ms'))
+    assert event_scheduler.is_portfolio_due(datetime(2024, 1, 2, 10, 0, 1))
+
+
+def test_pending_quotes_are_flushed_by_other_events():
+    strategy = create_strategy(EventScheduler(conflation_events=10))
+    record_portfolio_runs(strategy)
+    quote_time = datetime(2024, 1, 2, 10)
+
+    strategy.on_quote(Quote(1, quote_time, 100., 100.1))
+    strategy.on_quote(Quote(2, quote_time, 50., 50.1))
+    market_data_store = strategy.data_model.market_data_store
+    assert np.isnan(market_data_store.bid[0])
+
+    strategy.on_trade(Trade(1, quote_time + timedelta(seconds=1), 100.05, 10.))
+    assert market_data_store.bid[0] == 100.
+    assert market_data_store.bid[1] == 50.
+    assert market_data_store.last[0] == 100.05
+    assert not strategy.event_scheduler.pending_events
+
+
+def test_pending_quotes_are_flushed_at_end_of_replay(tmp_path):
+    strategy = create_strategy(EventScheduler(conflation_events=10))
+    record_portfolio_runs(strategy)
+
+    path = str(tmp_path / 'quotes.npy')
+    write_replay_file(path, create_batch(QUOTE_DTYPE, 4, bid=100., ask=100.1))
+    replay_engine = ReplayEngine(strategy, dispatch_batches=False)
+    replay_engine.add_source(path, QUOTE)
+    replay_engine.run()
+
+    assert not strategy.event_scheduler.pending_events
+    assert not np.isnan(strategy.data_model.market_data_store.bid).any()
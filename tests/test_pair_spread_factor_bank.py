@@ -0,0 +1,85 @@
+import os
+import sys
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY, os.path.join(REPOSITORY, 'Strategies')]
+
+from kalman_filter import kalman_filter_strategy, kalman_filter_hedge_ratios_stage  # noqa: E402
+from Architecture.factor_models.pair_spread_factor_bank import PairSpreadFactorBank  # noqa: E402
+
+LEARNING_RATE = 1e-4
+COVARIANCE = 1e-3
+ZSCORE_THRESHOLD = 1
+
+
+def create_prices(number_of_observations, number_of_securities, seed):
+    """ Cointegrated prices: every security tracks a common random walk with its own hedge ratio.
+    """
+    random_generator = np.random.default_rng(seed)
+    common_walk = 50 + np.cumsum(random_generator.normal(0, 0.5, number_of_observations))
+    hedge_ratios = random_generator.uniform(0.5, 3, number_of_securities)
+    noise = random_generator.normal(0, 1, (number_of_observations, number_of_securities))
+
+    return common_walk[:, None] * hedge_ratios + noise
+
+
+def run_factor_bank(prices, pairs_of_indices):
+    """
+    Returns:
+        beta (np.array[float] (T, P, 2)), error (np.array[float] (T, P)), positions (np.array[float] (T, P))
+    """
+    factor_bank = PairSpreadFactorBank(pairs_of_indices, prices.shape[1], learning_rate=LEARNING_RATE,
+                                       covariance=COVARIANCE, zscore_threshold=ZSCORE_THRESHOLD)
+    beta, error, positions = [], [], []
+    for latest_prices in prices:
+        factor_bank.receive_data(latest_prices)
+        beta.append(factor_bank.beta.copy())
+        error.append(factor_bank.error.copy())
+        positions.append(factor_bank.generate_positions())
+
+    return np.array(beta), np.array(error), np.array(positions)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_factor_bank_matches_kalman_filter_strategy(seed):
+    prices = create_prices(600, 4, seed)
+    pairs_of_indices = list(combinations(range(prices.shape[1]), 2))
+
+    beta, error, positions = run_factor_bank(prices, pairs_of_indices)
+
+    for pair_index, (security_1_index, security_2_index) in enumerate(pairs_of_indices):
+        price_data = pd.DataFrame(prices[:, [security_1_index, security_2_index]])
+        expected_beta, expected_error, _ = kalman_filter_hedge_ratios_stage(price_data, LEARNING_RATE, COVARIANCE)
+        expected_positions, expected_hedge_ratios = kalman_filter_strategy(price_data, LEARNING_RATE, COVARIANCE,
+                                                                           ZSCORE_THRESHOLD)
+
+        # hedge ratios and spreads (prediction errors)
+        np.testing.assert_allclose(beta[:, pair_index], expected_beta, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(error[:, pair_index], expected_error, rtol=1e-9, atol=1e-9)
+        np.testing.assert_array_equal(-np.round(beta[:, pair_index, 0]), expected_hedge_ratios[0].to_numpy())
+
+        # positions are nan in the strategy until Bollinger Bands are first crossed, and flat in the bank
+        np.testing.assert_array_equal(positions[:, pair_index], np.nan_to_num(expected_positions.to_numpy()))
+        assert np.abs(positions[:, pair_index]).sum() > 0
+
+
+def test_pairs_with_missing_prices_are_not_updated():
+    prices = create_prices(200, 3, 0)
+    prices[50:80, 2] = np.nan
+    pairs_of_indices = [(0, 1), (0, 2)]
+
+    beta, error, _ = run_factor_bank(prices, pairs_of_indices)
+
+    # pair with a missing price matches the strategy on observations with both prices
+    has_prices = ~np.isnan(prices[:, 2])
+    price_data = pd.DataFrame(prices[has_prices][:, [0, 2]])
+    expected_beta, expected_error, _ = kalman_filter_hedge_ratios_stage(price_data, LEARNING_RATE, COVARIANCE)
+
+    np.testing.assert_allclose(beta[has_prices, 1], expected_beta, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(error[has_prices, 1], expected_error, rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(beta[50:80, 1], np.repeat(beta[49:50, 1], 30, axis=0))
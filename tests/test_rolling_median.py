@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY]
+
+from Architecture.data_structures.rolling_median import RollingMedian  # noqa: E402
+
+
+def assert_matches_sliding_median(values, window_size):
+    """ Appends values one at a time, checking the median against np.median of the sliding window.
+    """
+    rolling_median = RollingMedian(window_size)
+    for index, value in enumerate(values):
+        rolling_median.append(value)
+        window = values[max(0, index + 1 - window_size):index + 1]
+
+        assert len(rolling_median) == len(window)
+        assert rolling_median.is_full() == (len(window) == window_size)
+        np.testing.assert_equal(rolling_median.median(), np.median(window))
+
+    return rolling_median
+
+
+@pytest.mark.parametrize('window_size', [1, 2, 5, 10, 51])
+def test_median_matches_np_median_over_sliding_window(window_size):
+    random_walk = np.round(100 + np.cumsum(np.random.default_rng(window_size).normal(0, 0.5, 2000)), 1)
+    assert_matches_sliding_median(random_walk, window_size)
+
+
+@pytest.mark.parametrize('window_size', [1, 4, 7])
+def test_duplicate_values(window_size):
+    values = np.random.default_rng(0).integers(0, 4, 1000).astype(float)
+    assert_matches_sliding_median(values, window_size)
+
+
+@pytest.mark.parametrize('window_size', [3, 4])
+def test_removal_of_values_equal_to_median(window_size):
+    values = np.array([5., 5., 5., 1., 9., 5., 5., 2., 8., 5., 5., 5., 3., 5.])
+    assert_matches_sliding_median(values, window_size)
+
+
+def test_nan_values():
+    values = np.array([1., 2., np.nan, 4., 5., 6., 7.])
+    assert_matches_sliding_median(values, 3)
+
+
+def test_empty_window():
+    assert np.isnan(RollingMedian(5).median())
+
+
+@pytest.mark.parametrize('window_size', [10, 1000])
+@pytest.mark.parametrize('trend', [1., -1.])
+def test_heaps_stay_bounded_on_trending_prices(window_size, trend):
+    rolling_median = RollingMedian(window_size)
+    maximum_heap_size = 0
+    for value in (trend * np.arange(100_000.)).tolist():
+        rolling_median.append(value)
+        maximum_heap_size = max(maximum_heap_size, len(rolling_median.lower_half) + len(rolling_median.upper_half))
+
+    assert maximum_heap_size <= 2 * window_size + 2
+    assert rolling_median.median() == np.median(trend * np.arange(100_000 - window_size, 100_000.))
+
+
+def test_heaps_stay_bounded_on_random_walk():
+    window_size = 1000
+    random_walk = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.05, 200_000))
+
+    rolling_median = RollingMedian(window_size)
+    for value in random_walk.tolist():
+        rolling_median.append(value)
+        assert len(rolling_median.lower_half) + len(rolling_median.upper_half) <= 2 * window_size + 2
+
+    assert rolling_median.median() == np.median(random_walk[-window_size:])
@@ -0,0 +1,119 @@
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY]
+
+from Architecture.data_structures.trading_hours_index import TradingHoursIndex  # noqa: E402
+
+SECURITIES_AND_TRADING_HOURS = {'AAPL': [(time(9, 30), time(16, 0))],
+                                'MSFT': [(time(9, 30), time(16, 0))],
+                                'ES': [(time(18, 0), time(17, 0))],  # session runs past midnight
+                                'SPLIT': [(time(1, 0), time(2, 0)), (time(13, 0), time(14, 30, 15))],
+                                'NIGHT': [(time(22, 0), time(4, 0)), (time(10, 0), time(11, 0))]}
+SECURITIES_AND_SPECIAL_SESSIONS = {'AAPL': {date(2024, 11, 29): [(time(9, 30), time(13, 0))],  # half-day
+                                            date(2024, 12, 25): []},  # holiday
+                                   'ES': {date(2024, 12, 24): [(time(18, 0), time(12, 15))]}}
+
+
+def is_within_trading_hours(security, timestamp):
+    """ Datetime-based check which the lookup tables replace, with special sessions replacing
+    regular trading intervals on their date.
+    """
+    trading_intervals = SECURITIES_AND_SPECIAL_SESSIONS.get(security, {}).get(timestamp.date(),
+                                                                            SECURITIES_AND_TRADING_HOURS[security])
+    for start, end in trading_intervals:
+        # If trading hours spill over to next day
+        if end < start:
+            within_trading_hours = start < timestamp.time() or timestamp.time() < end
+        else:
+            within_trading_hours = start < timestamp.time() < end
+
+        if within_trading_hours:
+            return True
+
+    return False
+
+
+def create_timestamps():
+    """ Times on and around every boundary, with random times, on regular days and special sessions.
+    """
+    boundaries = {boundary for trading_intervals in SECURITIES_AND_TRADING_HOURS.values()
+                  for trading_interval in trading_intervals for boundary in trading_interval}
+    boundaries |= {boundary for dates_and_trading_intervals in SECURITIES_AND_SPECIAL_SESSIONS.values()
+                   for trading_intervals in dates_and_trading_intervals.values()
+                   for trading_interval in trading_intervals for boundary in trading_interval}
+    boundaries |= {time(0, 0), time(23, 59, 59)}
+
+    offsets = [timedelta(seconds=-1), timedelta(microseconds=-1), timedelta(0),
+               timedelta(microseconds=1), timedelta(microseconds=999_999), timedelta(seconds=1)]
+    dates = [date(2024, 11, 28), date(2024, 11, 29), date(2024, 11, 30),
+             date(2024, 12, 24), date(2024, 12, 25), date(2024, 12, 26)]
+
+    timestamps = [datetime.combine(day, boundary) + offset
+                  for day in dates for boundary in boundaries for offset in offsets]
+
+    random_generator = np.random.default_rng(0)
+    for day in dates:
+        microseconds = random_generator.integers(0, 24 * 60 * 60 * 1_000_000, 500).tolist()
+        timestamps += [datetime.combine(day, time(0, 0)) + timedelta(microseconds=microsecond)
+                       for microsecond in microseconds]
+
+    return timestamps
+
+
+def test_is_within_trading_hours_matches_datetime_check():
+    trading_hours_index = TradingHoursIndex(SECURITIES_AND_TRADING_HOURS, SECURITIES_AND_SPECIAL_SESSIONS)
+
+    for timestamp in create_timestamps():
+        for security in SECURITIES_AND_TRADING_HOURS:
+            assert trading_hours_index.is_within_trading_hours(security, timestamp) ==\
+                is_within_trading_hours(security, timestamp), (security, timestamp)
+
+
+def test_are_within_trading_hours_matches_datetime_check():
+    trading_hours_index = TradingHoursIndex(SECURITIES_AND_TRADING_HOURS, SECURITIES_AND_SPECIAL_SESSIONS)
+    timestamps = create_timestamps()
+
+    for security, security_code in trading_hours_index.securities_and_codes.items():
+        within_trading_hours = trading_hours_index.are_within_trading_hours(
+            np.full(len(timestamps), security_code), np.array(timestamps, dtype='datetime64[ns]'))
+
+        expected = [is_within_trading_hours(security, timestamp) for timestamp in timestamps]
+        np.testing.assert_array_equal(within_trading_hours, expected, err_msg=security)
+
+
+def test_boundaries_are_excluded():
+    trading_hours_index = TradingHoursIndex(SECURITIES_AND_TRADING_HOURS, SECURITIES_AND_SPECIAL_SESSIONS)
+
+    assert not trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 11, 28, 9, 30))
+    assert trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 11, 28, 9, 30, 0, 1))
+    assert trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 11, 28, 15, 59, 59, 999_999))
+    assert not trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 11, 28, 16, 0))
+
+
+def test_special_sessions():
+    trading_hours_index = TradingHoursIndex(SECURITIES_AND_TRADING_HOURS, SECURITIES_AND_SPECIAL_SESSIONS)
+
+    # half-day closes early, and only for the security with the special session
+    assert not trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 11, 29, 14, 0))
+    assert trading_hours_index.is_within_trading_hours('MSFT', datetime(2024, 11, 29, 14, 0))
+
+    # holiday
+    assert not trading_hours_index.is_within_trading_hours('AAPL', datetime(2024, 12, 25, 12, 0))
+
+    # special session past midnight only applies to its calendar date
+    assert not trading_hours_index.is_within_trading_hours('ES', datetime(2024, 12, 24, 13, 0))
+    assert trading_hours_index.is_within_trading_hours('ES', datetime(2024, 12, 25, 13, 0))
+
+
+def test_outside_any_session():
+    trading_hours_index = TradingHoursIndex(SECURITIES_AND_TRADING_HOURS, SECURITIES_AND_SPECIAL_SESSIONS)
+
+    assert not trading_hours_index.is_within_trading_hours('SPLIT', datetime(2024, 11, 28, 8, 0))
+    assert not trading_hours_index.is_within_trading_hours('ES', datetime(2024, 11, 28, 17, 30))
+    assert not trading_hours_index.is_within_trading_hours('NIGHT', datetime(2024, 11, 28, 5, 0))
+    assert trading_hours_index.is_within_trading_hours('NIGHT', datetime(2024, 11, 28, 3, 0))
@@ -0,0 +1,135 @@
+import logging
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, time
+
+import numpy as np
+import pandas as pd
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY, os.path.join(REPOSITORY, 'Architecture')]
+
+from main_strategy import MainStrategy  # noqa: E402
+from Architecture.data_structures.market_data import TRADE, TRADE_DTYPE, events_from_rows  # noqa: E402
+from Architecture.helper_models.volume_bar_builder import VolumeBarBuilder  # noqa: E402
+from Sampling.sampler import _resample_by_sampling_size  # noqa: E402
+
+Security = namedtuple('Security', 'name quote_currency')
+SECURITIES = [Security('A', 'USD'), Security('B', 'USD')]
+START_TIME = datetime(2024, 1, 2, 10)
+
+
+def create_strategy(security_ids_and_sampling_sizes):
+    """ Main strategy on the volume clock, recording bars processed and the current time of each bar.
+    """
+    strategy = MainStrategy()
+    strategy.volume_bar_builder = VolumeBarBuilder(security_ids_and_sampling_sizes)
+
+    data_model = strategy.data_model
+    data_model.receive_trading_universe({'securities_and_ids': {security: index + 1
+                                                                for index, security in enumerate(SECURITIES)},
+                                         'securities_and_indices': {security: index
+                                                                    for index, security in enumerate(SECURITIES)},
+                                         'currencies_and_ids': {}})
+    data_model.data_points_needed = 20
+    data_model.trading_hours = {security: [(time(0, 0), time(23, 59, 59))] for security in SECURITIES}
+    data_model.logger.setLevel(logging.ERROR)
+    data_model.initialise_data_structures()
+
+    # records bars processed, with current time of data model before and after each bar
+    strategy.processed_bars = []
+    strategy.run_event_loop = lambda: None
+    on_bar = strategy.on_bar
+
+    def record_bar(bar):
+        time_before_bar = data_model.current_time
+        on_bar(bar)
+        strategy.processed_bars.append((bar, time_before_bar, data_model.current_time))
+
+    strategy.on_bar = record_bar
+    return strategy
+
+
+def create_trades(number_of_trades, seed):
+    random_generator = np.random.default_rng(seed)
+
+    trades = np.zeros(number_of_trades, dtype=TRADE_DTYPE)
+    trades['security_id'] = random_generator.integers(1, len(SECURITIES) + 1, number_of_trades)
+    trades['datetime'] = np.datetime64(START_TIME, 'ns') + np.arange(number_of_trades) * np.timedelta64(1, 's')
+    trades['last'] = 100 + np.cumsum(random_generator.normal(0, 0.1, number_of_trades))
+    trades['volume'] = random_generator.integers(1, 400, number_of_trades)
+    trades['volume'][::37] = 5000  # trades completing several bars at once
+
+    return trades
+
+
+def test_batched_trades_match_trades_one_at_a_time():
+    trades = create_trades(1000, 0)
+
+    one_at_a_time_strategy = create_strategy({1: 1000, 2: 700})
+    for trade in events_from_rows(trades, TRADE):
+        one_at_a_time_strategy.on_trade(trade)
+
+    batch_strategy = create_strategy({1: 1000, 2: 700})
+    for batch_start in range(0, trades.size, 64):
+        batch_strategy.on_trades(trades[batch_start:batch_start + 64])
+
+    assert len(batch_strategy.processed_bars) == len(one_at_a_time_strategy.processed_bars) > 0
+    for (bar, _, time_after_bar), (expected_bar, _, expected_time_after_bar) in\
+            zip(batch_strategy.processed_bars, one_at_a_time_strategy.processed_bars):
+        assert (bar.security_id, bar.datetime, bar.open, bar.high, bar.low, bar.close, bar.volume) ==\
+            (expected_bar.security_id, expected_bar.datetime, expected_bar.open, expected_bar.high,
+             expected_bar.low, expected_bar.close, expected_bar.volume)
+        assert time_after_bar == expected_time_after_bar
+
+    assert batch_strategy.data_model.current_time == one_at_a_time_strategy.data_model.current_time
+
+
+def test_current_time_never_moves_back_within_a_batch():
+    strategy = create_strategy({1: 1000, 2: 700})
+    strategy.on_trades(create_trades(500, 1))
+
+    assert len(strategy.processed_bars) > 1
+    for bar, time_before_bar, time_after_bar in strategy.processed_bars:
+        # trades up to the trade completing the bar are collected before the bar, and none after it
+        assert time_before_bar == bar.datetime == time_after_bar
+
+
+def test_trade_crossing_several_multiples_emits_one_bar():
+    volume_bar_builder = VolumeBarBuilder({1: 1000})
+
+    assert volume_bar_builder.update(1, START_TIME, 100., 400.) == 0
+    assert volume_bar_builder.update(1, START_TIME, 101., 3000.) == 3
+    assert volume_bar_builder.latest_number_of_bars == 3
+    assert volume_bar_builder.bars_completed == 3
+
+    latest_bar = volume_bar_builder.latest_bar
+    assert (latest_bar.open, latest_bar.high, latest_bar.low, latest_bar.close, latest_bar.volume) ==\
+        (100., 101., 100., 101., 3400.)
+
+    # excess volume is carried over to the next bar
+    assert volume_bar_builder.update(1, START_TIME, 102., 599.) == 0
+    assert volume_bar_builder.update(1, START_TIME, 103., 1.) == 1
+    assert volume_bar_builder.latest_bar.volume == 600.
+
+
+def test_bars_repeated_by_number_of_bars_completed_match_sampler():
+    for method, sampling_size in [('VOLUME', 1000), ('DOLLAR', 80_000)]:
+        trades = create_trades(3000, 2)
+        trades['security_id'] = 1
+        volume_bar_builder = VolumeBarBuilder({1: sampling_size}, method)
+        completed_bars = volume_bar_builder.update_with_trades(np.rec.array(trades))
+
+        time_sampled_data = pd.DataFrame({'close': trades['last'], 'volume': trades['volume']},
+                                         index=pd.DatetimeIndex(trades['datetime']))
+        resampled_data = _resample_by_sampling_size(time_sampled_data, sampling_size, method)
+
+        repeated_bars = pd.DataFrame([(bar.open, bar.high, bar.low, bar.close, bar.volume / number_of_bars,
+                                       pd.Timestamp(bar.datetime))
+                                      for _, bar, number_of_bars in completed_bars for _ in range(number_of_bars)],
+                                     columns=['open', 'high', 'low', 'close', 'volume', 'end_time'])
+
+        assert len(repeated_bars) > len(completed_bars)
+        pd.testing.assert_frame_equal(repeated_bars, resampled_data[repeated_bars.columns], check_dtype=False,
+                                      check_index_type=False)
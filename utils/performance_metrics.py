@@ -1,10 +1,15 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+import multiprocessing
 
 from tqdm import tqdm
+from collections import OrderedDict
 from functools import partial
 from itertools import product as cartesian_product
+from multiprocessing import shared_memory
+
+from utils.result_cache import ResultCache
 
 
 def calculate_pnl_with_transaction_costs(price_data, positions, portfolio_ratios,
@@ -61,12 +66,90 @@ def calculate_pnl_with_transaction_costs(price_data, positions, portfolio_ratios
     return annual_returns, sharpe_ratio
 
 
-def grid_search(price_data, strategy, hyperparameters, commissions_in_percent, bid_ask_spread):
+def calculate_batched_pnl_with_transaction_costs(price_data, positions, portfolio_ratios,
+                                                 commissions_in_percent, bid_ask_spread):
+    """
+    Calculates performance metrics of K strategies on the same price data at once, e.g. for
+    each combination of hyperparameters of a grid search. Price returns and shifted prices
+    are calculated once for all strategies, and metrics are calculated with the same steps
+    as calculate_pnl_with_transaction_costs, vectorized across strategies.
+
+    Args:
+        price_data (pd.DataFrame
+            {Date (datetime.datetime): {security_1 (str): prices (List[float]),
+                                        security_2 (str): prices (List[float]),
+                                                        .
+                                                        .
+                                                        .}})
+        positions (np.array[float] (K, T)): positions to take in the unit portfolio of each strategy
+        portfolio_ratios (np.array[float] (K, T, N)): ratios of each security in the unit
+            portfolio of each strategy
+        commissions_in_percent (float): to model transaction costs
+        bid_ask_spread (float): to model transaction costs
+
+    Returns:
+        annualised_returns (np.array[float] (K,))
+        sharpe_ratio (np.array[float] (K,))
+    """
+    positions = np.asarray(positions, dtype=float)
+    portfolio_ratios = np.asarray(portfolio_ratios, dtype=float)
+
+    # identical for all strategies
+    prices = price_data.to_numpy(dtype=float)
+    previous_prices = _shift(prices, axis=0)
+    price_returns = prices / previous_prices - 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # calculate transaction costs
+        transaction_costs = _calculate_batched_transaction_costs(previous_prices, positions, portfolio_ratios,
+                                                                 commissions_in_percent, bid_ask_spread)
+
+        # calculate raw pnl
+        portfolio_market_values = positions[:, :, np.newaxis] * portfolio_ratios * prices
+        previous_portfolio_market_values = _shift(portfolio_market_values, axis=1)
+        raw_pnl = np.sum(previous_portfolio_market_values * price_returns, axis=2)
+
+        # apply transaction costs and calculate performance metrics
+        daily_pnl = raw_pnl - transaction_costs
+        daily_returns = daily_pnl / np.nansum(np.abs(previous_portfolio_market_values), axis=2)
+        daily_returns[daily_returns == -np.inf] = np.nan
+
+        # missing returns are skipped, as by pandas
+        annual_returns = np.nanprod(1 + daily_returns, axis=1) ** (252 / daily_returns.shape[1]) - 1
+        annual_returns = np.round(annual_returns, 3)
+        sharpe_ratio = np.sqrt(252) * _nanmean(daily_returns) / _nanstd(daily_returns)
+        sharpe_ratio = np.round(sharpe_ratio, 3)
+
+    return annual_returns, sharpe_ratio
+
+
+def grid_search(price_data, strategy, hyperparameters, commissions_in_percent, bid_ask_spread,
+                stage_cache_size=128, number_of_workers=1, chunk_size=None, pnl_batch_size=64,
+                result_cache=None):
     """
     Tunes hyperparameters for a strategy by running a grid search. Each combination of
     hyperparameter is fed into the strategy, positions and portfolio ratios are returned,
     pnl is calculated and results are tabulated.
 
+    Strategies may declare their pipeline as stages, in a stages attribute (see
+    kalman_filter_strategy), each stage depending on a subset of hyperparameters. Output of
+    each stage is then cached, keyed by the hyperparameters of the stage and previous stages,
+    and the grid is ordered so that hyperparameters of earlier stages vary slowest. A stage
+    is thus only run once for each combination of its hyperparameters, e.g. hedge ratios are
+    not estimated again for each zscore threshold. The first stage may also be batched, to
+    run many combinations of its hyperparameters at once.
+
+    With more than one worker, combinations are split into chunks of consecutive combinations
+    and evaluated by a pool of processes. Price data is placed in shared memory once, so it
+    is not pickled for every chunk, and results are tabulated in the same order as serially.
+    Strategy must then be picklable, i.e. defined at the top level of a module.
+
+    With a result cache, results are stored on disk as each batch (or chunk, with more than
+    one worker) of combinations completes, keyed by a hash of price data, strategy,
+    combination and transaction costs, see utils.result_cache.ResultCache. Combinations
+    already in the cache are not evaluated again, so an interrupted grid search is resumed
+    by running it again with the same cache.
+
     Args:
         price_data (pd.DataFrame
             {Date (datetime.datetime): {security_1 (str): prices (List[float]),
@@ -83,38 +166,650 @@ def grid_search(price_data, strategy, hyperparameters, commissions_in_percent, b
 
         commissions_in_percent (float): to model transaction costs
         bid_ask_spread (float): to model transaction costs
+        stage_cache_size (int): maximum number of outputs cached for each stage, least
+            recently used outputs are evicted first.
+        number_of_workers (int): number of processes evaluating combinations
+        chunk_size (int): number of combinations sent to a worker at once, by default
+            combinations are split into 4 chunks per worker.
+        pnl_batch_size (int): number of combinations whose pnl is calculated at once, see
+            calculate_batched_pnl_with_transaction_costs.
+        result_cache (ResultCache or str): result cache, or path to its SQLite database,
+            by default results are not cached.
 
     Returns:
         results (pd.DataFrame): results of the grid search.
     """
+    # Grid search
+    parameter_combinations = _create_parameter_combinations(hyperparameters, getattr(strategy, 'stages', None))
+    results = _evaluate_grid(price_data, strategy, parameter_combinations, commissions_in_percent, bid_ask_spread,
+                             stage_cache_size, number_of_workers, chunk_size, pnl_batch_size, result_cache)
+
+    # convert results into a tabular form
+    results = pd.DataFrame(results)
+    results = results.fillna(0)
+    return results
+
+
+def successive_halving_grid_search(price_data, strategy, hyperparameters, commissions_in_percent, bid_ask_spread,
+                                   reduction_factor=2, minimum_observations=252, metric='sharpe_ratio',
+                                   compare_with_exhaustive=False, **grid_search_options):
+    """
+    Tunes hyperparameters for a strategy by successive halving, rather than evaluating every
+    combination on all price data. Every combination is first evaluated on a short prefix of
+    price data, and only the best combinations are evaluated again on progressively longer
+    prefixes, see run_successive_halving.
+
+    Args:
+        price_data (pd.DataFrame): see grid_search
+        strategy (function): see grid_search
+        hyperparameters (dict {parameter_name (str): parameter_values (List)})
+        commissions_in_percent (float): to model transaction costs
+        bid_ask_spread (float): to model transaction costs
+        reduction_factor (int): fraction 1 / reduction_factor of combinations is kept after each
+            round, while prefixes of price data grow reduction_factor times longer.
+        minimum_observations (int): minimum length of prefixes of price data
+        metric (str): 'sharpe_ratio' or 'annual_returns', higher is better
+        compare_with_exhaustive (bool): whether to also run the exhaustive grid search, and
+            compare rankings of both searches.
+        **grid_search_options: stage_cache_size, number_of_workers, chunk_size,
+            pnl_batch_size or result_cache, see grid_search
+
+    Returns:
+        results (pd.DataFrame): results of every combination on the longest prefix it was
+            evaluated on, best combinations first.
+        search_statistics (dict): see run_successive_halving and compare_search_rankings
+    """
+    parameter_combinations = _create_parameter_combinations(hyperparameters, getattr(strategy, 'stages', None))
+
+    def evaluate(parameter_combinations, number_of_observations):
+        return _evaluate_grid(price_data.iloc[:number_of_observations], strategy, parameter_combinations,
+                              commissions_in_percent, bid_ask_spread, **grid_search_options)
+
+    results, search_statistics = run_successive_halving(evaluate, parameter_combinations, len(price_data),
+                                                        minimum_observations, metric, reduction_factor)
+    results = results.fillna(0)
+
+    if compare_with_exhaustive:
+        exhaustive_results = grid_search(price_data, strategy, hyperparameters, commissions_in_percent,
+                                         bid_ask_spread, **grid_search_options)
+        search_statistics.update(compare_search_rankings(results, exhaustive_results, list(hyperparameters), metric))
+
+    return results, search_statistics
+
+
+def run_successive_halving(evaluate, parameter_combinations, number_of_observations, minimum_observations,
+                           metric, reduction_factor=2):
+    """
+    Searches combinations of hyperparameters by successive halving. In each round,
+    combinations are evaluated on a prefix of the data, and only the best 1 / reduction_factor
+    of combinations go on to the next round, on a prefix reduction_factor times longer. The
+    last round evaluates remaining combinations on all data. Rounds start from the shortest
+    prefix with at least minimum_observations, while at least one combination remains.
+
+    Compute is measured in observations evaluated, i.e. the length of the prefix a combination
+    is evaluated on, summed over combinations and rounds.
+
+    Args:
+        evaluate (function): evaluates (parameter_combinations, number_of_observations),
+            returning a result (dict) with metric for each combination, in order.
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+        number_of_observations (int): length of data
+        minimum_observations (int): minimum length of prefixes of data
+        metric (str): key of results to rank combinations by, higher is better
+        reduction_factor (int)
+
+    Returns:
+        results (pd.DataFrame): results of every combination on the longest prefix it was
+            evaluated on, together with the length of the prefix ('observations'). Combinations
+            reaching later rounds are ranked first, then by metric.
+        search_statistics (dict {'rounds': List[dict {'observations': int, 'combinations': int}],
+                                 'evaluated_observations': int, 'exhaustive_observations': int,
+                                 'compute_saved': float})
+    """
+    # prefix lengths of each round, shortest first
+    round_observations = [number_of_observations]
+    while round_observations[0] // reduction_factor >= minimum_observations and\
+            len(parameter_combinations) // reduction_factor ** len(round_observations) >= 1:
+        round_observations.insert(0, round_observations[0] // reduction_factor)
+
+    remaining_combinations = parameter_combinations
+    eliminated_results = []  # results of combinations eliminated in each round
+    rounds = []
+    evaluated_observations = 0
+
+    for round_number, observations in enumerate(round_observations):
+        round_results = evaluate(remaining_combinations, observations)
+        for result in round_results:
+            result['observations'] = observations
+
+        rounds.append({'observations': observations, 'combinations': len(remaining_combinations)})
+        evaluated_observations += observations * len(remaining_combinations)
+
+        # ranks combinations by metric, missing metrics last
+        ranking = sorted(range(len(round_results)),
+                         key=lambda i: (np.isnan(round_results[i][metric]),
+                                        -np.nan_to_num(round_results[i][metric])))
+        round_results = [round_results[i] for i in ranking]
+
+        if round_number == len(round_observations) - 1:
+            break
+
+        number_kept = -(-len(remaining_combinations) // reduction_factor)
+        remaining_combinations = [remaining_combinations[i] for i in ranking[:number_kept]]
+        eliminated_results.append(round_results[number_kept:])
+
+    # combinations eliminated in later rounds are ranked before those eliminated earlier
+    for eliminated_round_results in reversed(eliminated_results):
+        round_results.extend(eliminated_round_results)
+
+    exhaustive_observations = number_of_observations * len(parameter_combinations)
+    search_statistics = {'rounds': rounds,
+                         'evaluated_observations': evaluated_observations,
+                         'exhaustive_observations': exhaustive_observations,
+                         'compute_saved': 1 - evaluated_observations / exhaustive_observations}
+
+    return pd.DataFrame(round_results), search_statistics
+
+
+def compare_search_rankings(results, exhaustive_results, hyperparameter_names, metric):
+    """
+    Compares the ranking of combinations found by successive halving with the ranking of an
+    exhaustive search.
+
+    Args:
+        results (pd.DataFrame): results of successive halving, best combinations first
+        exhaustive_results (pd.DataFrame): results of exhaustive search
+        hyperparameter_names (List[str])
+        metric (str): higher is better
+
+    Returns:
+        ranking_comparison (dict {'exhaustive_rank_of_best': int, 'top_overlap': float,
+                                  'rank_correlation': float}):
+            rank in the exhaustive search (1 is best) of the best combination found, fraction
+            of combinations of the last round which are also best in the exhaustive search,
+            and Spearman correlation of both rankings.
+    """
+    exhaustive_results = exhaustive_results.sort_values(metric, ascending=False, na_position='last', kind='stable')
+
+    combinations = list(results[hyperparameter_names].itertuples(index=False, name=None))
+    exhaustive_combinations = list(exhaustive_results[hyperparameter_names].itertuples(index=False, name=None))
+    exhaustive_ranks = {combination: rank for rank, combination in enumerate(exhaustive_combinations, 1)}
+
+    number_of_finalists = int((results['observations'] == results['observations'].max()).sum())
+    top_overlap = len(set(combinations[:number_of_finalists]) &
+                      set(exhaustive_combinations[:number_of_finalists])) / number_of_finalists
+
+    # Spearman correlation is the Pearson correlation of ranks
+    rank_correlation = np.corrcoef(np.arange(1, len(combinations) + 1),
+                                   [exhaustive_ranks[combination] for combination in combinations])[0, 1]
+
+    return {'exhaustive_rank_of_best': exhaustive_ranks[combinations[0]],
+            'top_overlap': top_overlap,
+            'rank_correlation': rank_correlation}
+
+
+def _evaluate_grid(price_data, strategy, parameter_combinations, commissions_in_percent, bid_ask_spread,
+                   stage_cache_size=128, number_of_workers=1, chunk_size=None, pnl_batch_size=64,
+                   result_cache=None):
+    """
+    Evaluates combinations of hyperparameters, serially or in a pool of processes, skipping
+    combinations already in the result cache.
+
+    Args:
+        price_data (pd.DataFrame)
+        strategy (function)
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+        commissions_in_percent (float)
+        bid_ask_spread (float)
+        stage_cache_size (int)
+        number_of_workers (int)
+        chunk_size (int)
+        pnl_batch_size (int)
+        result_cache (ResultCache or str)
+
+    Returns:
+        results (List[dict]): in the order of parameter_combinations
+    """
+    if result_cache is None:
+        return _evaluate_uncached_grid(price_data, strategy, parameter_combinations, commissions_in_percent,
+                                       bid_ask_spread, stage_cache_size, number_of_workers, chunk_size,
+                                       pnl_batch_size)
+
+    if isinstance(result_cache, str):
+        result_cache = ResultCache(result_cache)
+        try:
+            return _evaluate_grid(price_data, strategy, parameter_combinations, commissions_in_percent,
+                                  bid_ask_spread, stage_cache_size, number_of_workers, chunk_size,
+                                  pnl_batch_size, result_cache)
+        finally:
+            result_cache.close()
+
+    keys = result_cache.create_keys(price_data, strategy, parameter_combinations,
+                                    commissions_in_percent, bid_ask_spread)
+    cached_results = result_cache.load_results(keys)
+    missing_indices = [index for index, key in enumerate(keys) if key not in cached_results]
+
+    # results arrive in the order of missing combinations, and are written as they arrive
+    missing_keys = iter([keys[index] for index in missing_indices])
+
+    def store_results(results):
+        result_cache.store_results([next(missing_keys) for _ in results], results)
+
+    missing_results = []
+    if missing_indices:
+        missing_results = _evaluate_uncached_grid(price_data, strategy,
+                                                  [parameter_combinations[index] for index in missing_indices],
+                                                  commissions_in_percent, bid_ask_spread, stage_cache_size,
+                                                  number_of_workers, chunk_size, pnl_batch_size, store_results)
+
+    results = [None] * len(parameter_combinations)
+    for index, result in zip(missing_indices, missing_results):
+        results[index] = result
+
+    for index, key in enumerate(keys):
+        if key in cached_results:
+            annual_returns, sharpe_ratio = cached_results[key]
+            results[index] = {**parameter_combinations[index],
+                              'annual_returns': annual_returns,
+                              'sharpe_ratio': sharpe_ratio}
+
+    return results
+
+
+def _evaluate_uncached_grid(price_data, strategy, parameter_combinations, commissions_in_percent, bid_ask_spread,
+                            stage_cache_size, number_of_workers, chunk_size, pnl_batch_size, store_results=None):
+    """
+    Args:
+        see _evaluate_grid
+        store_results (function): called with results of each batch or chunk of combinations
+            as soon as they are evaluated.
+
+    Returns:
+        results (List[dict]): in the order of parameter_combinations
+    """
+    if number_of_workers > 1:
+        return _run_parallel_grid_search(price_data, strategy, parameter_combinations,
+                                         commissions_in_percent, bid_ask_spread, stage_cache_size,
+                                         pnl_batch_size, number_of_workers, chunk_size, store_results)
+
+    return _evaluate_parameter_combinations(price_data, strategy, parameter_combinations,
+                                            commissions_in_percent, bid_ask_spread, stage_cache_size,
+                                            pnl_batch_size, show_progress=True, store_results=store_results)
+
+
+def _evaluate_parameter_combinations(price_data, strategy, parameter_combinations,
+                                     commissions_in_percent, bid_ask_spread, stage_cache_size,
+                                     pnl_batch_size, show_progress=False, store_results=None):
+    """
+    Feeds each combination of hyperparameters into the strategy, and calculates pnl of
+    batches of combinations at once.
+
+    Args:
+        price_data (pd.DataFrame)
+        strategy (function)
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+        commissions_in_percent (float)
+        bid_ask_spread (float)
+        stage_cache_size (int)
+        pnl_batch_size (int): number of combinations whose pnl is calculated at once
+        show_progress (bool): whether to show a progress bar
+        store_results (function): called with results of each batch once evaluated
+
+    Returns:
+        results (List[dict]): combinations of hyperparameters, with annual returns and
+            sharpe ratio of each combination.
+    """
     # Create a partial function so that only hyperparameters need to be fed.
+    stages = getattr(strategy, 'stages', None)
     strategy = partial(strategy, price_data=price_data)
 
-    # Grid search
+    if stages is not None:
+        strategy_outputs = _run_strategy_stages(price_data, stages, parameter_combinations, stage_cache_size)
+    else:
+        strategy_outputs = (strategy(**parameter_combination) for parameter_combination in parameter_combinations)
+
+    strategy_outputs = zip(parameter_combinations, strategy_outputs)
+    if show_progress:
+        strategy_outputs = tqdm(strategy_outputs, total=len(parameter_combinations))
+
     results = []
-    keys = hyperparameters.keys()
-    for combination in tqdm(set(cartesian_product(*hyperparameters.values()))):
-        # creating positions and portfolio ratios
-        parameter_combination = dict(zip(keys, combination))
-        positions, portfolio_ratios = strategy(**parameter_combination)
+    batch_positions, batch_portfolio_ratios = [], []
+    for parameter_combination, (positions, portfolio_ratios) in strategy_outputs:
+        results.append(dict(parameter_combination))
+        batch_positions.append(np.asarray(positions, dtype=float))
+        batch_portfolio_ratios.append(np.asarray(portfolio_ratios, dtype=float))
 
-        # evaluating performance
-        annual_returns, sharpe_ratio = \
-            calculate_pnl_with_transaction_costs(price_data, positions, portfolio_ratios,
-                                                 commissions_in_percent, bid_ask_spread,
-                                                 plot=False)
+        # evaluating performance of a batch of combinations at once
+        if len(batch_positions) == pnl_batch_size or len(results) == len(parameter_combinations):
+            annual_returns, sharpe_ratios = \
+                calculate_batched_pnl_with_transaction_costs(price_data, np.stack(batch_positions),
+                                                             np.stack(batch_portfolio_ratios),
+                                                             commissions_in_percent, bid_ask_spread)
 
-        parameter_combination['annual_returns'] = annual_returns
-        parameter_combination['sharpe_ratio'] = sharpe_ratio
+            for parameter_combination, annual_return, sharpe_ratio in \
+                    zip(results[-len(batch_positions):], annual_returns, sharpe_ratios):
+                parameter_combination['annual_returns'] = annual_return
+                parameter_combination['sharpe_ratio'] = sharpe_ratio
 
-        results.append(parameter_combination)
+            if store_results is not None:
+                store_results(results[-len(batch_positions):])
+
+            batch_positions, batch_portfolio_ratios = [], []
+
+    return results
+
+
+def _run_parallel_grid_search(price_data, strategy, parameter_combinations, commissions_in_percent,
+                              bid_ask_spread, stage_cache_size, pnl_batch_size, number_of_workers,
+                              chunk_size=None, store_results=None):
+    """
+    Evaluates chunks of consecutive combinations of hyperparameters in a pool of processes,
+    with price data in shared memory.
+
+    Args:
+        price_data (pd.DataFrame)
+        strategy (function): picklable strategy
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+        commissions_in_percent (float)
+        bid_ask_spread (float)
+        stage_cache_size (int)
+        pnl_batch_size (int)
+        number_of_workers (int)
+        chunk_size (int)
+        store_results (function): called with results of each chunk once evaluated
+
+    Returns:
+        results (List[dict]): in the order of parameter_combinations
+    """
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(parameter_combinations) // (4 * number_of_workers)))
+
+    chunks = [parameter_combinations[chunk_start:chunk_start + chunk_size]
+              for chunk_start in range(0, len(parameter_combinations), chunk_size)]
+
+    # Copies prices into shared memory once, workers view prices without copying
+    prices = price_data.to_numpy(dtype=float)
+    shared_prices = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    try:
+        np.ndarray(prices.shape, dtype=float, buffer=shared_prices.buf)[:] = prices
+
+        shared_price_data = {'name': shared_prices.name, 'shape': prices.shape,
+                             'index': price_data.index, 'columns': price_data.columns}
+        worker_arguments = (shared_price_data, strategy, commissions_in_percent, bid_ask_spread,
+                            stage_cache_size, pnl_batch_size)
+
+        results = []
+        with multiprocessing.Pool(number_of_workers, initializer=_initialise_grid_search_worker,
+                                  initargs=worker_arguments) as pool:
+            # imap returns results in the order of chunks, whichever chunk completes first
+            for chunk_results in tqdm(pool.imap(_evaluate_chunk, chunks), total=len(chunks)):
+                results.extend(chunk_results)
+                if store_results is not None:
+                    store_results(chunk_results)
+    finally:
+        shared_prices.close()
+        shared_prices.unlink()
 
-    # convert results into a tabular form
-    results = pd.DataFrame(results)
-    results = results.fillna(0)
     return results
 
 
+# state of each grid search worker process, set once when the worker starts
+_grid_search_worker = {}
+
+
+def _initialise_grid_search_worker(shared_price_data, strategy, commissions_in_percent,
+                                   bid_ask_spread, stage_cache_size, pnl_batch_size):
+    """
+    Attaches a grid search worker to price data in shared memory.
+
+    Args:
+        shared_price_data (dict): name and shape of shared memory, index and columns of price data
+        strategy (function)
+        commissions_in_percent (float)
+        bid_ask_spread (float)
+        stage_cache_size (int)
+        pnl_batch_size (int)
+    """
+    shared_prices = shared_memory.SharedMemory(name=shared_price_data['name'])
+    prices = np.ndarray(shared_price_data['shape'], dtype=float, buffer=shared_prices.buf)
+    prices.flags.writeable = False
+
+    _grid_search_worker['shared_prices'] = shared_prices  # keeps shared memory attached
+    _grid_search_worker['price_data'] = pd.DataFrame(prices, index=shared_price_data['index'],
+                                                     columns=shared_price_data['columns'], copy=False)
+    _grid_search_worker['strategy'] = strategy
+    _grid_search_worker['commissions_in_percent'] = commissions_in_percent
+    _grid_search_worker['bid_ask_spread'] = bid_ask_spread
+    _grid_search_worker['stage_cache_size'] = stage_cache_size
+    _grid_search_worker['pnl_batch_size'] = pnl_batch_size
+
+
+def _evaluate_chunk(parameter_combinations):
+    """
+    Args:
+        parameter_combinations (List[dict]): chunk of consecutive combinations
+
+    Returns:
+        results (List[dict])
+    """
+    return _evaluate_parameter_combinations(_grid_search_worker['price_data'],
+                                            _grid_search_worker['strategy'],
+                                            parameter_combinations,
+                                            _grid_search_worker['commissions_in_percent'],
+                                            _grid_search_worker['bid_ask_spread'],
+                                            _grid_search_worker['stage_cache_size'],
+                                            _grid_search_worker['pnl_batch_size'])
+
+
+def _create_parameter_combinations(hyperparameters, stages=None):
+    """
+    Creates each combination of hyperparameters of the grid. If the strategy is declared as
+    stages, hyperparameters of earlier stages vary slowest, so that combinations sharing
+    outputs of a stage are consecutive.
+
+    Args:
+        hyperparameters (dict {parameter_name (str): parameter_values (List)})
+        stages (List[dict]): stages of the strategy, if declared
+
+    Returns:
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+    """
+    keys = list(hyperparameters.keys())
+    ordered_keys = keys
+
+    if stages is not None:
+        stage_hyperparameters = [parameter_name for stage in stages for parameter_name in stage['hyperparameters']]
+        for parameter_name in keys:
+            if parameter_name not in stage_hyperparameters:
+                raise ValueError(f"Hyperparameter {parameter_name} is not used by any stage of the strategy!")
+
+        ordered_keys = sorted(keys, key=stage_hyperparameters.index)
+
+    # duplicate values are only searched once
+    parameter_values = [list(dict.fromkeys(hyperparameters[parameter_name])) for parameter_name in ordered_keys]
+
+    parameter_combinations = []
+    for combination in cartesian_product(*parameter_values):
+        parameter_combination = dict(zip(ordered_keys, combination))
+        parameter_combinations.append({parameter_name: parameter_combination[parameter_name]
+                                       for parameter_name in keys})
+
+    return parameter_combinations
+
+
+def _run_strategy_stages(price_data, stages, parameter_combinations, stage_cache_size):
+    """
+    Runs a strategy declared as stages for each combination of hyperparameters. Each stage
+    receives the output of the previous stage (price data for the first stage) and its own
+    hyperparameters, and the last stage outputs positions and portfolio ratios.
+
+    Outputs of each stage are kept in a least recently used cache, keyed by the values of
+    hyperparameters of the stage and all previous stages. If the first stage is batched,
+    it is run for up to stage_cache_size uncached combinations of its hyperparameters at once.
+
+    Args:
+        price_data (pd.DataFrame)
+        stages (List[dict {'stage': function, 'hyperparameters': tuple(str),
+                           'batched_stage': function (optional)}])
+        parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+        stage_cache_size (int): maximum number of outputs cached for each stage
+
+    Yields:
+        strategy_output (tuple(positions (pd.Series), portfolio_ratios (pd.DataFrame))):
+            in the order of parameter_combinations
+    """
+    stage_caches = [OrderedDict() for _ in stages]
+
+    for position, parameter_combination in enumerate(parameter_combinations):
+        stage_output = price_data
+        stage_key = ()
+
+        for stage_number, stage in enumerate(stages):
+            stage_parameters = {parameter_name: parameter_combination[parameter_name]
+                                for parameter_name in stage['hyperparameters']}
+            stage_key += tuple(stage_parameters.values())
+            stage_cache = stage_caches[stage_number]
+
+            if stage_key in stage_cache:
+                stage_cache.move_to_end(stage_key)
+            elif stage_number == 0 and 'batched_stage' in stage:
+                _run_batched_stage(price_data, stage, parameter_combinations[position:],
+                                   stage_cache, stage_cache_size)
+            else:
+                stage_cache[stage_key] = stage['stage'](stage_output, **stage_parameters)
+                if len(stage_cache) > stage_cache_size:
+                    stage_cache.popitem(last=False)
+
+            stage_output = stage_cache[stage_key]
+
+        yield stage_output
+
+
+def _run_batched_stage(price_data, stage, parameter_combinations, stage_cache, stage_cache_size):
+    """
+    Runs the first stage of a strategy for the next uncached combinations of its
+    hyperparameters at once, and caches outputs.
+
+    Args:
+        price_data (pd.DataFrame)
+        stage (dict {'batched_stage': function, 'hyperparameters': tuple(str)})
+        parameter_combinations (List[dict]): remaining combinations of the grid, the first
+            of which is not cached
+        stage_cache (OrderedDict {stage_key (tuple): stage_output})
+        stage_cache_size (int)
+    """
+    stage_keys = []
+    for parameter_combination in parameter_combinations:
+        stage_key = tuple(parameter_combination[parameter_name] for parameter_name in stage['hyperparameters'])
+        if stage_key not in stage_cache and stage_key not in stage_keys:
+            stage_keys.append(stage_key)
+            if len(stage_keys) == stage_cache_size:
+                break
+
+    batched_parameters = {parameter_name: np.array([stage_key[i] for stage_key in stage_keys])
+                          for i, parameter_name in enumerate(stage['hyperparameters'])}
+    stage_outputs = stage['batched_stage'](price_data, **batched_parameters)
+
+    for stage_key, stage_output in zip(stage_keys, stage_outputs):
+        stage_cache[stage_key] = stage_output
+        if len(stage_cache) > stage_cache_size:
+            stage_cache.popitem(last=False)
+
+
+def _calculate_batched_transaction_costs(previous_prices, positions, portfolio_ratios,
+                                         commissions_in_percent, bid_ask_spread):
+    """
+    Models transaction costs of K strategies at once, see _calculate_transaction_costs.
+
+    Args:
+        previous_prices (np.array[float] (T, N)): prices shifted by one period
+        positions (np.array[float] (K, T))
+        portfolio_ratios (np.array[float] (K, T, N))
+        commissions_in_percent (float)
+        bid_ask_spread (float)
+
+    Returns:
+        transaction_costs (np.array[float] (K, T))
+    """
+    position_change = _diff(positions, axis=1)
+    portfolio_ratios_change = _diff(portfolio_ratios, axis=1)
+
+    # when entering positions in the unit portfolio
+    commissions = np.abs(commissions_in_percent / 100 * position_change *
+                         np.nansum(portfolio_ratios * previous_prices, axis=2))
+
+    # when re-balancing unit portfolio security ratios
+    commissions += np.abs(commissions_in_percent / 100 * positions *
+                          np.nansum(portfolio_ratios_change * previous_prices, axis=2))
+
+    # when entering positions in the unit portfolio
+    slippages = np.abs(0.5 * bid_ask_spread *
+                       position_change *
+                       np.nansum(portfolio_ratios, axis=2))
+
+    # when re-balancing unit portfolio security ratios
+    slippages += np.abs(0.5 * bid_ask_spread *
+                        positions *
+                        np.nansum(portfolio_ratios_change, axis=2))
+
+    return slippages + commissions
+
+
+def _shift(values, axis):
+    """
+    Shifts values by one period along an axis, as pd.DataFrame.shift.
+
+    Args:
+        values (np.array[float])
+        axis (int)
+
+    Returns:
+        shifted_values (np.array[float]): with nan in the first period
+    """
+    shifted_values = np.roll(values, 1, axis=axis)
+    np.moveaxis(shifted_values, axis, 0)[0] = np.nan
+
+    return shifted_values
+
+
+def _diff(values, axis):
+    """
+    Args:
+        values (np.array[float])
+        axis (int)
+
+    Returns:
+        differences (np.array[float]): differences with previous period, as pd.DataFrame.diff
+    """
+    return values - _shift(values, axis)
+
+
+def _nanmean(values):
+    """
+    Args:
+        values (np.array[float] (K, T))
+
+    Returns:
+        means (np.array[float] (K,)): means of values which are not nan, as pd.Series.mean
+    """
+    number_of_values = np.sum(~np.isnan(values), axis=1)
+    return np.nansum(values, axis=1) / number_of_values
+
+
+def _nanstd(values):
+    """
+    Args:
+        values (np.array[float] (K, T))
+
+    Returns:
+        standard_deviations (np.array[float] (K,)): population standard deviations of values
+            which are not nan, as np.std of a pd.Series
+    """
+    number_of_values = np.sum(~np.isnan(values), axis=1)
+    deviations = values - _nanmean(values)[:, np.newaxis]
+    return np.sqrt(np.nansum(deviations ** 2, axis=1) / number_of_values)
+
+
 def _calculate_transaction_costs(price_data, positions, portfolio_ratios,
                                  commissions_in_percent, bid_ask_spread):
     """
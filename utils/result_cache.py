@@ -0,0 +1,208 @@
+import json
+import hashlib
+import inspect
+import sqlite3
+import numpy as np
+
+from functools import partial
+
+
+class ResultCache:
+    """
+    Persistent store of grid search results, in a SQLite database on local disk.
+
+    Results are content-addressed: each result is keyed by a hash of the price data, the
+    strategy (its name, together with its version attribute if any, the source code of its
+    module and arguments bound by functools.partial), the combination of hyperparameters and
+    the transaction cost settings.
+    Grid searches skip combinations which were already computed, and write results as
+    they are computed, so an interrupted grid search resumes where it stopped.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): path to SQLite database, created if it does not exist
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS grid_search_results ("
+                                "key TEXT PRIMARY KEY, "
+                                "parameter_combination TEXT, "
+                                "annual_returns REAL, "
+                                "sharpe_ratio REAL)")
+        self.connection.commit()
+
+    def create_keys(self, price_data, strategy, parameter_combinations, commissions_in_percent, bid_ask_spread):
+        """
+        Args:
+            price_data (pd.DataFrame)
+            strategy (function or functools.partial)
+            parameter_combinations (List[dict {parameter_name (str): parameter_value}])
+            commissions_in_percent (float)
+            bid_ask_spread (float)
+
+        Returns:
+            keys (List[str]): key of each combination of hyperparameters
+        """
+        # identical for all combinations
+        search_hash = hashlib.sha256()
+        search_hash.update(hash_price_data(price_data).encode())
+        search_hash.update(hash_strategy(strategy).encode())
+        search_hash.update(_serialise({'commissions_in_percent': commissions_in_percent,
+                                       'bid_ask_spread': bid_ask_spread}).encode())
+
+        keys = []
+        for parameter_combination in parameter_combinations:
+            combination_hash = search_hash.copy()
+            combination_hash.update(_serialise(parameter_combination).encode())
+            keys.append(combination_hash.hexdigest())
+
+        return keys
+
+    def load_results(self, keys):
+        """
+        Args:
+            keys (List[str])
+
+        Returns:
+            results (dict {key (str): tuple(annual_returns (float), sharpe_ratio (float))}):
+                results already computed. Keys which were not computed are absent, while
+                results stored as nan are returned as nan.
+        """
+        results = {}
+        # SQLite limits the number of variables in a query
+        for chunk_start in range(0, len(keys), 500):
+            chunk = keys[chunk_start:chunk_start + 500]
+            rows = self.connection.execute("SELECT key, annual_returns, sharpe_ratio FROM grid_search_results "
+                                           f"WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, annual_returns, sharpe_ratio in rows:
+                results[key] = (np.nan if annual_returns is None else annual_returns,
+                                np.nan if sharpe_ratio is None else sharpe_ratio)
+
+        return results
+
+    def store_results(self, keys, results):
+        """
+        Writes results to disk, committing straight away.
+
+        Args:
+            keys (List[str])
+            results (List[dict]): combination of hyperparameters, with annual returns and
+                sharpe ratio, for each key
+        """
+        rows = []
+        for key, result in zip(keys, results):
+            parameter_combination = {parameter_name: parameter_value for parameter_name, parameter_value
+                                     in result.items() if parameter_name not in ('annual_returns', 'sharpe_ratio')}
+            rows.append((key, _serialise(parameter_combination),
+                         float(result['annual_returns']), float(result['sharpe_ratio'])))
+
+        self.connection.executemany("INSERT OR REPLACE INTO grid_search_results VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def hash_price_data(price_data):
+    """
+    Args:
+        price_data (pd.DataFrame)
+
+    Returns:
+        price_data_hash (str): hash of values, index and columns of price data
+    """
+    price_data_hash = hashlib.sha256()
+    price_data_hash.update(np.ascontiguousarray(price_data.to_numpy(dtype=float)).tobytes())
+    price_data_hash.update(repr(price_data.index.tolist()).encode())
+    price_data_hash.update(repr(price_data.columns.tolist()).encode())
+
+    return price_data_hash.hexdigest()
+
+
+def hash_strategy(strategy):
+    """
+    Args:
+        strategy (function or functools.partial)
+
+    Returns:
+        strategy_hash (str): hash of the name of the strategy, its version attribute if any,
+            and the source code of the module defining it, so that results are recomputed
+            whenever the strategy or its helper functions change. Partial functions are
+            unwrapped, and hashed by the function they wrap together with their bound
+            arguments, so that partial functions binding different arguments never share results.
+    """
+    strategy_hash = hashlib.sha256()
+    strategy_hash.update(repr(getattr(strategy, 'version', None)).encode())
+
+    if isinstance(strategy, partial):
+        strategy_hash.update(hash_strategy(strategy.func).encode())
+        _update_hash(strategy_hash, strategy.args)
+        _update_hash(strategy_hash, strategy.keywords)
+        return strategy_hash.hexdigest()
+
+    strategy_hash.update(strategy.__qualname__.encode())
+
+    try:
+        strategy_hash.update(inspect.getsource(inspect.getmodule(strategy)).encode())
+    except (OSError, TypeError):
+        # source is not available, e.g. for strategies defined interactively
+        pass
+
+    return strategy_hash.hexdigest()
+
+
+def _update_hash(value_hash, value):
+    """
+    Updates a hash with an argument bound to a strategy. Arrays, series and dataframes are
+    hashed by their bytes, as their representation is truncated when they are large, and
+    functions are hashed as strategies.
+
+    Args:
+        value_hash (hashlib.sha256)
+        value: argument, possibly nested in lists, tuples or dicts
+    """
+    value_hash.update(type(value).__qualname__.encode())
+
+    if isinstance(value, partial) or inspect.isroutine(value):
+        value_hash.update(hash_strategy(value).encode())
+
+    elif isinstance(value, (list, tuple)):
+        value_hash.update(repr(len(value)).encode())
+        for item in value:
+            _update_hash(value_hash, item)
+
+    elif isinstance(value, dict):
+        value_hash.update(repr(len(value)).encode())
+        for name in sorted(value, key=repr):
+            value_hash.update(repr(name).encode())
+            _update_hash(value_hash, value[name])
+
+    elif isinstance(value, np.ndarray):
+        value_hash.update(f"{value.dtype.str}{value.shape}".encode())
+        if value.dtype.hasobject:
+            value_hash.update(repr(value.tolist()).encode())
+        else:
+            value_hash.update(np.ascontiguousarray(value).tobytes())
+
+    # series and dataframes
+    elif hasattr(value, 'to_numpy') and hasattr(value, 'index'):
+        _update_hash(value_hash, value.to_numpy())
+        labels = value.columns.tolist() if hasattr(value, 'columns') else [value.name]
+        value_hash.update(repr(value.index.tolist()).encode())
+        value_hash.update(repr(labels).encode())
+
+    else:
+        value_hash.update(repr(value.item() if isinstance(value, np.generic) else value).encode())
+
+
+def _serialise(values):
+    """
+    Args:
+        values (dict {name (str): value})
+
+    Returns:
+        serialised_values (str): canonical representation of values, independent of order
+    """
+    return json.dumps({name: repr(value.item() if isinstance(value, np.generic) else value)
+                       for name, value in values.items()}, sort_keys=True)